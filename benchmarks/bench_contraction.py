@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Contraction hierarchy preprocessing and queries against plain A*.
+
+For each graph size and weight, reports the time and memory of contracting
+the CSR graph, the size of its graph cache sidecar, and the mean latency
+and nodes settled per query of the hierarchy and of A* on the CSR arrays::
+
+    python -m benchmarks.bench_contraction --sizes 10000 50000 --queries 100
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.contraction import ContractionHierarchy
+from core.costs import csr_heuristic
+from core.csr import CSRGraph
+from core.graph_cache import GraphCache
+from core.search import astar
+
+
+def time_queries(search, pairs):
+    """Mean milliseconds and nodes settled per query over ``pairs``."""
+    elapsed = settled = 0
+    for source, target in pairs:
+        start = time.perf_counter()
+        result = search(source, target)
+        elapsed += time.perf_counter() - start
+        settled += result.settled
+    return elapsed * 1000 / len(pairs), settled / len(pairs)
+
+
+def run(sizes, queries=100, weights=("length", "travel_time")):
+    records = []
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cache = GraphCache(tmp_dir)
+        for size in sizes:
+            G = grid_graph(size)
+            csr = CSRGraph.from_networkx(G)
+            pairs = [
+                (csr.position(o), csr.position(d)) for o, d in random_pairs(G, queries)
+            ]
+            cache.put("synthetic", "drive", G)
+            for weight in weights:
+                start = time.perf_counter()
+                ch = ContractionHierarchy.from_csr(csr, weight)
+                build_s = time.perf_counter() - start
+
+                name = f"ch_{weight}"
+                cache.put_sidecar("synthetic", "drive", name, ch)
+                start = time.perf_counter()
+                cache.get_sidecar("synthetic", "drive", name)
+                load_s = time.perf_counter() - start
+
+                astar_ms, astar_settled = time_queries(
+                    lambda s, t: astar(csr, s, t, weight, csr_heuristic(csr, t, weight)),
+                    pairs,
+                )
+                ch_ms, ch_settled = time_queries(ch.query, pairs)
+                records.append({
+                    "benchmark": "contraction",
+                    "weight": weight,
+                    "nodes": len(csr),
+                    "edges": csr.n_edges,
+                    "build_s": build_s,
+                    "load_s": load_s,
+                    "shortcuts": ch.n_shortcuts,
+                    "csr_mbytes": csr.nbytes / 1e6,
+                    "ch_mbytes": ch.nbytes / 1e6,
+                    "astar_query_ms": astar_ms,
+                    "ch_query_ms": ch_ms,
+                    "speedup": astar_ms / ch_ms if ch_ms else None,
+                    "astar_settled": astar_settled,
+                    "ch_settled": ch_settled,
+                    # Queries before the preprocessing pays for itself
+                    "break_even_queries": build_s * 1000 / (astar_ms - ch_ms)
+                    if astar_ms > ch_ms
+                    else None,
+                })
+    finally:
+        shutil.rmtree(tmp_dir)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.queries)
+    for record in records:
+        print(
+            "{nodes:>8} nodes  {weight:<11}  contract {build_s:7.1f} s "
+            "(+{shortcuts} shortcuts, {ch_mbytes:.1f} MB, load {load_s:.2f} s)  "
+            "A* {astar_query_ms:7.2f} ms / {astar_settled:7.0f} settled  "
+            "CH {ch_query_ms:6.2f} ms / {ch_settled:5.0f} settled  "
+            "x{speedup:.1f}".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Graph to GeoDataFrames conversion: two ``ox.graph_to_gdfs`` calls against
+the single pass of ``core.convert.graph_frames``.
+
+Times both on synthetic grids and records the peak memory of building the
+graph and converting it, as seen by tracemalloc (numpy and pandas buffers,
+not GEOS geometries), with and without releasing the graph::
+
+    python -m benchmarks.bench_convert --sizes 10000 100000
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import osmnx as ox
+
+from benchmarks.synthetic import grid_graph
+from core.convert import graph_frames
+
+
+def two_calls(G):
+    return ox.graph_to_gdfs(G, edges=False), ox.graph_to_gdfs(G, nodes=False)
+
+
+def peak_mb(convert, size):
+    """Peak MB of building a grid of ``size`` nodes and ``convert``-ing it."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        frames = convert(grid_graph(size))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del frames
+    return peak / 1e6
+
+
+def run(sizes=(10000, 100000)):
+    records = []
+    for size in sizes:
+        G = grid_graph(size)
+        record = {
+            "benchmark": "convert",
+            "nodes": G.number_of_nodes(),
+            "edges": G.number_of_edges(),
+        }
+        # tracemalloc slows allocations down, so time without it
+        start = time.perf_counter()
+        two_calls(G)
+        record["two_calls_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        graph_frames(G)
+        record["single_pass_s"] = time.perf_counter() - start
+        del G
+        record["two_calls_peak_mb"] = peak_mb(two_calls, size)
+        record["single_pass_peak_mb"] = peak_mb(graph_frames, size)
+        record["released_peak_mb"] = peak_mb(
+            lambda G: graph_frames(G, release=True), size
+        )
+        records.append(record)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes)
+    for record in records:
+        print(
+            "{nodes:>9} nodes {edges:>9} edges  two calls {two_calls_s:7.2f} s "
+            "{two_calls_peak_mb:8.1f} MB  single pass {single_pass_s:7.2f} s "
+            "{single_pass_peak_mb:8.1f} MB  released {released_peak_mb:8.1f} MB".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
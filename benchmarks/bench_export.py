@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Write time and size on disk of the street and node layers in each export format.
+
+Run from the plugin directory::
+
+    python -m benchmarks.bench_export --sizes 100000 250000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import grid_graph
+from core.convert import graph_frames
+from core.export import EXPORT_FORMATS, export_network
+from core.flatten import flatten_list_columns
+
+
+def directory_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def run(sizes, formats=None):
+    records = []
+    formats = formats or [fmt for _, fmt in EXPORT_FORMATS]
+    for size in sizes:
+        nodes, streets = graph_frames(grid_graph(size), release=True)
+        streets = flatten_list_columns(streets)
+        nodes = flatten_list_columns(nodes)
+        for fmt in formats:
+            out_dir = tempfile.mkdtemp()
+            try:
+                start = time.perf_counter()
+                export_network(streets, nodes, "bench", out_dir, out_dir, fmt)
+                elapsed = time.perf_counter() - start
+                records.append({
+                    "benchmark": "export",
+                    "format": fmt,
+                    "nodes": len(nodes),
+                    "edges": len(streets),
+                    "seconds": elapsed,
+                    "megabytes": directory_bytes(out_dir) / 1e6,
+                    "files": sum(len(names) for _, _, names in os.walk(out_dir)),
+                })
+            finally:
+                shutil.rmtree(out_dir)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    parser.add_argument("--formats", nargs="+", default=None)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.formats)
+    for record in records:
+        print(
+            "{nodes:>9} nodes {edges:>9} edges  {format:<8} {seconds:8.2f} s  "
+            "{megabytes:9.1f} MB  {files:>2} files".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
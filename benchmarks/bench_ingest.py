@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Offline graph build from a local OSM extract: time per pass and peak memory.
+
+Run from the plugin directory on a real extract, e.g. a Geofabrik country
+file, optionally clipped::
+
+    python -m benchmarks.bench_ingest --extract brazil-latest.osm.pbf \\
+        --bbox -39.6 -7.4 -39.2 -7.1
+
+Without ``--extract`` a synthetic grid is written as OSM XML and ingested.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import grid_graph, write_osm_xml
+from core.osm_ingest import CHUNK_SIZE, assemble_graph, scan_nodes, scan_ways
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def ingest(path, clip=None, chunk_size=CHUNK_SIZE):
+    record = {
+        "benchmark": "ingest",
+        "extract": os.path.basename(path),
+        "extract_mb": os.path.getsize(path) / 1e6,
+        "clip": list(clip) if clip else None,
+        "chunk_size": chunk_size,
+    }
+    start = time.perf_counter()
+    ways = scan_ways(path, chunk_size)
+    record["ways_s"] = time.perf_counter() - start
+    record["drivable_ways"] = len(ways)
+
+    start = time.perf_counter()
+    nodes = scan_nodes(path, ways.node_ids(), clip, chunk_size)
+    record["nodes_s"] = time.perf_counter() - start
+    record["kept_nodes"] = len(nodes.arrays()[0])
+
+    start = time.perf_counter()
+    G = assemble_graph(ways, nodes, source=path)
+    record["assemble_s"] = time.perf_counter() - start
+    record["graph_nodes"] = G.number_of_nodes()
+    record["graph_edges"] = G.number_of_edges()
+    record["total_s"] = record["ways_s"] + record["nodes_s"] + record["assemble_s"]
+    record["peak_rss_mb"] = peak_rss_mb()
+    return record
+
+
+def run(extract=None, clip=None, size=100000, chunk_size=CHUNK_SIZE):
+    if extract:
+        return [ingest(extract, clip, chunk_size)]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = write_osm_xml(grid_graph(size), os.path.join(tmp_dir, "grid.osm"))
+        return [ingest(path, clip, chunk_size)]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--extract", help=".osm / .osm.pbf file to ingest")
+    parser.add_argument("--bbox", type=float, nargs=4,
+                        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    parser.add_argument("--size", type=int, default=100000,
+                        help="Nodes of the synthetic grid when no extract is given")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.extract, args.bbox, args.size, args.chunk_size)
+    for record in records:
+        print(
+            "{extract} ({extract_mb:.0f} MB): ways {ways_s:.1f} s, nodes {nodes_s:.1f} s, "
+            "assemble {assemble_s:.1f} s, total {total_s:.1f} s; "
+            "{graph_nodes:,} nodes {graph_edges:,} edges; "
+            "peak RSS {peak_rss_mb:.0f} MB".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Isochrones from many depots on a metro-sized network, in depots per second.
+
+Run from the plugin directory::
+
+    python -m benchmarks.bench_isochrones --size 100000 --depots 150 --minutes 5 10 15
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import grid_graph
+from core.csr import CSRGraph
+from core.isochrones import METHODS, isochrones
+from core.parallel import default_workers
+
+
+def run(size, n_depots=120, minutes=(5, 10, 15), methods=METHODS, workers=None):
+    csr = CSRGraph.from_networkx(grid_graph(size))
+    rng = np.random.default_rng(4)
+    depots = rng.choice(len(csr), n_depots, replace=False)
+    limits = [60.0 * m for m in minutes]
+    records = []
+    for method in methods:
+        for count in sorted({1, workers or default_workers()}):
+            start = time.perf_counter()
+            result = isochrones(csr, depots, limits, method=method, workers=count)
+            elapsed = time.perf_counter() - start
+            largest = [depot[-1] for depot in result]
+            records.append({
+                "benchmark": "isochrones",
+                "nodes": len(csr),
+                "depots": n_depots,
+                "minutes": list(minutes),
+                "method": method,
+                "workers": count,
+                "seconds": elapsed,
+                "depots_per_s": n_depots / elapsed,
+                "mean_reached": float(np.mean([iso.nodes for iso in largest])),
+                "mean_area_km2": float(np.mean([iso.area_m2 for iso in largest])) / 1e6,
+            })
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--depots", type=int, default=120)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 10, 15])
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.size, args.depots, args.minutes, args.methods, args.workers)
+    for record in records:
+        print(
+            "{nodes:>9} nodes  {depots} depots  {method:<8} {workers:>2} workers  "
+            "{seconds:8.2f} s  {depots_per_s:7.2f} depots/s  "
+            "{mean_reached:9.0f} nodes  {mean_area_km2:7.1f} km2".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the O/D cost matrix engine in pairs per second.
+
+Run from the plugin directory::
+
+    python -m benchmarks.bench_matrix --sizes 100000 --origins 2000 --destinations 2000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import grid_graph
+from core.csr import CSRGraph
+from core.matrix import cost_matrix
+from core.parallel import default_workers
+
+
+def run(sizes, n_origins=200, n_destinations=200, workers=None, weight="travel_time"):
+    records = []
+    worker_counts = sorted({1, workers or default_workers()})
+    for size in sizes:
+        csr = CSRGraph.from_networkx(grid_graph(size))
+        rng = np.random.default_rng(2)
+        origins = rng.choice(len(csr), n_origins, replace=False)
+        destinations = rng.choice(len(csr), n_destinations, replace=False)
+        for count in worker_counts:
+            start = time.perf_counter()
+            matrix = cost_matrix(csr, origins, destinations, weight, workers=count)
+            elapsed = time.perf_counter() - start
+            records.append({
+                "benchmark": "matrix",
+                "nodes": len(csr),
+                "origins": n_origins,
+                "destinations": n_destinations,
+                "workers": count,
+                "seconds": elapsed,
+                "pairs_per_s": matrix.size / elapsed,
+                "unreachable_share": float(np.isinf(matrix).mean()),
+            })
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--origins", type=int, default=200)
+    parser.add_argument("--destinations", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.origins, args.destinations, args.workers)
+    for record in records:
+        print(
+            "{nodes:>9} nodes  {origins} x {destinations}  {workers:>2} workers  "
+            "{seconds:8.2f} s  {pairs_per_s:12,.0f} pairs/s".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timings of the network build and route pipeline on one graph.
+
+For synthetic grids of each size and for OSM fixture files (ingested
+offline), times the stages a build and a route query go through: loading
+the graph from the graph cache, the conversion to GeoDataFrames, list-column
+flattening, the GeoPackage export, building the nearest-node index and
+snapping points to it, A* queries on the CSR arrays and the PDF report::
+
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 --fixtures test/small_network.osm
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.graph_cache import GraphCache
+from core.graph_registry import RegionEntry
+from core.osm_ingest import build_network_from_extract
+from core.routing import csr_graph, shortest_path
+from core.spatial_index import NodeIndex
+
+# Bundled with the tests, small enough for every run
+DEFAULT_FIXTURES = (os.path.join(os.path.dirname(__file__), "..", "test", "small_network.osm"),)
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def stages(G, network, snaps=10000, queries=20):
+    """One record with the time of every stage on ``G``."""
+    import networkx as nx
+
+    from core.convert import graph_frames
+    from core.export import export_network
+    from core.flatten import flatten_list_columns
+    from core.report import write_report
+
+    record = {
+        "benchmark": "pipeline",
+        "network": network,
+        "nodes": G.number_of_nodes(),
+        "edges": G.number_of_edges(),
+    }
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cache = GraphCache(os.path.join(tmp_dir, "cache"))
+        _, record["cache_write_s"] = timed(cache.put, "bench", "drive", G)
+        record["cache_mb"] = cache.total_bytes() / 1e6
+        G, record["load_s"] = timed(cache.get, "bench", "drive")
+
+        (nodes, streets), record["to_gdfs_s"] = timed(graph_frames, G)
+
+        streets, streets_s = timed(flatten_list_columns, streets)
+        nodes, nodes_s = timed(flatten_list_columns, nodes)
+        record["flatten_s"] = streets_s + nodes_s
+
+        out_dir = os.path.join(tmp_dir, "export")
+        os.makedirs(out_dir)
+        _, record["export_s"] = timed(
+            export_network, streets, nodes, "bench", out_dir, out_dir, "gpkg"
+        )
+        del streets, nodes
+
+        index, record["index_s"] = timed(NodeIndex.from_graph, G)
+        rng = np.random.default_rng(5)
+        low = index.lats.min(), index.lons.min()
+        high = index.lats.max(), index.lons.max()
+        points = rng.uniform(low, high, size=(snaps, 2))
+        _, snap_s = timed(index.query, points[:, 0], points[:, 1])
+        record["snap_us"] = snap_s / snaps * 1e6
+
+        region = RegionEntry("bench", "drive", G)
+        _, record["csr_build_s"] = timed(csr_graph, region)
+        elapsed = []
+        for origin, destination in random_pairs(G, queries):
+            try:
+                route = shortest_path(region, origin, destination, "csr", "length")
+            except nx.NetworkXNoPath:
+                continue
+            elapsed.append(route.elapsed_ms)
+        record["astar_ms"] = float(np.mean(elapsed)) if elapsed else None
+
+        _, record["report_s"] = timed(
+            write_report,
+            os.path.join(tmp_dir, "report.pdf"),
+            network,
+            record["load_s"],
+            record["nodes"],
+            record["edges"],
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+    return record
+
+
+def run(sizes=(1000, 10000), fixtures=DEFAULT_FIXTURES, snaps=10000, queries=20):
+    records = []
+    for size in sizes:
+        records.append(stages(grid_graph(size), "grid", snaps, queries))
+    for path in fixtures:
+        G, _ = build_network_from_extract(path)
+        records.append(stages(G, os.path.basename(path), snaps, queries))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000])
+    parser.add_argument("--fixtures", nargs="*", default=list(DEFAULT_FIXTURES))
+    parser.add_argument("--snaps", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.fixtures, args.snaps, args.queries)
+    for record in records:
+        print(
+            "{network:<20} {nodes:>9} nodes  load {load_s:6.2f} s  "
+            "gdfs {to_gdfs_s:6.2f} s  flatten {flatten_s:6.2f} s  "
+            "export {export_s:6.2f} s  index {index_s:6.2f} s  snap {snap_us:6.1f} us  "
+            "A* {astar_ms:8.1f} ms  report {report_s:5.2f} s".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the NetworkX, CSR and bidirectional routing backends of the route
+dialog, by query time and nodes settled (search space).
+
+Run from the plugin directory::
+
+    python -m benchmarks.bench_routing --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import time
+
+import networkx as nx
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.graph_registry import RegionEntry
+from core.routing import csr_graph, shortest_path
+from core.search import dijkstra
+
+
+def time_queries(region, pairs, backend, weight):
+    """Mean milliseconds and nodes settled per query, plus unreachable pairs."""
+    elapsed = settled = missing = 0
+    for origin, destination in pairs:
+        try:
+            result = shortest_path(region, origin, destination, backend, weight)
+        except nx.NetworkXNoPath:
+            missing += 1
+            continue
+        elapsed += result.elapsed_ms
+        settled += result.settled
+    found = max(1, len(pairs) - missing)
+    return elapsed / found, settled / found, missing
+
+
+def mean_dijkstra_settled(csr, pairs, weight):
+    settled = [
+        dijkstra(csr, csr.position(o), csr.position(d), weight=weight).settled
+        for o, d in pairs
+    ]
+    return sum(settled) / len(settled)
+
+
+def run(sizes, queries=20, weights=("length", "travel_time")):
+    records = []
+    for size in sizes:
+        region = RegionEntry("synthetic", "drive", grid_graph(size))
+        pairs = random_pairs(region.graph, queries)
+
+        start = time.perf_counter()
+        csr = csr_graph(region)
+        build_s = time.perf_counter() - start
+
+        for weight in weights:
+            nx_ms, nx_settled, nx_missing = time_queries(region, pairs, "networkx", weight)
+            csr_ms, csr_settled, _ = time_queries(region, pairs, "csr", weight)
+            bidi_ms, bidi_settled, _ = time_queries(region, pairs, "bidirectional", weight)
+            bidi_astar_ms, bidi_astar_settled, _ = time_queries(
+                region, pairs, "bidirectional_astar", weight
+            )
+            records.append({
+                "benchmark": "routing",
+                "weight": weight,
+                "nodes": region.graph.number_of_nodes(),
+                "edges": region.graph.number_of_edges(),
+                "csr_build_s": build_s,
+                "csr_mbytes": csr.nbytes / 1e6,
+                "networkx_query_ms": nx_ms,
+                "csr_query_ms": csr_ms,
+                "bidirectional_query_ms": bidi_ms,
+                "bidirectional_astar_query_ms": bidi_astar_ms,
+                "speedup": nx_ms / csr_ms if csr_ms else None,
+                "astar_settled": csr_settled,
+                "networkx_settled": nx_settled,
+                "dijkstra_settled": mean_dijkstra_settled(csr, pairs, weight),
+                "bidirectional_settled": bidi_settled,
+                "bidirectional_astar_settled": bidi_astar_settled,
+                "unreachable": nx_missing,
+            })
+        del region, csr
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.queries)
+    for record in records:
+        print(
+            "{nodes:>9} nodes  {weight:<11}  csr build {csr_build_s:6.2f} s  "
+            "{csr_mbytes:7.1f} MB  networkx {networkx_query_ms:8.1f} ms  "
+            "csr {csr_query_ms:8.1f} ms  x{speedup:4.1f}  "
+            "bidirectional {bidirectional_query_ms:8.1f} ms  "
+            "bidirectional A* {bidirectional_astar_query_ms:8.1f} ms  settled: "
+            "A* {astar_settled:9.0f}  Dijkstra {dijkstra_settled:9.0f}  "
+            "bidirectional {bidirectional_settled:9.0f}  "
+            "bidirectional A* {bidirectional_astar_settled:9.0f}".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Import cost of the plugin at QGIS startup, compared across git revisions.
+
+QGIS calls ``classFactory``, which imports ``route_builder``; this measures
+that import in fresh interpreters, for each revision exported from git. It
+needs a Python that can import ``qgis`` (the one bundled with QGIS, or the
+system one with the QGIS bindings installed). Run from the plugin directory::
+
+    python -m benchmarks.bench_startup HEAD~1 HEAD --runs 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# Modules whose presence after the import shows the heavy stack was loaded
+HEAVY_MODULES = (
+    "numpy",
+    "scipy",
+    "networkx",
+    "pandas",
+    "geopandas",
+    "shapely",
+    "osmnx",
+    "matplotlib",
+    "reportlab",
+    "processing",
+)
+
+# QGIS and Qt are loaded before any plugin, so they are imported before the
+# clock starts and only the plugin's own cost is measured.
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import qgis.core, qgis.gui, qgis.utils
+before = set(sys.modules)
+start = time.perf_counter()
+import {package}
+from {package}.route_builder import RouteBuilder
+elapsed = time.perf_counter() - start
+loaded = set(sys.modules) - before
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(loaded),
+    "heavy": sorted(m for m in {heavy!r} if m in loaded),
+}}))
+"""
+
+
+def export_revision(revision, root, package):
+    """Extract the plugin tree at ``revision`` into ``root/package``."""
+    archive = os.path.join(root, package + ".tar")
+    subprocess.run(
+        ["git", "archive", "--format=tar", "-o", archive, revision],
+        check=True,
+    )
+    with tarfile.open(archive) as tar:
+        tar.extractall(os.path.join(root, package))
+    os.remove(archive)
+
+
+def probe(python, root, package):
+    code = PROBE.format(root=root, package=package, heavy=HEAVY_MODULES)
+    completed = subprocess.run(
+        [python, "-c", code], capture_output=True, text=True, check=False
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(revisions, runs=5, python=sys.executable):
+    records = []
+    root = tempfile.mkdtemp()
+    try:
+        for number, revision in enumerate(revisions):
+            package = f"route_builder_bench_{number}"
+            export_revision(revision, root, package)
+            samples = [probe(python, root, package) for _ in range(runs)]
+            seconds = [sample["seconds"] for sample in samples]
+            records.append({
+                "benchmark": "startup",
+                "revision": revision,
+                "runs": runs,
+                "median_s": statistics.median(seconds),
+                "min_s": min(seconds),
+                "modules": samples[-1]["modules"],
+                "heavy": samples[-1]["heavy"],
+            })
+    finally:
+        shutil.rmtree(root)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("revisions", nargs="*", default=["HEAD~1", "HEAD"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--python", default=sys.executable,
+                        help="Interpreter able to import qgis")
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.revisions, args.runs, args.python)
+    for record in records:
+        print(
+            "{revision:<12} median {median_s:7.3f} s  min {min_s:7.3f} s  "
+            "{modules:>5} modules  heavy: {heavy_list}".format(
+                heavy_list=", ".join(record["heavy"]) or "none", **record
+            )
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
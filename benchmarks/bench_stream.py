@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Memory of whole-frame exports against chunked streaming exports.
+
+For synthetic grids of each size, exports the network once through
+GeoDataFrames (``graph_frames``, flattening, ``export_network``) and once
+with ``stream_network``, recording the time and the peak memory allocated
+on top of the graph as seen by tracemalloc (numpy, pandas and Arrow
+buffers, not GDAL's own)::
+
+    python -m benchmarks.bench_stream --sizes 10000 100000 --format gpkg
+"""
+
+import argparse
+import gc
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import grid_graph
+from core.convert import graph_frames
+from core.export import STREAM_CHUNK_SIZE, export_network, stream_network
+from core.flatten import flatten_list_columns
+
+
+def whole(G, out_dir, fmt, chunk_size):
+    nodes, streets = graph_frames(G)
+    streets = flatten_list_columns(streets)
+    nodes = flatten_list_columns(nodes)
+    export_network(streets, nodes, "bench", out_dir, out_dir, fmt)
+
+
+def streamed(G, out_dir, fmt, chunk_size):
+    stream_network(G, "bench", out_dir, out_dir, fmt, chunk_size=chunk_size)
+
+
+def measured(export, G, fmt, chunk_size, traced):
+    """Seconds, or peak MB above the memory in use before, of ``export``."""
+    out_dir = tempfile.mkdtemp()
+    try:
+        gc.collect()
+        if not traced:
+            start = time.perf_counter()
+            export(G, out_dir, fmt, chunk_size)
+            return time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            export(G, out_dir, fmt, chunk_size)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 1e6
+    finally:
+        shutil.rmtree(out_dir)
+
+
+def run(sizes=(10000, 100000), fmt="gpkg", chunk_size=STREAM_CHUNK_SIZE):
+    records = []
+    for size in sizes:
+        G = grid_graph(size)
+        record = {
+            "benchmark": "stream",
+            "format": fmt,
+            "nodes": G.number_of_nodes(),
+            "edges": G.number_of_edges(),
+            "chunk_size": chunk_size,
+        }
+        # tracemalloc slows allocations down, so time without it
+        for name, export in (("whole", whole), ("stream", streamed)):
+            record[f"{name}_s"] = measured(export, G, fmt, chunk_size, traced=False)
+            record[f"{name}_peak_mb"] = measured(export, G, fmt, chunk_size, traced=True)
+        records.append(record)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--format", default="gpkg", choices=["gpkg", "fgb", "parquet", "shp"])
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.sizes, args.format, args.chunk_size)
+    for record in records:
+        print(
+            "{nodes:>9} nodes {edges:>9} edges  {format:<8} whole {whole_s:7.2f} s "
+            "{whole_peak_mb:8.1f} MB  stream {stream_s:7.2f} s {stream_peak_mb:8.1f} MB"
+            .format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental OSM change updates against full rebuilds, by change size.
+
+A synthetic grid is written as an OSM extract and built once; change files
+of growing size are then applied to copies of the graph, patching the
+nearest-node and CSR indexes, and compared with building everything again::
+
+    python -m benchmarks.bench_update --size 100000 --changes 10 100 1000
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import apply_osm_change, grid_graph, write_osm_change, write_osm_xml
+from core.csr import CSRGraph
+from core.osm_ingest import build_graph_from_extract, build_network_from_extract
+from core.osm_update import apply_change, read_osc
+from core.spatial_index import NodeIndex
+
+
+def run(size=100000, changes=(10, 100, 1000)):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        grid = grid_graph(size)
+        extract = write_osm_xml(grid, os.path.join(tmp_dir, "grid.osm"))
+        start = time.perf_counter()
+        G, raw = build_network_from_extract(extract)
+        build_s = time.perf_counter() - start
+        node_index = NodeIndex.from_graph(G)
+        csr = CSRGraph.from_networkx(G)
+
+        records = []
+        for count in changes:
+            path = write_osm_change(grid, os.path.join(tmp_dir, f"{count}.osc"), count)
+            graph, network = copy.deepcopy((G, raw))
+
+            start = time.perf_counter()
+            summary = apply_change(graph, network, read_osc(path))
+            apply_s = time.perf_counter() - start
+            start = time.perf_counter()
+            node_index.patched(graph, summary)
+            csr.patched(graph, summary)
+            patch_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rebuilt = build_graph_from_extract(
+                apply_osm_change(extract, path, os.path.join(tmp_dir, "after.osm"))
+            )
+            NodeIndex.from_graph(rebuilt)
+            CSRGraph.from_networkx(rebuilt)
+            rebuild_s = time.perf_counter() - start
+
+            records.append({
+                "benchmark": "update",
+                "nodes": G.number_of_nodes(),
+                "edges": G.number_of_edges(),
+                "changes": count,
+                "removed_edges": len(summary.removed_edges),
+                "added_edges": len(summary.added_edges),
+                "apply_s": apply_s,
+                "patch_s": patch_s,
+                "rebuild_s": rebuild_s,
+                "initial_build_s": build_s,
+            })
+        return records
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--json", help="Write the records to this file")
+    args = parser.parse_args(argv)
+
+    records = run(args.size, args.changes)
+    for record in records:
+        print(
+            "{changes:>6} changes (-{removed_edges}/+{added_edges} edges): "
+            "apply {apply_s:.3f} s, patch indexes {patch_s:.3f} s, "
+            "full rebuild {rebuild_s:.1f} s".format(**record)
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(records, handle, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite: every offline benchmark at a preset of graph sizes, as one
+JSON document that can be compared with the run of another commit.
+
+The suite needs no network access: graphs are synthetic grids, written as
+OSM XML where a benchmark ingests files, plus the OSM fixtures bundled with
+the tests. Run from the plugin directory::
+
+    python -m benchmarks.suite --preset standard --json bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite --preset quick --compare bench-main.json
+
+``--compare`` matches the records of both runs by their descriptive fields
+(benchmark, sizes, formats...) and prints the ratio of every timing,
+flagging those slower than ``--threshold``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import (
+    bench_convert, bench_export, bench_ingest, bench_pipeline, bench_routing, bench_stream,
+)
+
+PRESETS = {
+    "quick": (1000, 10000),
+    "standard": (1000, 10000, 100000),
+    "full": (1000, 10000, 100000, 1000000),
+}
+
+# name -> callable(sizes) returning records
+BENCHMARKS = {
+    "pipeline": lambda sizes: bench_pipeline.run(sizes),
+    "convert": lambda sizes: bench_convert.run(sizes),
+    "stream": lambda sizes: bench_stream.run(sizes),
+    "export": lambda sizes: bench_export.run(sizes),
+    "routing": lambda sizes: bench_routing.run(sizes, queries=20),
+    "ingest": lambda sizes: [
+        record for size in sizes for record in bench_ingest.run(size=size)
+    ],
+}
+
+# Record fields telling records apart, besides their timings and results
+IDENTITY_FIELDS = (
+    "benchmark", "network", "nodes", "graph_nodes", "format", "weight", "extract",
+)
+# Record fields holding timings, compared between runs (lower is better)
+TIMING_SUFFIXES = ("_s", "_ms", "_us", "seconds")
+DEFAULT_THRESHOLD = 1.2
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Where the suite ran, stored with the records."""
+    versions = {}
+    for name in ("numpy", "scipy", "networkx", "pandas", "shapely", "osmnx", "pyogrio"):
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    return {
+        "revision": git_revision(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def run(sizes, names=None, log=None):
+    """``{"environment", "sizes", "records"}`` of the chosen benchmarks."""
+    records = []
+    for name in names or list(BENCHMARKS):
+        start = time.perf_counter()
+        found = BENCHMARKS[name](sizes)
+        records.extend(found)
+        if log is not None:
+            log(f"{name}: {len(found)} records in {time.perf_counter() - start:.1f} s")
+    return {"environment": environment(), "sizes": list(sizes), "records": records}
+
+
+def is_timing(field, value):
+    return isinstance(value, (int, float)) and field.endswith(TIMING_SUFFIXES)
+
+
+def record_key(record):
+    """Descriptive fields identifying a record across runs."""
+    return tuple(sorted(
+        (field, value)
+        for field, value in record.items()
+        if field in IDENTITY_FIELDS
+    ))
+
+
+def compare(baseline, current):
+    """``(key, field, before, after, ratio)`` for every timing in both runs."""
+    before = {record_key(record): record for record in baseline["records"]}
+    rows = []
+    for record in current["records"]:
+        old = before.get(record_key(record))
+        if old is None:
+            continue
+        for field, value in record.items():
+            previous = old.get(field)
+            if is_timing(field, value) and is_timing(field, previous) and previous > 0:
+                rows.append((record_key(record), field, previous, value, value / previous))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Overrides the preset sizes")
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ratio above which a timing counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or PRESETS[args.preset]
+    results = run(sizes, args.benchmarks, log=lambda line: print(line, file=sys.stderr))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = 0
+        print(f"Compared with {baseline['environment'].get('revision')}", file=sys.stderr)
+        for key, field, before, after, ratio in compare(baseline, results):
+            slower = ratio > args.threshold
+            regressions += slower
+            label = " ".join(str(value) for _, value in key)
+            print(
+                f"{'SLOWER' if slower else '':<6} {label:<40} {field:<24} "
+                f"{before:10.4g} -> {after:10.4g}  x{ratio:5.2f}",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic osmnx-like street graphs for benchmarks, no network access needed.
+"""
+
+import math
+import xml.etree.ElementTree as ET
+
+import networkx as nx
+import numpy as np
+
+# Roughly 100 m between neighbouring intersections
+STEP_DEG = 0.0009
+SPEEDS_KPH = np.array([30.0, 50.0, 80.0])
+
+
+def grid_graph(n_nodes, seed=0, drop=0.1, lat0=-7.2, lon0=-39.4):
+    """Jittered square grid with about ``n_nodes`` nodes.
+
+    Streets are two-way with ``length`` (metres), ``speed_kph`` and
+    ``travel_time`` (seconds); a fraction ``drop`` of them is removed so
+    the network is not perfectly regular.
+    """
+    rng = np.random.default_rng(seed)
+    side = int(math.ceil(math.sqrt(n_nodes)))
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lats = lat0 + rows * STEP_DEG + rng.normal(0, STEP_DEG / 10, side * side)
+    lons = lon0 + cols * STEP_DEG + rng.normal(0, STEP_DEG / 10, side * side)
+    ids = 1_000_000_000 + np.arange(side * side)
+
+    right = np.flatnonzero(cols < side - 1)
+    up = np.flatnonzero(rows < side - 1)
+    u = np.concatenate([right, up])
+    v = np.concatenate([right + 1, up + side])
+    keep = rng.random(len(u)) >= drop
+    u, v = u[keep], v[keep]
+
+    lat_m = (lats[v] - lats[u]) * 111_195.0
+    lon_m = (lons[v] - lons[u]) * 111_195.0 * np.cos(np.radians(lats[u]))
+    length = np.hypot(lat_m, lon_m)
+    speed = SPEEDS_KPH[rng.integers(0, len(SPEEDS_KPH), len(u))]
+    travel_time = length / (speed / 3.6)
+
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    G.add_nodes_from(
+        (int(i), {"x": float(x), "y": float(y)}) for i, x, y in zip(ids, lons, lats)
+    )
+    for a, b in ((u, v), (v, u)):
+        G.add_edges_from(
+            (
+                int(ids[s]),
+                int(ids[t]),
+                {"length": float(l), "speed_kph": float(kph), "travel_time": float(tt)},
+            )
+            for s, t, l, kph, tt in zip(a, b, length, speed, travel_time)
+        )
+    return G
+
+
+def random_pairs(G, count, seed=1):
+    """``count`` reproducible (origin, destination) node pairs."""
+    rng = np.random.default_rng(seed)
+    nodes = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    picks = rng.choice(nodes, size=(count, 2))
+    return [(int(o), int(d)) for o, d in picks]
+
+
+def osm_streets(G, footway_share=0.1, seed=2):
+    """``(way_id, u, v, highway)`` of the ways ``write_osm_xml`` writes."""
+    rng = np.random.default_rng(seed)
+    streets = sorted({tuple(sorted((u, v))) for u, v in G.edges()})
+    return [
+        (way_id, u, v, "footway" if rng.random() < footway_share else "residential")
+        for way_id, (u, v) in enumerate(streets, start=1)
+    ]
+
+
+def write_osm_xml(G, path, footway_share=0.1, seed=2):
+    """Write ``G`` as an OSM XML extract, one two-node way per street.
+
+    A share of the ways is tagged as footway so the drive filter has
+    something to reject.
+    """
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for node, data in G.nodes(data=True):
+            handle.write(
+                f'  <node id="{node}" lat="{data["y"]:.7f}" lon="{data["x"]:.7f}"/>\n'
+            )
+        for way_id, u, v, highway in osm_streets(G, footway_share, seed):
+            handle.write(
+                f'  <way id="{way_id}"><nd ref="{u}"/><nd ref="{v}"/>'
+                f'<tag k="highway" v="{highway}"/></way>\n'
+            )
+        handle.write("</osm>\n")
+    return path
+
+
+def write_osm_change(G, path, count, footway_share=0.1, seed=3):
+    """Write an osmChange file editing ``count`` ways of ``write_osm_xml(G)``.
+
+    The picked ways are in turn deleted, made one-way, or doubled by a new
+    way through a new node a third of a block to the side.
+    """
+    rng = np.random.default_rng(seed)
+    streets = osm_streets(G, footway_share)
+    picks = rng.choice(len(streets), size=min(count, len(streets)), replace=False)
+    next_node = max(G.nodes) + 1
+    next_way = len(streets) + 1
+    actions = {"create": [], "modify": [], "delete": []}
+    for number, pick in enumerate(picks.tolist()):
+        way_id, u, v, highway = streets[pick]
+        if number % 3 == 0:
+            actions["delete"].append(f'<way id="{way_id}" version="2"/>')
+        elif number % 3 == 1:
+            actions["modify"].append(
+                f'<way id="{way_id}" version="2"><nd ref="{u}"/><nd ref="{v}"/>'
+                f'<tag k="highway" v="{highway}"/><tag k="oneway" v="yes"/></way>'
+            )
+        else:
+            a, b = G.nodes[u], G.nodes[v]
+            lat = (a["y"] + b["y"]) / 2 + STEP_DEG / 3
+            lon = (a["x"] + b["x"]) / 2 + STEP_DEG / 3
+            actions["create"].append(
+                f'<node id="{next_node}" version="1" lat="{lat:.7f}" lon="{lon:.7f}"/>'
+            )
+            actions["create"].append(
+                f'<way id="{next_way}" version="1"><nd ref="{u}"/>'
+                f'<nd ref="{next_node}"/><nd ref="{v}"/>'
+                '<tag k="highway" v="residential"/></way>'
+            )
+            next_node += 1
+            next_way += 1
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n<osmChange version="0.6">\n')
+        for action, elements in actions.items():
+            handle.write(f"<{action}>\n")
+            handle.writelines(f"  {element}\n" for element in elements)
+            handle.write(f"</{action}>\n")
+        handle.write("</osmChange>\n")
+    return path
+
+
+def apply_osm_change(osm_path, osc_path, path):
+    """Write the extract ``osm_path`` as it is after ``osc_path``, for checks."""
+    tree = ET.parse(osm_path)
+    root = tree.getroot()
+    changed = {}
+    for action in ET.parse(osc_path).getroot():
+        for elem in action:
+            changed[elem.tag, elem.get("id")] = None if action.tag == "delete" else elem
+    for elem in list(root):
+        if (elem.tag, elem.get("id")) in changed:
+            root.remove(elem)
+    # New and modified nodes go before the ways, as in an extract
+    for (tag, _), elem in sorted(changed.items(), key=lambda item: item[0][0] != "node"):
+        if elem is not None:
+            root.append(elem)
+    tree.write(path, encoding="utf-8", xml_declaration=True)
+    return path
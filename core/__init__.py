@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Qt-independent building blocks used by the Route Builder plugin: street
+graph caching, indexing, routing and export.
+"""
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""``python -m core``: the command line interface of ``core.cli``."""
+
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
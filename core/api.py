@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+"""
+Headless entry points of Route Builder.
+
+Everything the plugin does through its dialogs is available here as plain
+functions over a ``GraphRegistry``: building and exporting a street
+network with its report, single and batch routes, cost matrices,
+isochrones, tiling and OSM change updates. Nothing here touches Qt, so the
+same code runs inside the QGIS task manager, from ``core.cli`` in a cron
+job, or from a notebook::
+
+    from route_builder.core import api
+
+    registry = api.open_registry()
+    result = api.route(registry, "Crato, Ceará", (-7.23, -39.41), (-7.21, -39.31))
+
+Long operations accept ``progress``, a callable receiving the fraction
+done. It may raise to abort (the plugin tasks raise when the user cancels),
+so it is only called where stopping leaves no half-written state behind.
+Failures the user can act on are raised as ``RuntimeError``.
+"""
+
+import os
+import time
+
+from .geometry import douglas_peucker, line_wkb
+from .graph_cache import DEFAULT_MAX_BYTES as DEFAULT_CACHE_BYTES
+from .graph_cache import SIDECARS_KEY, GraphCache, file_digest
+from .graph_registry import DEFAULT_MAX_BYTES as DEFAULT_MEMORY_BYTES
+from .graph_registry import GraphRegistry
+from .profiling import PROFILE_SUFFIXES, Profiler, span
+from .routing import RouteResult, csr_graph, route_coordinates, route_totals, shortest_path
+
+# Endpoints farther than this from any street node are rejected
+MAX_SNAP_DISTANCE_M = 5000
+
+
+def _progress(progress, done):
+    if progress is not None:
+        progress(done)
+
+
+def _scaled(progress, start, end):
+    """``progress`` for a stage covering ``start`` to ``end`` of the work."""
+    if progress is None:
+        return None
+    return lambda done: progress(start + (end - start) * done)
+
+
+def open_registry(cache_dir=None, cache_bytes=DEFAULT_CACHE_BYTES,
+                  memory_bytes=DEFAULT_MEMORY_BYTES):
+    """``GraphRegistry`` over a graph cache, the default one if no directory."""
+    return GraphRegistry(GraphCache(cache_dir, max_bytes=cache_bytes), max_bytes=memory_bytes)
+
+
+def load_region(registry, place, network_type="drive"):
+    """The loaded region of ``place``, downloaded or read from the cache."""
+    try:
+        return registry.resolve(place, network_type)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch road networks: {str(e)}") from e
+
+
+def node_index(region):
+    from .spatial_index import NodeIndex
+
+    return region.derived("node_index", NodeIndex.from_graph)
+
+
+def snap_points(index, csr, points):
+    """CSR positions of the street nodes nearest to (lat, lon) ``points``."""
+    lats, lons = zip(*points)
+    node_ids, _ = index.query(lats, lons, max_distance=MAX_SNAP_DISTANCE_M)
+    if (node_ids < 0).any():
+        raise RuntimeError(
+            f"{int((node_ids < 0).sum())} points are farther than "
+            f"{MAX_SNAP_DISTANCE_M} m from the street network."
+        )
+    return csr.node_ids.searchsorted(node_ids)
+
+
+def report_path_for(streets_dir):
+    """Default location of the build report, next to the exported streets."""
+    from .report import REPORT_NAME
+
+    return os.path.join(streets_dir, REPORT_NAME)
+
+
+def profile_path_for(streets_dir, profiler):
+    """Default location of the profile of the slowest build stage."""
+    return os.path.join(streets_dir, "route_profile" + PROFILE_SUFFIXES[profiler])
+
+
+def build_network(registry, place, streets_dir, nodes_dir, list_mode="join",
+                  output_format="gpkg", extract=None, clip=None, report_path=None,
+                  progress=None, profiler=None, profile_path=None, keep_graph=True,
+                  chunk_size=None):
+    """Load a region, export its streets and nodes and write the report.
+
+    Every stage is timed (see ``core.profiling``); the breakdown is returned
+    as ``stages`` and added to the report.
+
+    :param extract: Local .osm / .osm.pbf file replacing the Overpass
+        download, optionally clipped to ``clip`` (bbox or shapely geometry).
+    :param report_path: PDF report to write, or None for no report.
+    :param profiler: ``Profiler`` recording the stages, e.g. one logging
+        them; a silent one by default.
+    :param profile_path: Where to write the profile of the slowest stage
+        when ``profiler`` runs cProfile or pyinstrument.
+    :param keep_graph: False when nothing routes on the region afterwards:
+        the graph is dropped from ``registry`` and freed while converting,
+        so it does not stay in memory next to the exported frames.
+    :param chunk_size: Stream the layers to their files this many edges or
+        nodes at a time (``export.stream_network``) rather than building
+        whole GeoDataFrames, for networks too large to hold twice. By
+        default networks of ``export.STREAM_THRESHOLD_EDGES`` edges or more
+        are streamed when the format allows it; 0 never streams.
+    """
+    from .convert import graph_frames
+    from .export import (
+        STREAM_CHUNK_SIZE,
+        STREAM_THRESHOLD_EDGES,
+        can_stream,
+        export_network,
+        stream_network,
+    )
+    from .flatten import flatten_list_columns
+    from .osm_ingest import extract_builder, extract_fingerprint
+    from .report import write_report
+
+    profiler = profiler or Profiler()
+    start_time = time.time()
+    with profiler.active():
+        with span("load"):
+            builder = source_hash = None
+            if extract:
+                builder = extract_builder(
+                    extract, clip, progress=_scaled(progress, 0.0, 0.4)
+                )
+                source_hash = extract_fingerprint(extract, clip)
+            G = registry.resolve(place, "drive", builder, source_hash).graph
+            if not keep_graph:
+                registry.discard(place, "drive")
+        num_nodes, num_streets = len(G), G.number_of_edges()
+        _progress(progress, 0.4)
+        if (
+            chunk_size is None
+            and num_streets >= STREAM_THRESHOLD_EDGES
+            and can_stream(output_format)
+        ):
+            chunk_size = STREAM_CHUNK_SIZE
+
+        if chunk_size:
+            with span("export"):
+                streets_path, nodes_path = stream_network(
+                    G,
+                    place,
+                    streets_dir,
+                    nodes_dir,
+                    output_format,
+                    list_mode,
+                    chunk_size,
+                    release=not keep_graph,
+                    progress=_scaled(progress, 0.4, 0.95),
+                )
+            del G
+        else:
+            with span("graph_to_gdfs"):
+                gdf_nodes, gdf_streets = graph_frames(G, release=not keep_graph)
+            del G
+            _progress(progress, 0.55)
+
+            with span("flatten"):
+                gdf_streets = flatten_list_columns(gdf_streets, list_mode)
+                gdf_nodes = flatten_list_columns(gdf_nodes, list_mode)
+            _progress(progress, 0.65)
+
+            with span("export"):
+                streets_path, nodes_path = export_network(
+                    gdf_streets,
+                    gdf_nodes,
+                    place,
+                    streets_dir,
+                    nodes_dir,
+                    output_format,
+                    progress=_scaled(progress, 0.65, 0.95),
+                )
+            del gdf_streets, gdf_nodes
+
+        elapsed_time = time.time() - start_time
+        if report_path:
+            # The report lists the stages before it
+            stages = profiler.records()
+            with span("report"):
+                write_report(
+                    report_path, place, elapsed_time, num_nodes, num_streets, stages=stages
+                )
+    if profile_path:
+        profile_path = profiler.write_profile(profile_path)
+    _progress(progress, 1.0)
+    return {
+        "streets_path": streets_path,
+        "nodes_path": nodes_path,
+        "report_path": report_path,
+        "elapsed_time": elapsed_time,
+        "nodes": num_nodes,
+        "streets": num_streets,
+        "stages": profiler.records(),
+        "profiled_stage": profiler.profiled_stage,
+        "profile_path": profile_path,
+    }
+
+
+def update_network(registry, place, change_path, geopackage=None, list_mode="join",
+                   progress=None):
+    """Apply an OSM change file to a region built from a local extract.
+
+    The loaded graph is edited in place and its indexes patched, then the
+    graph cache and, optionally, a GeoPackage export are brought up to date.
+    Routes of the region should not run at the same time, and ``progress``
+    is not called once the graph is being edited.
+    """
+    from .export import update_geopackage
+    from .osm_ingest import RAW_SIDECAR
+    from .osm_update import apply_change, read_osc
+
+    cache = registry.graph_cache
+    region = registry.resolve(place, "drive")
+    raw = region.derived(RAW_SIDECAR, lambda G: cache.get_sidecar(place, "drive", RAW_SIDECAR))
+    if raw is None:
+        raise RuntimeError(
+            "Only networks built from a local OSM extract can be updated "
+            "with change files."
+        )
+    digest = file_digest(change_path)
+    if digest in raw.applied:
+        raise RuntimeError("This change file was already applied.")
+    change = read_osc(change_path)
+    _progress(progress, 0.2)
+
+    summary = apply_change(region.graph, raw, change)
+    raw.applied.append(digest)
+    region.patch(summary)
+
+    G = region.graph
+    G.graph[SIDECARS_KEY] = {RAW_SIDECAR: raw}
+    cache.put(place, "drive", G, source_hash=region.source_hash)
+
+    if geopackage:
+        update_geopackage(geopackage, G, summary, list_mode)
+    return {"summary": summary, "geopackage": geopackage}
+
+
+def tile_network(tiles, place, extract, progress=None):
+    """Cut the drive network of a local extract into routing tiles."""
+    from .tiles import tiles_from_extract
+
+    tiles.discard(place)
+    manifest = tiles_from_extract(extract, tiles.path(place), progress=progress)
+    return {
+        "place": place,
+        "tiles": len(manifest["tiles"]),
+        "nodes": manifest["nodes"],
+        "edges": manifest["edges"],
+    }
+
+
+def _cached(route_cache, graph, version, origin_node, destination_node, weight, compute):
+    """Route from the route cache, or from ``compute()`` and then cached."""
+    if route_cache is None:
+        return compute()
+    start = time.perf_counter()
+    key = route_cache.key(graph, version, origin_node, destination_node, weight)
+    hit = route_cache.get(key)
+    if hit is None:
+        computed = compute()
+        route_cache.put(key, computed)
+        return computed
+    route = hit["route"]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return dict(
+        hit,
+        route=RouteResult(
+            route.nodes,
+            route.cost,
+            route.weight,
+            f"{route.backend}, cached",
+            0,
+            elapsed_ms,
+            route.edges,
+        ),
+    )
+
+
+def _finish(computed, origin_snap, destination_snap, simplify_m):
+    """Route result: the route, its line as WKB and the snap distances."""
+    coordinates = computed["coordinates"]
+    if simplify_m > 0:
+        coordinates = coordinates[douglas_peucker(coordinates, simplify_m)]
+    return {
+        "route": computed["route"],
+        "wkb": line_wkb(coordinates),
+        "vertices": len(coordinates),
+        "length_m": computed["length_m"],
+        "travel_time_s": computed["travel_time_s"],
+        "origin_snap": origin_snap,
+        "destination_snap": destination_snap,
+    }
+
+
+def _no_snap():
+    return RuntimeError(
+        f"No street node found within {MAX_SNAP_DISTANCE_M} m of the "
+        "origin or destination."
+    )
+
+
+def _route_on_tiles(store, origin, destination, weight, route_cache, progress):
+    import numpy as np
+
+    from .tiles import route as tiled_route
+
+    start = time.perf_counter()
+    origin_node, origin_snap = store.snap(*origin, max_distance=MAX_SNAP_DISTANCE_M)
+    destination_node, destination_snap = store.snap(
+        *destination, max_distance=MAX_SNAP_DISTANCE_M
+    )
+    if origin_node is None or destination_node is None:
+        raise _no_snap()
+    _progress(progress, 0.3)
+
+    def compute():
+        found = tiled_route(store, origin_node, destination_node, weight)
+        if found is None:
+            raise RuntimeError("No path found between the origin and destination.")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return {
+            "route": RouteResult(
+                found.nodes, found.cost, weight, "tiles", found.settled, elapsed_ms
+            ),
+            # Tiles are not simplified, so the nodes trace the street shapes
+            "coordinates": np.asarray(found.coordinates, dtype=np.float64),
+            "length_m": found.length,
+            "travel_time_s": found.travel_time,
+        }
+
+    computed = _cached(
+        route_cache, store.tile_dir, store.version, origin_node, destination_node, weight,
+        compute,
+    )
+    return computed, origin_snap, destination_snap
+
+
+def route(registry, place, origin, destination, backend="csr", weight="length",
+          tiles=None, simplify_m=0, route_cache=None, progress=None):
+    """Snap two (lat, lon) endpoints and route between them.
+
+    Places with a tile set in ``tiles`` (a ``TileCatalog``) are routed
+    across their tiles instead of through a graph loaded whole. The route
+    line is returned as WKB, thinned by Douglas-Peucker when
+    ``simplify_m`` is above zero.
+
+    With a ``route_cache``, a route between the same snapped nodes of the
+    same graph version is not searched again.
+    """
+    import networkx as nx
+
+    if tiles is not None and tiles.contains(place):
+        found = _route_on_tiles(
+            tiles.store(place), origin, destination, weight, route_cache, progress
+        )
+        _progress(progress, 1.0)
+        return _finish(*found, simplify_m)
+
+    region = load_region(registry, place)
+    _progress(progress, 0.4)
+
+    index = node_index(region)
+    origin_node, origin_snap = index.nearest(*origin, max_distance=MAX_SNAP_DISTANCE_M)
+    destination_node, destination_snap = index.nearest(
+        *destination, max_distance=MAX_SNAP_DISTANCE_M
+    )
+    if origin_node is None or destination_node is None:
+        raise _no_snap()
+    _progress(progress, 0.5)
+
+    def compute():
+        try:
+            found = shortest_path(region, origin_node, destination_node, backend, weight)
+        except nx.NetworkXNoPath as e:
+            raise RuntimeError("No path found between the origin and destination.") from e
+        _progress(progress, 0.9)
+        length_m, travel_time_s = route_totals(region, found)
+        return {
+            "route": found,
+            "coordinates": route_coordinates(region, found),
+            "length_m": length_m,
+            "travel_time_s": travel_time_s,
+        }
+
+    computed = _cached(
+        route_cache, region.key, region.version, origin_node, destination_node, weight,
+        compute,
+    )
+    _progress(progress, 1.0)
+    return _finish(computed, origin_snap, destination_snap, simplify_m)
+
+
+def route_pairs(registry, place, pairs, weight="length", workers=None, progress=None):
+    """Route every ``(pair_id, o_lat, o_lon, d_lat, d_lon)`` of ``pairs``.
+
+    :returns: ``BatchRoute`` list in the order of ``pairs`` and the
+        (lon, lat) vertices of every routed pair (None otherwise).
+    """
+    from .batch import STATUS_OK, route_batch
+
+    region = load_region(registry, place)
+    _progress(progress, 0.2)
+    index = node_index(region)
+    csr = csr_graph(region)
+    _progress(progress, 0.3)
+
+    routes = route_batch(
+        csr,
+        index,
+        pairs,
+        weight=weight,
+        workers=workers,
+        max_snap_distance=MAX_SNAP_DISTANCE_M,
+        progress=_scaled(progress, 0.3, 0.95),
+    )
+    coordinates = [
+        list(zip(csr.lons[found.nodes].tolist(), csr.lats[found.nodes].tolist()))
+        if found.status == STATUS_OK
+        else None
+        for found in routes
+    ]
+    _progress(progress, 1.0)
+    return {"routes": routes, "coordinates": coordinates, "weight": weight}
+
+
+def matrix(registry, place, origins, destinations, weight="length", workers=None,
+           output=None, progress=None):
+    """Travel cost matrix between two lists of (lat, lon) points.
+
+    :param output: See ``core.matrix.cost_matrix``.
+    """
+    from .matrix import cost_matrix
+
+    region = load_region(registry, place)
+    _progress(progress, 0.2)
+    index = node_index(region)
+    csr = csr_graph(region)
+    origins = snap_points(index, csr, origins)
+    destinations = snap_points(index, csr, destinations)
+    _progress(progress, 0.3)
+
+    costs = cost_matrix(
+        csr,
+        origins,
+        destinations,
+        weight=weight,
+        workers=workers,
+        output=output,
+        progress=_scaled(progress, 0.3, 0.99),
+    )
+    _progress(progress, 1.0)
+    return {
+        "output": output,
+        "matrix": costs if output is None else None,
+        "shape": (len(origins), len(destinations)),
+    }
+
+
+def isochrone_features(registry, place, depots, minutes, method="buffer", buffer_m=None,
+                       workers=None, progress=None):
+    """Travel time isochrones around every (lat, lon) depot.
+
+    :returns: ``features``, one ``(wkb, attributes)`` pair per depot and
+        travel time, with MultiPolygon geometries and ``depot`` (index in
+        ``depots``), ``minutes``, ``area_km2`` and ``nodes`` attributes.
+    """
+    import shapely
+
+    from .isochrones import DEFAULT_BUFFER_M, isochrones
+
+    region = load_region(registry, place)
+    _progress(progress, 0.2)
+    index = node_index(region)
+    csr = csr_graph(region)
+    sources = snap_points(index, csr, depots)
+    _progress(progress, 0.3)
+
+    result = isochrones(
+        csr,
+        sources,
+        [60.0 * value for value in sorted(minutes)],
+        weight="travel_time",
+        method=method,
+        buffer_m=DEFAULT_BUFFER_M if buffer_m is None else buffer_m,
+        workers=workers,
+        progress=_scaled(progress, 0.3, 0.95),
+    )
+
+    # Multi-polygons throughout, so every feature fits one layer type
+    features = []
+    for depot, bands in enumerate(result):
+        for iso in bands:
+            geometry = iso.geometry
+            if geometry.geom_type == "Polygon":
+                geometry = shapely.MultiPolygon([geometry])
+            features.append((
+                shapely.to_wkb(geometry),
+                {
+                    "depot": depot,
+                    "minutes": iso.limit / 60.0,
+                    "area_km2": iso.area_m2 / 1e6,
+                    "nodes": iso.nodes,
+                },
+            ))
+    _progress(progress, 1.0)
+    return {"place": place, "method": method, "features": features}
+
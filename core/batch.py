@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Batch origin-destination routing.
+
+All endpoints are snapped in one vectorised index query, pairs are grouped by
+origin node so each group is answered by a single one-to-many Dijkstra tree,
+and the groups are spread over a process pool sharing the graph read-only.
+"""
+
+import csv
+
+import numpy as np
+
+from .parallel import SharedCSR, csr_pool, default_workers, worker_csr
+from .search import one_to_many
+
+STATUS_OK = "ok"
+STATUS_NO_PATH = "no_path"
+STATUS_SNAP_FAILED = "snap_failed"
+
+CSV_COLUMNS = ("origin_lat", "origin_lon", "destination_lat", "destination_lon")
+
+# Origin groups sent to a worker per task; small enough to balance load
+GROUPS_PER_TASK = 8
+
+
+class BatchRoute:
+    """Outcome of one O/D pair of a batch."""
+
+    def __init__(self, pair_id, status, cost=float("inf"), nodes=None,
+                 origin_snap=float("inf"), destination_snap=float("inf")):
+        self.pair_id = pair_id
+        self.status = status
+        self.cost = cost
+        self.nodes = nodes or []
+        self.origin_snap = origin_snap
+        self.destination_snap = destination_snap
+
+
+def read_od_csv(path, delimiter=","):
+    """``[(pair_id, o_lat, o_lon, d_lat, d_lon)]`` from a CSV file.
+
+    The file needs ``origin_lat, origin_lon, destination_lat,
+    destination_lon`` columns; an optional ``id`` column names the pairs,
+    otherwise they are numbered from 1.
+    """
+    pairs = []
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle, delimiter=delimiter)
+        missing = [c for c in CSV_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing the columns: {', '.join(missing)}")
+        for number, row in enumerate(reader, start=1):
+            pairs.append((row.get("id") or str(number),) + tuple(
+                float(row[column]) for column in CSV_COLUMNS
+            ))
+    return pairs
+
+
+def group_by_origin(origins, destinations):
+    """``{origin: [(row, destination), ...]}`` for the snapped rows."""
+    groups = {}
+    for row, (origin, destination) in enumerate(zip(origins, destinations)):
+        if origin >= 0 and destination >= 0:
+            groups.setdefault(int(origin), []).append((row, int(destination)))
+    return groups
+
+
+def route_groups(csr, groups, weight):
+    """``[(row, cost, node positions)]`` answering each origin group."""
+    answers = []
+    for origin, rows in groups:
+        tree = one_to_many(csr, origin, {destination for _, destination in rows}, weight)
+        for row, destination in rows:
+            found = tree.path(destination)
+            if found is None:
+                answers.append((row, float("inf"), None))
+            else:
+                answers.append((row, tree.cost(destination), found[0]))
+    return answers
+
+
+def _route_groups_in_worker(groups, weight):
+    return route_groups(worker_csr(), groups, weight)
+
+
+def route_batch(csr, node_index, pairs, weight="length", workers=None,
+                max_snap_distance=5000, progress=None):
+    """Route every ``(pair_id, o_lat, o_lon, d_lat, d_lon)`` of ``pairs``.
+
+    :param workers: Worker processes; 1 routes in the calling process.
+    :param progress: Optional callable receiving the fraction done.
+    :returns: ``BatchRoute`` list in the order of ``pairs``, with node
+        positions in ``csr``.
+    """
+    if not pairs:
+        return []
+    workers = workers or default_workers()
+    ids, o_lat, o_lon, d_lat, d_lon = zip(*pairs)
+
+    # One vectorised query for every origin and destination
+    snapped, snap_m = node_index.query(
+        np.concatenate([o_lat, d_lat]),
+        np.concatenate([o_lon, d_lon]),
+        max_distance=max_snap_distance,
+    )
+    found = snapped >= 0
+    positions = np.full(len(snapped), -1, dtype=np.int64)
+    positions[found] = np.searchsorted(csr.node_ids, snapped[found])
+    origins, destinations = positions[: len(pairs)], positions[len(pairs):]
+
+    results = [
+        BatchRoute(pair_id, STATUS_SNAP_FAILED, origin_snap=float(snap_m[row]),
+                   destination_snap=float(snap_m[len(pairs) + row]))
+        for row, pair_id in enumerate(ids)
+    ]
+
+    groups = list(group_by_origin(origins, destinations).items())
+    chunks = [
+        groups[i: i + GROUPS_PER_TASK] for i in range(0, len(groups), GROUPS_PER_TASK)
+    ]
+    done = 0
+
+    def collect(answers):
+        nonlocal done
+        for row, cost, nodes in answers:
+            result = results[row]
+            if nodes is None:
+                result.status = STATUS_NO_PATH
+            else:
+                result.status = STATUS_OK
+                result.cost = cost
+                result.nodes = nodes
+        done += 1
+        if progress is not None:
+            progress(done / len(chunks))
+
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            collect(route_groups(csr, chunk, weight))
+        return results
+
+    with SharedCSR(csr) as shared, csr_pool(shared, workers) as pool:
+        futures = [pool.submit(_route_groups_in_worker, chunk, weight) for chunk in chunks]
+        for future in futures:
+            collect(future.result())
+    return results
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface to ``core.api``, for running Route Builder without
+QGIS, e.g. from cron on a batch server. Run from the plugin directory::
+
+    python -m core build "Crato, Ceará" --streets-dir out --nodes-dir out
+    python -m core route "Crato, Ceará" --origin=-7.23,-39.41 --destination=-7.21,-39.31
+    python -m core batch "Crato, Ceará" pairs.csv --output routes.csv --workers 16
+    python -m core matrix "Crato, Ceará" --origins a.csv --destinations b.csv --output m.parquet
+    python -m core isochrones "Crato, Ceará" --depots depots.csv --minutes 5 10 15 --output iso.gpkg
+
+Graphs are cached between runs in ``--cache-dir``, the same cache format as
+the plugin. Results are printed as JSON on stdout and progress, with
+``--progress``, on stderr. ``build`` also reports the time and memory of
+every stage, and ``--profile cprofile`` saves a profile of the slowest one.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from . import api
+from .costs import COST_MODES
+from .export import EXPORT_FORMATS
+from .flatten import FLATTEN_MODES
+from .graph_cache import default_cache_dir
+from .isochrones import DEFAULT_BUFFER_M, METHODS
+from .profiling import PROFILERS, Profiler
+from .routing import ROUTING_ENGINES
+
+MB = 1024 * 1024
+
+
+def read_points_csv(path, delimiter=","):
+    """``[(lat, lon)]`` from a CSV file with ``lat`` and ``lon`` columns."""
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        reader = csv.DictReader(handle, delimiter=delimiter)
+        missing = [c for c in ("lat", "lon") if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing the columns: {', '.join(missing)}")
+        return [(float(row["lat"]), float(row["lon"])) for row in reader]
+
+
+def _coordinates(text):
+    try:
+        lat, lon = (float(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("coordinates must be written as lat,lon")
+    return lat, lon
+
+
+def _finite(value):
+    return value if value != float("inf") else None
+
+
+def _progress(args):
+    if not args.progress:
+        return None
+    return lambda done: print(f"{100 * done:5.1f}%", file=sys.stderr, flush=True)
+
+
+def _tiles(args):
+    from .tiles import TileCatalog
+
+    return TileCatalog(args.tiles_dir)
+
+
+def build(args, registry):
+    bbox = tuple(args.bbox) if args.bbox else None
+    report_path = None
+    if not args.no_report:
+        report_path = args.report or api.report_path_for(args.streets_dir)
+    profile_path = None
+    if args.profile:
+        profile_path = args.profile_output or api.profile_path_for(
+            args.streets_dir, args.profile
+        )
+    log = (lambda line: print(line, file=sys.stderr, flush=True)) if args.progress else None
+    return api.build_network(
+        registry,
+        args.place,
+        args.streets_dir,
+        args.nodes_dir,
+        list_mode=args.list_mode,
+        output_format=args.format,
+        extract=args.extract,
+        clip=bbox,
+        report_path=report_path,
+        progress=_progress(args),
+        profiler=Profiler(log=log, profiler=args.profile),
+        profile_path=profile_path,
+        # Nothing routes on the graph after a command line build
+        keep_graph=False,
+        chunk_size=args.chunk_size,
+    )
+
+
+def route(args, registry):
+    result = api.route(
+        registry,
+        args.place,
+        args.origin,
+        args.destination,
+        backend=args.backend,
+        weight=args.weight,
+        tiles=_tiles(args),
+        simplify_m=args.simplify,
+        progress=_progress(args),
+    )
+    found = result["route"]
+    if args.output:
+        import shapely
+
+        feature = {
+            "type": "Feature",
+            "geometry": json.loads(shapely.to_geojson(shapely.from_wkb(result["wkb"]))),
+            "properties": {"cost": found.cost, "weight": found.weight},
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(feature, handle)
+    return {
+        "backend": found.backend,
+        "weight": found.weight,
+        "cost": found.cost,
+        "length_m": result["length_m"],
+        "travel_time_s": result["travel_time_s"],
+        "settled": found.settled,
+        "compute_ms": found.elapsed_ms,
+        "vertices": result["vertices"],
+        "origin_snap_m": result["origin_snap"],
+        "destination_snap_m": result["destination_snap"],
+        "output": args.output,
+    }
+
+
+def batch(args, registry):
+    from .batch import STATUS_OK, read_od_csv
+
+    result = api.route_pairs(
+        registry,
+        args.place,
+        read_od_csv(args.pairs),
+        weight=args.weight,
+        workers=args.workers,
+        progress=_progress(args),
+    )
+    routes = result["routes"]
+    with open(args.output, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["id", "status", "cost", "origin_snap_m", "destination_snap_m"])
+        for found in routes:
+            writer.writerow([
+                found.pair_id,
+                found.status,
+                _finite(found.cost),
+                _finite(found.origin_snap),
+                _finite(found.destination_snap),
+            ])
+    return {
+        "pairs": len(routes),
+        "routed": sum(1 for found in routes if found.status == STATUS_OK),
+        "output": args.output,
+    }
+
+
+def matrix(args, registry):
+    result = api.matrix(
+        registry,
+        args.place,
+        read_points_csv(args.origins),
+        read_points_csv(args.destinations),
+        weight=args.weight,
+        workers=args.workers,
+        output=args.output,
+        progress=_progress(args),
+    )
+    return {"shape": result["shape"], "output": args.output}
+
+
+def isochrones(args, registry):
+    import geopandas as gpd
+    import shapely
+
+    result = api.isochrone_features(
+        registry,
+        args.place,
+        read_points_csv(args.depots),
+        args.minutes,
+        method=args.method,
+        buffer_m=args.buffer,
+        workers=args.workers,
+        progress=_progress(args),
+    )
+    features = result["features"]
+    frame = gpd.GeoDataFrame(
+        [attributes for _, attributes in features],
+        geometry=shapely.from_wkb([wkb for wkb, _ in features]),
+        crs="EPSG:4326",
+    )
+    frame.to_file(args.output)
+    return {"isochrones": len(frame), "output": args.output}
+
+
+def update(args, registry):
+    result = api.update_network(
+        registry, args.place, args.change, args.geopackage, args.list_mode,
+        progress=_progress(args),
+    )
+    summary = result["summary"]
+    return {
+        "nodes_added": len(summary.added_nodes),
+        "nodes_removed": len(summary.removed_nodes),
+        "edges_added": len(summary.added_edges),
+        "edges_removed": len(summary.removed_edges),
+        "geopackage": result["geopackage"],
+    }
+
+
+def tile(args, registry):
+    return api.tile_network(_tiles(args), args.place, args.extract, progress=_progress(args))
+
+
+def parser():
+    weights = [weight for _, weight in COST_MODES]
+    root = argparse.ArgumentParser(
+        prog="route_builder",
+        description="Build, route and analyse OpenStreetMap street networks without QGIS.",
+    )
+    root.add_argument("--cache-dir", default=default_cache_dir(), help="Graph cache directory")
+    root.add_argument("--cache-mb", type=int, default=2048, help="Graph cache size on disk")
+    root.add_argument("--memory-mb", type=int, default=1024, help="Loaded graphs budget")
+    root.add_argument(
+        "--tiles-dir",
+        default=os.path.join(os.path.dirname(default_cache_dir()), "tiles"),
+        help="Tiled networks directory",
+    )
+    root.add_argument("--progress", action="store_true", help="Print progress on stderr")
+    commands = root.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("build", help="Export the streets and nodes of a place")
+    command.set_defaults(run=build)
+    command.add_argument("place")
+    command.add_argument("--streets-dir", default=".")
+    command.add_argument("--nodes-dir", default=".")
+    command.add_argument("--format", choices=[f for _, f in EXPORT_FORMATS], default="gpkg")
+    command.add_argument("--list-mode", choices=[m for _, m in FLATTEN_MODES], default="join")
+    command.add_argument("--extract", help="Local .osm / .osm.pbf file instead of Overpass")
+    command.add_argument("--bbox", type=float, nargs=4, metavar=("W", "S", "E", "N"),
+                         help="Clip the extract to this WGS84 box")
+    command.add_argument("--report", help="PDF report path, next to the streets by default")
+    command.add_argument("--no-report", action="store_true")
+    command.add_argument("--profile", choices=PROFILERS, help="Profile the slowest stage")
+    command.add_argument("--profile-output", help="Profile path, next to the streets by default")
+    command.add_argument("--chunk-size", type=int, metavar="FEATURES",
+                         help="Stream the layers this many features at a time")
+
+    command = commands.add_parser("route", help="Route between two points")
+    command.set_defaults(run=route)
+    command.add_argument("place")
+    command.add_argument("--origin", type=_coordinates, required=True, metavar="LAT,LON")
+    command.add_argument("--destination", type=_coordinates, required=True, metavar="LAT,LON")
+    command.add_argument("--backend", choices=[b for _, b in ROUTING_ENGINES], default="csr")
+    command.add_argument("--weight", choices=weights, default="length")
+    command.add_argument("--simplify", type=float, default=0.0, metavar="METRES")
+    command.add_argument("--output", help="GeoJSON file for the route line")
+
+    command = commands.add_parser("batch", help="Route the O/D pairs of a CSV file")
+    command.set_defaults(run=batch)
+    command.add_argument("place")
+    command.add_argument("pairs", help="CSV with origin_lat, origin_lon, destination_lat, "
+                                       "destination_lon and an optional id")
+    command.add_argument("--output", required=True, help="CSV of the route costs")
+    command.add_argument("--weight", choices=weights, default="length")
+    command.add_argument("--workers", type=int, default=None)
+
+    command = commands.add_parser("matrix", help="Cost matrix between two point sets")
+    command.set_defaults(run=matrix)
+    command.add_argument("place")
+    command.add_argument("--origins", required=True, help="CSV with lat, lon")
+    command.add_argument("--destinations", required=True, help="CSV with lat, lon")
+    command.add_argument("--output", required=True, help=".parquet or .npy file")
+    command.add_argument("--weight", choices=weights, default="travel_time")
+    command.add_argument("--workers", type=int, default=None)
+
+    command = commands.add_parser("isochrones", help="Travel time isochrones of depots")
+    command.set_defaults(run=isochrones)
+    command.add_argument("place")
+    command.add_argument("--depots", required=True, help="CSV with lat, lon")
+    command.add_argument("--minutes", type=float, nargs="+", default=[5, 10, 15])
+    command.add_argument("--method", choices=METHODS, default="buffer")
+    command.add_argument("--buffer", type=float, default=DEFAULT_BUFFER_M, metavar="METRES")
+    command.add_argument("--output", required=True, help="Vector file, e.g. .gpkg or .geojson")
+    command.add_argument("--workers", type=int, default=None)
+
+    command = commands.add_parser("update", help="Apply an OSM change file")
+    command.set_defaults(run=update)
+    command.add_argument("place")
+    command.add_argument("change", help=".osc file")
+    command.add_argument("--geopackage", help="GeoPackage export to patch as well")
+    command.add_argument("--list-mode", choices=[m for _, m in FLATTEN_MODES], default="join")
+
+    command = commands.add_parser("tile", help="Cut the network of an extract into tiles")
+    command.set_defaults(run=tile)
+    command.add_argument("place")
+    command.add_argument("extract", help=".osm / .osm.pbf file")
+    return root
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    registry = api.open_registry(args.cache_dir, args.cache_mb * MB, args.memory_mb * MB)
+    try:
+        result = args.run(args, registry)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    json.dump(result, sys.stdout, indent=1, default=str)
+    print()
+    return 0
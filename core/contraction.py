@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Contraction hierarchies over a ``CSRGraph``, for repeated point-to-point
+queries on a static graph.
+
+Preprocessing contracts the nodes one at a time, least important first
+(importance is the edge difference plus the number of neighbours already
+contracted, updated lazily). Contracting ``v`` removes it from the
+remaining graph and adds a shortcut ``u -> w`` for every pair of its
+neighbours whose shortest path ran through ``v``, unless a bounded witness
+search finds another path at most as cheap. A witness search that gives up
+early only costs an unneeded shortcut, never a wrong route.
+
+Every arc ends up stored once, at its lower ranked endpoint: upward arcs
+``v -> w`` in the ``up`` arrays of ``v`` and arcs ``u -> v`` coming down
+into ``v`` in the ``down`` arrays of ``v``. A query runs Dijkstra upwards
+from both endpoints (forward over ``up``, backward over ``down``); the two
+searches settle a few hundred nodes where A* settles a large part of the
+graph. Shortcuts keep their middle node and original arcs their CSR edge,
+so the route is unpacked to the same ``SearchResult`` as ``astar`` gives.
+
+A hierarchy is built for one edge weight and is not patched by graph
+updates; it is rebuilt instead.
+"""
+
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+
+from .search import INF, SearchResult
+
+# Nodes a witness search may settle before it gives up
+WITNESS_SETTLE_LIMIT = 50
+
+_NONE = -1
+
+
+def _witness_search(out_arcs, source, skip, targets, limit):
+    """Cheapest costs from ``source`` to ``targets`` avoiding ``skip``."""
+    dist = {source: 0.0}
+    remaining = set(targets)
+    heap = [(0.0, source)]
+    settled = 0
+    while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+        g, u = heappop(heap)
+        if g > dist.get(u, INF):
+            continue
+        if g > limit:
+            break
+        settled += 1
+        remaining.discard(u)
+        for w, (cost, _, _) in out_arcs[u].items():
+            if w == skip:
+                continue
+            candidate = g + cost
+            if candidate < dist.get(w, INF):
+                dist[w] = candidate
+                heappush(heap, (candidate, w))
+    return dist
+
+
+def _shortcuts(out_arcs, in_arcs, v):
+    """Shortcuts ``(u, w, cost)`` needed when ``v`` is contracted."""
+    incoming = in_arcs[v]
+    outgoing = out_arcs[v]
+    if not incoming or not outgoing:
+        return []
+    max_out = max(cost for cost, _, _ in outgoing.values())
+    needed = []
+    for u, (cost_in, _, _) in incoming.items():
+        targets = [w for w in outgoing if w != u]
+        if not targets:
+            continue
+        dist = _witness_search(out_arcs, u, v, targets, cost_in + max_out)
+        for w in targets:
+            via = cost_in + outgoing[w][0]
+            if dist.get(w, INF) > via:
+                needed.append((u, w, via))
+    return needed
+
+
+class ContractionHierarchy:
+    """Upward and downward arcs of a contracted ``CSRGraph``."""
+
+    def __init__(self, weight, rank, up, down, n_edges):
+        self.weight = weight
+        self.rank = rank
+        # (offsets, heads, costs, middles, edges) arrays, see ``_pack``
+        self.up = up
+        self.down = down
+        # Edge count of the graph contracted, to spot a stale hierarchy
+        self.n_edges = n_edges
+
+    @classmethod
+    def from_csr(cls, csr, weight="length", progress=None):
+        """Contract ``csr`` for ``weight``.
+
+        :param progress: Optional callable receiving the fraction done.
+        """
+        count = len(csr)
+        costs = csr.weights(weight).tolist()
+        targets = csr.targets.tolist()
+        offsets = csr.offsets.tolist()
+
+        # Remaining graph: node -> {neighbour: (cost, middle, csr edge)},
+        # keeping the cheapest of parallel edges and dropping self loops
+        out_arcs = [{} for _ in range(count)]
+        in_arcs = [{} for _ in range(count)]
+        for u in range(count):
+            for edge in range(offsets[u], offsets[u + 1]):
+                v = targets[edge]
+                cost = costs[edge]
+                if v == u or not cost < out_arcs[u].get(v, (INF,))[0]:
+                    continue
+                out_arcs[u][v] = in_arcs[v][u] = (cost, _NONE, edge)
+
+        contracted_neighbours = [0] * count
+        # Hierarchy level, one above the highest contracted neighbour;
+        # preferring low levels spreads the contraction over the graph
+        level = [0] * count
+
+        def priority(v, shortcuts):
+            degree = len(in_arcs[v]) + len(out_arcs[v])
+            return len(shortcuts) - degree + contracted_neighbours[v] + level[v]
+
+        heap = [(priority(v, _shortcuts(out_arcs, in_arcs, v)), v) for v in range(count)]
+        heapify(heap)
+        rank = np.empty(count, dtype=np.int32)
+        up = [None] * count
+        down = [None] * count
+        order = 0
+        while heap:
+            _, v = heappop(heap)
+            # Lazy update: contract ``v`` only if it is still the least
+            # important node once its priority is recomputed
+            shortcuts = _shortcuts(out_arcs, in_arcs, v)
+            current = priority(v, shortcuts)
+            if heap and current > heap[0][0]:
+                heappush(heap, (current, v))
+                continue
+
+            for u, w, cost in shortcuts:
+                if cost < out_arcs[u].get(w, (INF,))[0]:
+                    out_arcs[u][w] = in_arcs[w][u] = (cost, v, _NONE)
+
+            rank[v] = order
+            order += 1
+            up[v] = out_arcs[v]
+            down[v] = in_arcs[v]
+            for w in out_arcs[v]:
+                del in_arcs[w][v]
+                contracted_neighbours[w] += 1
+                level[w] = max(level[w], level[v] + 1)
+            for u in in_arcs[v]:
+                del out_arcs[u][v]
+                contracted_neighbours[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out_arcs[v] = in_arcs[v] = None
+            if progress is not None and order % 1000 == 0:
+                progress(order / count)
+
+        return cls(weight, rank, cls._pack(up), cls._pack(down), csr.n_edges)
+
+    @staticmethod
+    def _pack(arcs):
+        """CSR arrays of per-node ``{head: (cost, middle, edge)}`` dicts."""
+        offsets = np.zeros(len(arcs) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in arcs], out=offsets[1:])
+        size = int(offsets[-1])
+        heads = np.fromiter((h for row in arcs for h in row), np.int32, size)
+        values = [value for row in arcs for value in row.values()]
+        costs = np.fromiter((c for c, _, _ in values), np.float64, size)
+        middles = np.fromiter((m for _, m, _ in values), np.int32, size)
+        edges = np.fromiter((e for _, _, e in values), np.int64, size)
+        return offsets, heads, costs, middles, edges
+
+    def __len__(self):
+        return len(self.rank)
+
+    @property
+    def n_shortcuts(self):
+        return int((self.up[3] >= 0).sum() + (self.down[3] >= 0).sum())
+
+    @property
+    def nbytes(self):
+        arrays = [self.rank, *self.up, *self.down]
+        return sum(array.nbytes for array in arrays)
+
+    def _arc(self, arrays, node, head):
+        """``(middle, edge)`` of the arc stored at ``node`` towards ``head``."""
+        offsets, heads, _, middles, edges = arrays
+        lo = offsets[node]
+        i = lo + int(np.flatnonzero(heads[lo:offsets[node + 1]] == head)[0])
+        return int(middles[i]), int(edges[i])
+
+    def _unpack(self, u, w, middle, edge, nodes, edges):
+        """Append the nodes after ``u`` and the CSR edges of arc ``u -> w``."""
+        stack = [(u, w, middle, edge)]
+        while stack:
+            u, w, middle, edge = stack.pop()
+            if middle == _NONE:
+                nodes.append(w)
+                edges.append(edge)
+                continue
+            # The middle node ranks below both ends: ``u -> middle`` comes
+            # down into it and ``middle -> w`` goes up from it
+            second = self._arc(self.up, middle, w)
+            first = self._arc(self.down, middle, u)
+            stack.append((middle, w) + second)
+            stack.append((u, middle) + first)
+
+    def query(self, source, target):
+        """Shortest path between two CSR positions.
+
+        :returns: ``SearchResult`` like ``astar``; empty when unreachable.
+        """
+        if source == target:
+            return SearchResult([source], [], 0.0, 1)
+        # (arcs searched, arcs checked for stalling, dist, pred, closed, heap)
+        searches = [
+            (self.up, self.down, {source: 0.0}, {}, set(), [(0.0, source)]),
+            (self.down, self.up, {target: 0.0}, {}, set(), [(0.0, target)]),
+        ]
+        best = INF
+        meeting = None
+        side = 0
+        while True:
+            # Alternate, skipping a side whose cheapest open node cannot
+            # improve on the best meeting point found so far
+            open_sides = [
+                s for s in (side, 1 - side) if searches[s][5] and searches[s][5][0][0] < best
+            ]
+            if not open_sides:
+                break
+            current = open_sides[0]
+            side = 1 - current
+            arrays, stall_arrays, dist, pred, closed, heap = searches[current]
+            other = searches[side][2]
+            g, u = heappop(heap)
+            if u in closed:
+                continue
+            closed.add(u)
+            if u in other and g + other[u] < best:
+                best = g + other[u]
+                meeting = u
+
+            # Stall on demand: a higher node reached by this search that
+            # leads down to ``u`` more cheaply means ``u`` is not on a
+            # shortest path, and neither is anything relaxed from it
+            offsets, heads, costs, _, _ = stall_arrays
+            lo = offsets[u]
+            hi = offsets[u + 1]
+            if any(
+                dist.get(x, INF) + cost < g
+                for x, cost in zip(heads[lo:hi].tolist(), costs[lo:hi].tolist())
+            ):
+                continue
+
+            offsets, heads, costs, _, _ = arrays
+            lo = offsets[u]
+            hi = offsets[u + 1]
+            for i, v, cost in zip(range(lo, hi), heads[lo:hi].tolist(), costs[lo:hi].tolist()):
+                candidate = g + cost
+                if candidate < dist.get(v, INF):
+                    dist[v] = candidate
+                    pred[v] = (u, i)
+                    heappush(heap, (candidate, v))
+
+        settled = len(searches[0][4]) + len(searches[1][4])
+        if meeting is None:
+            return SearchResult([], [], INF, settled)
+
+        nodes = [source]
+        edges = []
+        # Upward half, unwound from the meeting point back to the source
+        arcs = []
+        node = meeting
+        forward_pred = searches[0][3]
+        while node != source:
+            u, i = forward_pred[node]
+            arcs.append((u, node, int(self.up[3][i]), int(self.up[4][i])))
+            node = u
+        for u, w, middle, edge in reversed(arcs):
+            self._unpack(u, w, middle, edge, nodes, edges)
+        # Downward half, arcs from the meeting point towards the target
+        node = meeting
+        backward_pred = searches[1][3]
+        while node != target:
+            w, i = backward_pred[node]
+            self._unpack(node, w, int(self.down[3][i]), int(self.down[4][i]), nodes, edges)
+            node = w
+
+        return SearchResult(nodes, edges, best, settled)
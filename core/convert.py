@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Node and edge GeoDataFrames of an osmnx graph in a single pass.
+
+``graph_frames(G)`` returns what ``ox.graph_to_gdfs(G, edges=False)`` and
+``ox.graph_to_gdfs(G, nodes=False)`` return (same columns, index and
+geometries), but every node and edge is visited once, and geometries are
+built as shapely 2 arrays from the coordinate columns instead of one
+``Point`` per node and one ``LineString`` per straight edge. The two osmnx
+calls also walk the nodes twice, the second time for the coordinates of
+the edge endpoints.
+"""
+
+
+def graph_frames(G, release=False):
+    """``(gdf_nodes, gdf_edges)`` of ``G``, like ``ox.graph_to_gdfs``.
+
+    :param release: Empty ``G`` once its attributes are copied, so its
+        adjacency dicts are freed before the frames are built. Only for
+        graphs nothing else uses, e.g. when a build only exports.
+    """
+    import geopandas as gpd
+    import numpy as np
+    import pandas as pd
+    import shapely
+
+    if len(G) == 0:
+        raise ValueError("Graph contains no nodes.")
+    if G.number_of_edges() == 0:
+        raise ValueError("Graph contains no edges.")
+    crs = G.graph["crs"]
+    node_ids, node_data = zip(*G.nodes(data=True))
+    u, v, keys, edge_data = zip(*G.edges(keys=True, data=True))
+    if release:
+        G.clear()
+
+    nodes = pd.DataFrame(list(node_data))
+    del node_data
+    nodes.index = pd.Index(node_ids, name="osmid")
+    xy = np.column_stack([nodes["x"].to_numpy(float), nodes["y"].to_numpy(float)])
+    gdf_nodes = gpd.GeoDataFrame(nodes, geometry=shapely.points(xy), crs=crs)
+    del nodes
+
+    edges = pd.DataFrame(list(edge_data))
+    del edge_data
+    index = pd.MultiIndex.from_arrays([u, v, keys], names=["u", "v", "key"])
+    # Edges osmnx left straight get a line between their endpoints
+    if "geometry" in edges.columns:
+        geometry = edges["geometry"].to_numpy(dtype=object, copy=True)
+        straight = edges["geometry"].isna().to_numpy()
+    else:
+        geometry = np.empty(len(edges), dtype=object)
+        straight = np.ones(len(edges), dtype=bool)
+    if straight.any():
+        positions = gdf_nodes.index.get_indexer(index.get_level_values("u")[straight])
+        ends = gdf_nodes.index.get_indexer(index.get_level_values("v")[straight])
+        geometry[straight] = shapely.linestrings(
+            np.stack([xy[positions], xy[ends]], axis=1)
+        )
+    edges["geometry"] = geometry
+    edges.index = index
+    gdf_edges = gpd.GeoDataFrame(edges, geometry="geometry", crs=crs)
+    return gdf_nodes, gdf_edges
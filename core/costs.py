@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Cost modes and their matching A* heuristics.
+
+Both heuristics are great-circle (haversine) distances to the target, scaled
+to the unit of the edge weight:
+
+* ``length``: the distance itself. osmnx edge lengths are sums of great-circle
+  segments, so they are never shorter than the straight line between the
+  endpoints.
+* ``travel_time``: the distance divided by the fastest speed found on any
+  edge of the graph, so no remaining stretch can be driven faster.
+
+A metric divided by a constant satisfies the triangle inequality, which makes
+both heuristics consistent as well as admissible.
+"""
+
+import math
+import re
+
+import numpy as np
+
+# (label, edge weight) pairs offered by the route dialog
+COST_MODES = [
+    ("Distance", "length"),
+    ("Travel time", "travel_time"),
+]
+
+# Slightly below the mean earth radius osmnx uses for edge lengths, and
+# shrunk a little further so rounding in stored lengths cannot make the
+# estimate overshoot.
+HEURISTIC_RADIUS_M = 6371000.0 * 0.999
+
+# Speed osmnx assumes for highway types without any tagged maxspeed, which
+# otherwise makes it refuse graphs that carry no maxspeed tag at all
+FALLBACK_SPEED_KPH = 50.0
+
+_MAXSPEED = re.compile(r"\s*(\d+(?:\.\d+)?)\s*(mph)?")
+MPH_KPH = 1.609344
+
+
+def haversine_m(lat1, lon1, lat2, lon2, radius=HEURISTIC_RADIUS_M):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * radius * math.asin(min(1.0, math.sqrt(a)))
+
+
+def maxspeed_kph(value):
+    """km/h of the first speed of an OSM ``maxspeed`` value, None if unparsable."""
+    match = _MAXSPEED.match(value or "")
+    if match is None:
+        return None
+    speed = float(match.group(1))
+    return speed * MPH_KPH if match.group(2) else speed
+
+
+def way_speeds_kph(highways, maxspeeds):
+    """Speed of each way, imputed for untagged ways as osmnx does.
+
+    Ways without a usable ``maxspeed`` get the mean tagged speed of their
+    highway type, or ``FALLBACK_SPEED_KPH`` when no way of that type is
+    tagged (``ensure_travel_times`` passes the same fallback to osmnx).
+    """
+    parsed = [maxspeed_kph(value) for value in maxspeeds]
+    speeds = np.array([np.nan if kph is None else kph for kph in parsed], dtype=np.float64)
+    highways = np.asarray(highways, dtype=object)
+    for highway in set(highways[np.isnan(speeds)].tolist()):
+        same = highways == highway
+        tagged = speeds[same & ~np.isnan(speeds)]
+        speeds[same & np.isnan(speeds)] = tagged.mean() if len(tagged) else FALLBACK_SPEED_KPH
+    return speeds
+
+
+def has_travel_times(G):
+    for _, _, data in G.edges(data=True):
+        return "travel_time" in data
+    return True
+
+
+def ensure_travel_times(G):
+    """Add osmnx ``speed_kph``/``travel_time`` edge attributes if missing."""
+    if not has_travel_times(G):
+        import osmnx as ox
+
+        ox.add_edge_speeds(G, fallback=FALLBACK_SPEED_KPH)
+        ox.add_edge_travel_times(G)
+    return G
+
+
+def max_speed_mps(lengths, travel_times):
+    """Fastest ``length / travel_time`` ratio over the given edges."""
+    lengths = np.asarray(lengths, dtype=np.float64)
+    travel_times = np.asarray(travel_times, dtype=np.float64)
+    valid = travel_times > 0
+    if not valid.any():
+        raise ValueError("The graph has no travel_time edge attribute.")
+    return float(np.nanmax(lengths[valid] / travel_times[valid]))
+
+
+def graph_max_speed_mps(G):
+    lengths, travel_times = zip(
+        *((d["length"], d["travel_time"]) for _, _, d in G.edges(data=True))
+    )
+    return max_speed_mps(lengths, travel_times)
+
+
+def weight_scale(weight, max_speed=None):
+    """Factor turning metres into a lower bound of ``weight``."""
+    if weight == "length":
+        return 1.0
+    if weight == "travel_time":
+        return 1.0 / max_speed
+    raise ValueError(f"Unknown cost mode: {weight}")
+
+
+def networkx_heuristic(G, weight, max_speed=None):
+    """``heuristic(u, v)`` for ``networkx.astar_path`` on an osmnx graph."""
+    scale = weight_scale(weight, max_speed)
+    nodes = G.nodes
+
+    def heuristic(u, v):
+        a = nodes[u]
+        b = nodes[v]
+        return haversine_m(a["y"], a["x"], b["y"], b["x"]) * scale
+
+    return heuristic
+
+
+def csr_heuristic(csr, target, weight):
+    """``heuristic(position)`` towards ``target`` for the CSR search."""
+    scale = weight_scale(weight, csr.max_speed_mps if weight == "travel_time" else None)
+    lats = csr.lats
+    lons = csr.lons
+    target_lat = float(lats[target])
+    target_lon = float(lons[target])
+
+    def heuristic(position):
+        return (
+            haversine_m(float(lats[position]), float(lons[position]), target_lat, target_lon)
+            * scale
+        )
+
+    return heuristic
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Compact array representation of a street graph for routing.
+
+OSM node ids are remapped to contiguous positions (sorted by id, so the
+reverse lookup is a binary search) and the adjacency is stored in CSR form:
+the outgoing edges of node ``i`` are ``offsets[i]:offsets[i + 1]`` in the
+``targets`` and weight arrays. Parallel edges are kept, their multigraph
+key is recorded in ``edge_keys`` so results map back to the NetworkX graph.
+
+``reverse`` holds the same edges grouped by target, for searches running
+backwards from a destination; it is built on first use.
+
+``patched`` applies the changes of a graph update: only the changed edges
+are read from the graph, the rest is carried over by array operations.
+"""
+
+import numpy as np
+
+from .costs import max_speed_mps
+
+
+class CSRGraph:
+    """Array-backed, read-only view of a ``MultiDiGraph``."""
+
+    def __init__(self, node_ids, lats, lons, offsets, targets, edge_keys, weights):
+        self.node_ids = node_ids
+        self.lats = lats
+        self.lons = lons
+        self.offsets = offsets
+        self.targets = targets
+        self.edge_keys = edge_keys
+        self._weights = weights
+        self._max_speed = None
+        self._reverse = None
+
+    @classmethod
+    def from_networkx(cls, G):
+        """Build from an osmnx graph with ``x``/``y`` nodes and ``length`` edges."""
+        count = G.number_of_nodes()
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=count)
+        order = np.argsort(node_ids, kind="stable")
+        node_ids = node_ids[order]
+        lats = np.fromiter((d["y"] for _, d in G.nodes(data=True)), np.float64, count)[order]
+        lons = np.fromiter((d["x"] for _, d in G.nodes(data=True)), np.float64, count)[order]
+
+        n_edges = G.number_of_edges()
+        sources = np.empty(n_edges, dtype=np.int64)
+        targets = np.empty(n_edges, dtype=np.int64)
+        keys = np.empty(n_edges, dtype=np.int32)
+        length = np.empty(n_edges, dtype=np.float64)
+        travel_time = np.empty(n_edges, dtype=np.float64)
+        for i, (u, v, k, data) in enumerate(G.edges(keys=True, data=True)):
+            sources[i] = u
+            targets[i] = v
+            keys[i] = k
+            length[i] = data.get("length", np.nan)
+            travel_time[i] = data.get("travel_time", np.nan)
+
+        return cls._from_arrays(
+            node_ids,
+            lats,
+            lons,
+            np.searchsorted(node_ids, sources),
+            np.searchsorted(node_ids, targets),
+            keys,
+            {"length": length, "travel_time": travel_time},
+        )
+
+    @classmethod
+    def _from_arrays(cls, node_ids, lats, lons, sources, targets, keys, weights):
+        """Build from edge arrays whose endpoints are positions in ``node_ids``."""
+        by_source = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=offsets[1:])
+        return cls(
+            node_ids,
+            lats,
+            lons,
+            offsets,
+            targets[by_source].astype(np.int32),
+            keys[by_source],
+            {name: values[by_source] for name, values in weights.items()},
+        )
+
+    def patched(self, G, change):
+        """Arrays of ``G`` after the edge and node changes of a ``ChangeSummary``."""
+        keep = np.ones(self.n_edges, dtype=bool)
+        for u, v, k in change.removed_edges:
+            row = self.position(u)
+            start, end = self.offsets[row], self.offsets[row + 1]
+            hit = (self.targets[start:end] == self.position(v)) & (
+                self.edge_keys[start:end] == k
+            )
+            keep[start + np.flatnonzero(hit)] = False
+
+        added = np.asarray(sorted(change.added_nodes), dtype=np.int64)
+        kept = ~np.isin(self.node_ids, np.fromiter(change.removed_nodes, np.int64))
+        nodes = G.nodes
+        node_ids = np.concatenate([self.node_ids[kept], added])
+        order = np.argsort(node_ids, kind="stable")
+        node_ids = node_ids[order]
+        lats = np.concatenate([self.lats[kept], [nodes[n]["y"] for n in added.tolist()]])[order]
+        lons = np.concatenate([self.lons[kept], [nodes[n]["x"] for n in added.tolist()]])[order]
+
+        old_sources = np.repeat(np.arange(len(self)), np.diff(self.offsets))[keep]
+        edges = change.added_edges
+        data = [G.edges[edge] for edge in edges]
+        sources = np.concatenate([
+            self.node_ids[old_sources], np.fromiter((u for u, _, _ in edges), np.int64, len(edges))
+        ])
+        targets = np.concatenate([
+            self.node_ids[self.targets[keep]],
+            np.fromiter((v for _, v, _ in edges), np.int64, len(edges)),
+        ])
+        keys = np.concatenate([
+            self.edge_keys[keep], np.fromiter((k for _, _, k in edges), np.int32, len(edges))
+        ])
+        weights = {
+            name: np.concatenate([
+                values[keep], np.fromiter((d.get(name, np.nan) for d in data), np.float64, len(data))
+            ])
+            for name, values in self._weights.items()
+        }
+        csr = self._from_arrays(
+            node_ids,
+            lats,
+            lons,
+            np.searchsorted(node_ids, sources),
+            np.searchsorted(node_ids, targets),
+            keys,
+            weights,
+        )
+        # Removed edges can only lower the fastest speed, so the old bound
+        # stays admissible for the heuristic
+        if self._max_speed is not None:
+            new_times = weights["travel_time"][len(keys) - len(data):]
+            csr._max_speed = self._max_speed
+            if (new_times > 0).any():
+                csr._max_speed = max(
+                    self._max_speed,
+                    max_speed_mps(weights["length"][len(keys) - len(data):], new_times),
+                )
+        return csr
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.targets)
+
+    @property
+    def nbytes(self):
+        arrays = [self.node_ids, self.lats, self.lons, self.offsets, self.targets, self.edge_keys]
+        arrays.extend(self._weights.values())
+        arrays.extend(self._reverse or ())
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def reverse(self):
+        """``(offsets, sources, edges)`` of the incoming edges of every node.
+
+        The incoming edges of node ``i`` come from ``sources[offsets[i]:offsets[i + 1]]``
+        and are the CSR edges ``edges[offsets[i]:offsets[i + 1]]``.
+        """
+        if self._reverse is None:
+            sources = np.repeat(
+                np.arange(len(self), dtype=np.int32), np.diff(self.offsets)
+            )
+            edges = np.argsort(self.targets, kind="stable")
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=len(self)), out=offsets[1:])
+            self._reverse = (offsets, sources[edges], edges)
+        return self._reverse
+
+    def weights(self, name):
+        """Per-edge cost array for ``name`` (``length`` or ``travel_time``)."""
+        try:
+            return self._weights[name]
+        except KeyError:
+            raise ValueError(f"Unknown edge weight: {name}") from None
+
+    @property
+    def max_speed_mps(self):
+        """Fastest edge speed, used to bound remaining travel time."""
+        if self._max_speed is None:
+            self._max_speed = max_speed_mps(
+                self._weights["length"], self._weights["travel_time"]
+            )
+        return self._max_speed
+
+    def position(self, node_id):
+        """Contiguous position of an OSM node id."""
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i == len(self.node_ids) or self.node_ids[i] != node_id:
+            raise KeyError(node_id)
+        return i
+
+    def path_edges(self, nodes, weight="length"):
+        """Cheapest CSR edge between each pair of consecutive OSM node ids."""
+        costs = self.weights(weight)
+        edges = []
+        positions = [self.position(node) for node in nodes]
+        for u, v in zip(positions, positions[1:]):
+            lo = self.offsets[u]
+            candidates = lo + np.flatnonzero(self.targets[lo:self.offsets[u + 1]] == v)
+            edges.append(int(candidates[np.argmin(costs[candidates])]))
+        return edges
+
+    def edge_source(self, edge):
+        """Position of the node an edge leaves from."""
+        return int(np.searchsorted(self.offsets, edge, side="right")) - 1
+
+    def edge_tuple(self, edge):
+        """``(u, v, key)`` OSM ids of a CSR edge."""
+        u = self.node_ids[self.edge_source(edge)]
+        v = self.node_ids[self.targets[edge]]
+        return int(u), int(v), int(self.edge_keys[edge])
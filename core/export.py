@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Street and node layer export.
+
+* ``gpkg``: one GeoPackage holding the ``streets`` and ``nodes`` layers, each
+  with an R-tree spatial index.
+* ``fgb``: one FlatGeobuf file per layer, with its packed Hilbert R-tree.
+* ``parquet``: one GeoParquet file per layer.
+* ``shp``: one shapefile per layer, as earlier versions of the plugin wrote.
+
+Vector formats are written by pyogrio, through Arrow when pyarrow and
+GDAL >= 3.8 are available, so the columns are handed to GDAL in bulk rather
+than feature by feature.
+
+Networks too large to hold as GeoDataFrames next to their graph can be
+streamed instead (``stream_network``): edges and nodes are converted a
+chunk at a time and handed to GDAL, or a Parquet writer, as Arrow batches.
+
+A GeoPackage export can be patched after an incremental graph update
+(``update_geopackage``): rows are deleted through indexes on the edge and
+node keys, and new rows appended, instead of writing the layers again.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+from .profiling import span
+
+# (label, format) pairs offered by the network dialog
+EXPORT_FORMATS = [
+    ("GeoPackage", "gpkg"),
+    ("FlatGeobuf", "fgb"),
+    ("GeoParquet", "parquet"),
+    ("ESRI Shapefile", "shp"),
+]
+
+_DRIVERS = {
+    "gpkg": ("GPKG", {"SPATIAL_INDEX": "YES"}),
+    "fgb": ("FlatGeobuf", {"SPATIAL_INDEX": "YES"}),
+    "shp": ("ESRI Shapefile", {}),
+}
+
+STREETS_LAYER = "streets"
+NODES_LAYER = "nodes"
+
+# Indexes on the graph keys of the GeoPackage layers, for in-place updates
+KEY_INDEXES = (
+    f'CREATE INDEX IF NOT EXISTS "{STREETS_LAYER}_edge_key" '
+    f'ON "{STREETS_LAYER}" (u, v, key)',
+    f'CREATE INDEX IF NOT EXISTS "{NODES_LAYER}_osmid" ON "{NODES_LAYER}" (osmid)',
+)
+
+
+def writer_options():
+    """``GeoDataFrame.to_file`` keyword arguments selecting the fastest engine."""
+    try:
+        import pyogrio
+    except ImportError:
+        return {}
+    options = {"engine": "pyogrio"}
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return options
+    if pyogrio.__gdal_version__ >= (3, 8, 0):
+        options["use_arrow"] = True
+    return options
+
+
+def network_paths(place, streets_dir, nodes_dir, fmt):
+    """(streets path, nodes path) for ``place``; the same file for GeoPackage."""
+    if fmt == "gpkg":
+        path = os.path.join(streets_dir, f"{place}_network.gpkg")
+        return path, path
+    if fmt not in _DRIVERS and fmt != "parquet":
+        raise ValueError(f"Unknown export format: {fmt}")
+    return (
+        os.path.join(streets_dir, f"{place}_street_network.{fmt}"),
+        os.path.join(nodes_dir, f"{place}_nodes.{fmt}"),
+    )
+
+
+def write_layer(gdf, path, fmt, layer):
+    """Write ``gdf`` to ``path``, replacing ``layer`` if it exists there."""
+    if fmt == "parquet":
+        gdf.to_parquet(path)
+        return
+    driver, creation_options = _DRIVERS[fmt]
+    kwargs = dict(writer_options(), **creation_options)
+    if fmt == "gpkg":
+        kwargs["layer"] = layer
+    gdf.to_file(path, driver=driver, **kwargs)
+
+
+def export_network(gdf_streets, gdf_nodes, place, streets_dir, nodes_dir, fmt="gpkg",
+                   progress=None):
+    """Write both layers of a network and return their paths.
+
+    :param progress: Optional callable receiving the fraction done.
+    """
+    streets_path, nodes_path = network_paths(place, streets_dir, nodes_dir, fmt)
+    if fmt == "gpkg" and os.path.exists(streets_path):
+        # Start from an empty package rather than carrying old layers over
+        os.remove(streets_path)
+    with span("write edges"):
+        write_layer(gdf_streets, streets_path, fmt, STREETS_LAYER)
+    if progress is not None:
+        progress(0.5)
+    with span("write nodes"):
+        write_layer(gdf_nodes, nodes_path, fmt, NODES_LAYER)
+    if fmt == "gpkg":
+        with span("key indexes"):
+            create_key_indexes(streets_path)
+    if progress is not None:
+        progress(1.0)
+    return streets_path, nodes_path
+
+
+def create_key_indexes(path):
+    with closing(sqlite3.connect(path)) as db, db:
+        for statement in KEY_INDEXES:
+            db.execute(statement)
+
+
+def append_layer(gdf, path, layer):
+    """Append ``gdf`` to a GeoPackage layer, keeping only the layer's columns."""
+    import pyogrio
+
+    fields = list(pyogrio.read_info(path, layer=layer)["fields"])
+    gdf = gdf.reindex(columns=fields + [gdf.geometry.name])
+    gdf.to_file(path, layer=layer, driver="GPKG", mode="a", **writer_options())
+
+
+def update_geopackage(path, G, change, list_mode="join"):
+    """Patch a GeoPackage export of ``G`` after ``osm_update.apply_change``.
+
+    Removed streets and nodes are deleted with SQLite, whose R-tree delete
+    triggers are plain SQL; added ones are appended through GDAL, which
+    maintains the spatial indexes of new rows.
+    """
+    import osmnx as ox
+
+    from .flatten import flatten_list_columns
+
+    with closing(sqlite3.connect(path)) as db, db:
+        for statement in KEY_INDEXES:
+            db.execute(statement)
+        db.executemany(
+            f'DELETE FROM "{STREETS_LAYER}" WHERE u = ? AND v = ? AND key = ?',
+            change.removed_edges,
+        )
+        db.executemany(
+            f'DELETE FROM "{NODES_LAYER}" WHERE osmid = ?',
+            [(node,) for node in change.removed_nodes],
+        )
+
+    if change.added_edges:
+        streets = ox.graph_to_gdfs(G.edge_subgraph(change.added_edges), nodes=False)
+        append_layer(flatten_list_columns(streets, list_mode).reset_index(), path, STREETS_LAYER)
+    if change.added_nodes:
+        nodes = ox.graph_to_gdfs(G.subgraph(change.added_nodes), edges=False)
+        append_layer(flatten_list_columns(nodes, list_mode).reset_index(), path, NODES_LAYER)
+
+
+# Edges or nodes converted and written at a time by ``stream_network``
+STREAM_CHUNK_SIZE = 50000
+# Edge count from which builds stream their layers unless told otherwise
+STREAM_THRESHOLD_EDGES = 500000
+
+# Column kinds found while scanning attributes, by Python type
+_KINDS = {bool: "bool", int: "int", float: "float", str: "str", list: "list"}
+
+
+def _kind(cls):
+    import numbers
+
+    import numpy as np
+
+    kind = _KINDS.get(cls)
+    if kind is None:
+        if issubclass(cls, (bool, np.bool_)):
+            kind = "bool"
+        elif issubclass(cls, numbers.Integral):
+            kind = "int"
+        elif issubclass(cls, numbers.Real):
+            kind = "float"
+        else:
+            kind = "other"
+        _KINDS[cls] = kind
+    return kind
+
+
+def _attribute_schema(records, total, list_mode):
+    """``(columns, arrow types, list columns)`` of ``total`` ``records()`` dicts.
+
+    A pass over the attributes decides the type every chunk is written
+    with, which is what flattening the whole frame would have produced:
+    joined or JSON lists are text, integer columns with gaps become floats
+    like pandas makes them, and columns mixing kinds are written as text.
+    """
+    from collections import Counter
+    from itertools import chain
+
+    import pyarrow as pa
+
+    # (column, type) pairs, counted without a Python loop per value
+    found = Counter(chain.from_iterable(
+        zip(data.keys(), map(type, data.values())) for data in records()
+    ))
+
+    kinds, present = {}, Counter()
+    for (column, cls), count in found.items():
+        kinds.setdefault(column, set())
+        if cls is not type(None):
+            kinds[column].add(_kind(cls))
+            present[column] += count
+    # Geometries keep their place among the columns, as in a full frame
+    kinds.setdefault("geometry", set())
+
+    types, list_columns = {"geometry": pa.binary()}, []
+    for column, column_kinds in kinds.items():
+        if column == "geometry":
+            continue
+        if "list" in column_kinds:
+            list_columns.append(column)
+            if list_mode != "first":
+                types[column] = pa.string()
+                continue
+            # First values are kept: those of the lists count too
+            column_kinds = column_kinds - {"list"}
+            for data in records():
+                value = data.get(column)
+                if type(value) is list and value:
+                    column_kinds.add(_kind(type(value[0])))
+        if column_kinds and column_kinds <= {"bool"}:
+            types[column] = pa.bool_()
+        elif column_kinds and column_kinds <= {"int"} and present[column] == total:
+            types[column] = pa.int64()
+        elif column_kinds and column_kinds <= {"int", "float"}:
+            types[column] = pa.float64()
+        else:
+            types[column] = pa.string()
+    return list(kinds), types, list_columns
+
+
+def _record_batch(frame, schema):
+    """Arrow batch of ``frame`` with the columns and types of ``schema``."""
+    import pyarrow as pa
+
+    arrays = []
+    for field in schema:
+        values = frame[field.name]
+        if pa.types.is_string(field.type):
+            # Numbers or booleans in a text column, as flattening writes them
+            values = values.astype(object)
+            other = values.notna() & values.map(type).ne(str)
+            if other.any():
+                values = values.where(~other, values[other].map(str))
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _chunks(items, chunk_size, release):
+    """Lists of ``chunk_size`` ``items``, attribute dicts emptied once used.
+
+    Emptying the dicts frees the attributes (geometries, lists) written so
+    far without changing the graph being iterated.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            if release:
+                for *_, data in chunk:
+                    data.clear()
+            chunk = []
+    if chunk:
+        yield chunk
+        if release:
+            for *_, data in chunk:
+                data.clear()
+
+
+def can_stream(fmt):
+    """Whether ``stream_network`` can write ``fmt`` here."""
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return writer_options().get("use_arrow") is True
+
+
+def stream_network(G, place, streets_dir, nodes_dir, fmt="gpkg", list_mode="join",
+                   chunk_size=STREAM_CHUNK_SIZE, release=False, progress=None):
+    """Write the layers of ``G`` chunk by chunk and return their paths.
+
+    The layers ``export_network`` writes, with the same columns and
+    flattened lists, but ``chunk_size`` edges or nodes are converted at a
+    time and streamed as Arrow batches to GDAL, inside the transaction of
+    the layer, or to a Parquet writer. The whole GeoDataFrames never exist,
+    so memory stays close to that of the graph whatever its size. With
+    ``release`` the graph is emptied as it is written, for graphs nothing
+    else uses. Needs pyarrow and, except for GeoParquet, GDAL >= 3.8.
+
+    :param progress: Optional callable receiving the fraction done after
+        every chunk; if it raises, the partial files are removed.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import shapely
+    from pyproj import CRS
+
+    from .flatten import flatten_list_columns
+
+    if not can_stream(fmt):
+        raise RuntimeError("Streaming exports need pyarrow and GDAL 3.8 or later.")
+    num_edges = G.number_of_edges()
+    if num_edges == 0:
+        raise ValueError("Graph contains no edges.")
+    streets_path, nodes_path = network_paths(place, streets_dir, nodes_dir, fmt)
+    crs = CRS.from_user_input(G.graph["crs"])
+    total = num_edges + len(G)
+    done = 0
+
+    # Endpoints of the edges osmnx left straight
+    node_ids = pd.Index(list(G), name="osmid")
+    xy = np.array([(data["x"], data["y"]) for _, data in G.nodes(data=True)], dtype=float)
+
+    def lines(frame):
+        geometry = frame["geometry"].to_numpy(dtype=object, copy=True)
+        straight = pd.isna(geometry)
+        if straight.any():
+            starts = node_ids.get_indexer(frame["u"].to_numpy()[straight])
+            ends = node_ids.get_indexer(frame["v"].to_numpy()[straight])
+            geometry[straight] = shapely.linestrings(np.stack([xy[starts], xy[ends]], axis=1))
+        return geometry
+
+    def points(frame):
+        return shapely.points(frame["x"].to_numpy(float), frame["y"].to_numpy(float))
+
+    # GDAL reports errors raised while it reads the batches as its own, so
+    # they are kept to be raised instead (a cancellation among them)
+    errors = []
+
+    def batches(items, keys, geometry, schema, list_columns):
+        nonlocal done
+        columns = schema.names[len(keys):]
+        try:
+            for chunk in _chunks(items, chunk_size, release):
+                frame = pd.DataFrame([item[-1] for item in chunk], columns=columns)
+                for position, key in enumerate(keys):
+                    frame.insert(position, key, [item[position] for item in chunk])
+                frame = flatten_list_columns(frame, list_mode, columns=list_columns)
+                frame["geometry"] = shapely.to_wkb(geometry(frame))
+                yield _record_batch(frame, schema)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done / total)
+        except BaseException as e:
+            errors.append(e)
+            raise
+
+    def write_layer_stream(path, layer, keys, records, total, geometry, geometry_type):
+        columns, types, list_columns = _attribute_schema(
+            lambda: (item[-1] for item in records()), total, list_mode
+        )
+        schema = pa.schema(
+            [pa.field(key, pa.int64()) for key in keys]
+            + [pa.field(column, types[column]) for column in columns]
+        )
+        reader = pa.RecordBatchReader.from_batches(
+            schema, batches(records(), keys, geometry, schema, list_columns)
+        )
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            geo = {"version": "1.0.0", "primary_column": "geometry", "columns": {
+                "geometry": {
+                    "encoding": "WKB",
+                    "geometry_types": [geometry_type],
+                    "crs": crs.to_json_dict(),
+                },
+            }}
+            with pq.ParquetWriter(path, schema.with_metadata({"geo": json.dumps(geo)})) as out:
+                for batch in reader:
+                    out.write_batch(batch)
+            return
+        import pyogrio
+
+        driver, creation_options = _DRIVERS[fmt]
+        pyogrio.write_arrow(
+            reader,
+            path,
+            layer=layer if fmt == "gpkg" else None,
+            driver=driver,
+            geometry_name="geometry",
+            geometry_type=geometry_type,
+            crs=crs.to_wkt(),
+            layer_options=creation_options,
+        )
+
+    if fmt == "gpkg" and os.path.exists(streets_path):
+        os.remove(streets_path)
+    try:
+        with span("write edges"):
+            write_layer_stream(
+                streets_path, STREETS_LAYER, ("u", "v", "key"),
+                lambda: G.edges(keys=True, data=True), num_edges, lines, "LineString",
+            )
+        with span("write nodes"):
+            write_layer_stream(
+                nodes_path, NODES_LAYER, ("osmid",),
+                lambda: G.nodes(data=True), len(G), points, "Point",
+            )
+    except BaseException:
+        for path in {streets_path, nodes_path}:
+            if os.path.exists(path):
+                os.remove(path)
+        if errors:
+            raise errors[0] from None
+        raise
+    finally:
+        if release:
+            G.clear()
+    if fmt == "gpkg":
+        with span("key indexes"):
+            create_key_indexes(streets_path)
+    return streets_path, nodes_path
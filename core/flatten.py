@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Flattening of the list attributes osmnx leaves on simplified graphs.
+
+When simplification merges several OSM ways into one edge, attributes such as
+``osmid``, ``highway`` or ``name`` become Python lists, which no vector file
+format can store. Only the object columns known to carry lists are touched,
+and within each of them only the cells that actually hold a list, one column
+at a time.
+"""
+
+import json
+
+import pandas as pd
+
+# (label, mode) pairs offered by the network dialog
+FLATTEN_MODES = [
+    ("Join values", "join"),
+    ("First value", "first"),
+    ("JSON array", "json"),
+]
+
+# Attributes osmnx turns into lists when merging ways or parallel edges
+LIST_COLUMNS = (
+    "osmid",
+    "highway",
+    "name",
+    "lanes",
+    "maxspeed",
+    "ref",
+    "bridge",
+    "tunnel",
+    "junction",
+    "access",
+    "width",
+    "service",
+    "oneway",
+    "reversed",
+    "est_width",
+    "area",
+    "landuse",
+)
+
+SEPARATOR = ";"
+
+
+def _flatten(lists, mode, separator):
+    if mode == "join":
+        # One str.join per list cell; groupby over exploded values is
+        # dominated by per-group overhead on this many small lists
+        return lists.map(lambda values: separator.join(map(str, values)))
+    if mode == "first":
+        return lists.str[0]
+    if mode == "json":
+        return lists.map(lambda values: json.dumps(values, default=str))
+    raise ValueError(f"Unknown flatten mode: {mode}")
+
+
+def flatten_list_columns(gdf, mode="join", columns=LIST_COLUMNS, separator=SEPARATOR):
+    """Copy of ``gdf`` with list cells of ``columns`` turned into scalars.
+
+    :param mode: ``join`` joins the values with ``separator``, ``first`` keeps
+        the first value and ``json`` writes a JSON array. ``join`` and
+        ``json`` also turn the other values of a flattened column into
+        strings, so the column has one type Arrow and OGR can store.
+    """
+    gdf = gdf.copy(deep=False)
+    for column in columns:
+        if column not in gdf.columns or gdf[column].dtype != object:
+            continue
+        series = gdf[column]
+        is_list = series.map(type).to_numpy() == list
+        if not is_list.any():
+            continue
+        lists = series[is_list]
+        values = series.to_numpy(copy=True)
+        values[is_list] = _flatten(lists, mode, separator).to_numpy()
+        if mode != "first":
+            scalars = ~is_list & series.notna().to_numpy()
+            values[scalars] = series[scalars].astype(str).to_numpy()
+        gdf[column] = pd.Series(values, index=gdf.index, dtype=object)
+    return gdf
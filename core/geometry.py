@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Route geometry assembled from packed edge coordinates.
+
+``EdgeGeometries`` stores the vertices of every CSR edge in one ``(n, 2)``
+array of (lon, lat), edge ``e`` owning ``coords[offsets[e]:offsets[e + 1]]``.
+Edges carrying an osmnx ``geometry`` keep all its vertices, so curves
+survive; the others are straight lines between their nodes.
+
+A route is a run of CSR edges: ``route_coordinates`` gathers their
+vertices with one fancy-indexing call, dropping the vertex each edge
+shares with the previous one, and ``line_wkb`` wraps the result in WKB
+that QGIS reads without building intermediate point objects.
+``douglas_peucker`` thins a line for display.
+"""
+
+import struct
+
+import numpy as np
+
+# Metres per radian on the sphere osmnx measures lengths on
+EARTH_RADIUS_M = 6371009.0
+
+_WKB_LINESTRING = 2
+
+
+class EdgeGeometries:
+    """Vertices of every edge of a ``CSRGraph``, packed in CSR order."""
+
+    def __init__(self, offsets, coords):
+        self.offsets = offsets
+        self.coords = coords
+
+    @classmethod
+    def from_graph(cls, G, csr):
+        """Gather the edge geometries of ``G`` in the edge order of ``csr``."""
+        import shapely
+
+        count = csr.n_edges
+        sources = np.repeat(np.arange(len(csr)), np.diff(csr.offsets))
+        ids = csr.node_ids
+        geometries = np.empty(count, dtype=object)
+        for edge, (u, v, k) in enumerate(
+            zip(ids[sources].tolist(), ids[csr.targets].tolist(), csr.edge_keys.tolist())
+        ):
+            geometries[edge] = G.edges[u, v, k].get("geometry")
+        curved = np.fromiter((g is not None for g in geometries), bool, count)
+
+        coords, index = shapely.get_coordinates(geometries[curved], return_index=True)
+        sizes = np.full(count, 2, dtype=np.int64)
+        sizes[curved] = np.bincount(index, minlength=int(curved.sum()))
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        packed = np.empty((int(offsets[-1]), 2), dtype=np.float64)
+        in_curved = np.repeat(curved, sizes)
+        packed[in_curved] = coords
+        straight = ~curved
+        ends = np.empty((int(straight.sum()), 2, 2), dtype=np.float64)
+        ends[:, 0, 0] = csr.lons[sources[straight]]
+        ends[:, 0, 1] = csr.lats[sources[straight]]
+        ends[:, 1, 0] = csr.lons[csr.targets[straight]]
+        ends[:, 1, 1] = csr.lats[csr.targets[straight]]
+        packed[~in_curved] = ends.reshape(-1, 2)
+        return cls(offsets, packed)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.coords.nbytes
+
+    def edge_coordinates(self, edge):
+        return self.coords[self.offsets[edge]:self.offsets[edge + 1]]
+
+    def route_coordinates(self, edges):
+        """``(n, 2)`` (lon, lat) vertices of a route given as CSR edges."""
+        edges = np.asarray(edges, dtype=np.int64)
+        if not len(edges):
+            return np.empty((0, 2), dtype=np.float64)
+        starts = self.offsets[edges]
+        # Every edge after the first starts where the previous one ended
+        counts = self.offsets[edges + 1] - starts - 1
+        firsts = np.cumsum(counts) - counts
+        index = np.repeat(starts + 1 - firsts, counts) + np.arange(int(counts.sum()))
+        return self.coords[np.concatenate([starts[:1], index])]
+
+
+def line_wkb(coords):
+    """Little-endian WKB of a 2D LineString through ``coords``.
+
+    A single vertex is repeated so the line stays valid.
+    """
+    coords = np.ascontiguousarray(coords, dtype="<f8").reshape(-1, 2)
+    if len(coords) == 1:
+        coords = np.repeat(coords, 2, axis=0)
+    return struct.pack("<BII", 1, _WKB_LINESTRING, len(coords)) + coords.tobytes()
+
+
+def douglas_peucker(coords, tolerance_m):
+    """Mask of the vertices of a (lon, lat) line kept by Douglas-Peucker.
+
+    Distances are measured on a local equirectangular projection, accurate
+    enough at the scale of a route. The end vertices are always kept.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    count = len(coords)
+    keep = np.zeros(count, dtype=bool)
+    if count < 3 or tolerance_m <= 0:
+        keep[:] = True
+        return keep
+    scale = np.radians([np.cos(np.radians(coords[:, 1].mean())), 1.0]) * EARTH_RADIUS_M
+    xy = coords * scale
+    keep[[0, -1]] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = xy[first]
+        segment = xy[last] - start
+        points = xy[first + 1:last] - start
+        squared = segment @ segment
+        # Distance to the segment, not the line, so loops are not lost
+        t = np.clip(points @ segment / squared, 0.0, 1.0) if squared else 0.0
+        distances = np.hypot(*(points - np.multiply.outer(t, segment)).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return keep
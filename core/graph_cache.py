@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of street graphs keyed by place name and network type.
+
+Each graph is stored as a gzip-compressed pickle next to a JSON manifest that
+records the place, network type, bounding box, creation time, source hash,
+file size and last access time of every entry. The manifest drives the LRU
+eviction once the cache grows beyond ``max_bytes``. Manifest updates are
+serialised by a lock so background tasks can share one cache.
+
+Objects derived from the same source data as a graph (such as the raw ways
+of an offline extract) can be stored as sidecars: the builder puts them in
+``G.graph["sidecars"]``, and ``put`` moves them out of the graph into files
+of their own, read back with ``get_sidecar`` only when needed. Indexes
+built later from a cached graph (such as contraction hierarchies) are added
+with ``put_sidecar``; storing the graph again drops them.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from .profiling import span
+
+MANIFEST_NAME = "manifest.json"
+GRAPH_SUFFIX = ".graph.gz"
+SIDECAR_SUFFIX = ".sidecar.gz"
+SIDECARS_KEY = "sidecars"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def default_cache_dir():
+    """Directory used when the caller does not provide one."""
+    return os.path.join(os.path.expanduser("~"), ".cache", "route_builder", "graphs")
+
+
+def normalize_place(place):
+    return " ".join(place.lower().split())
+
+
+def cache_key(place, network_type):
+    """Stable file-system friendly key for a (place, network type) pair."""
+    normalized = "{}|{}".format(normalize_place(place), network_type)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:20]
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def graph_digest(G):
+    """SHA-256 over the node ids and edge endpoints of a graph."""
+    digest = hashlib.sha256()
+    # Every id and edge ends with a newline, so no two graphs hash the
+    # same concatenation
+    for node in sorted(G.nodes):
+        digest.update("{}\n".format(node).encode("ascii"))
+    for u, v, k in sorted(G.edges(keys=True)):
+        digest.update("{}>{}#{}\n".format(u, v, k).encode("ascii"))
+    return digest.hexdigest()
+
+
+def graph_bbox(G):
+    """(min_lon, min_lat, max_lon, max_lat) of the graph nodes."""
+    xs = [data["x"] for _, data in G.nodes(data=True)]
+    ys = [data["y"] for _, data in G.nodes(data=True)]
+    if not xs:
+        return None
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def download_graph(place, network_type):
+    """Fetch a graph from Overpass the same way the plugin always did."""
+    import osmnx as ox
+
+    from .costs import ensure_travel_times
+
+    # osmnx simplifies the graph inside graph_from_place, so the download
+    # span covers the simplification too; offline extracts time it apart
+    with span("download"):
+        G = ox.graph_from_place(place, network_type=network_type)
+    with span("travel times"):
+        return ensure_travel_times(G)
+
+
+class GraphCache:
+    """Size-bounded LRU cache of street graphs stored in ``cache_dir``."""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._manifest = self._read_manifest()
+
+    # Manifest handling
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose graph file went missing behind our back
+        return {
+            key: entry
+            for key, entry in manifest.items()
+            if os.path.exists(self._graph_path(key))
+        }
+
+    def _write_manifest(self):
+        with self._lock:
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(self._manifest, handle, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _graph_path(self, key):
+        return os.path.join(self.cache_dir, key + GRAPH_SUFFIX)
+
+    def _sidecar_path(self, key, name):
+        return os.path.join(self.cache_dir, "{}.{}{}".format(key, name, SIDECAR_SUFFIX))
+
+    @staticmethod
+    def _dump(obj, path):
+        """Pickle ``obj`` to ``path`` atomically and return the file size."""
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with gzip.open(tmp_path, "wb", compresslevel=1) as handle:
+            pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    # Public API
+
+    def entries(self):
+        """Manifest entries, most recently used first."""
+        with self._lock:
+            return sorted(
+                self._manifest.values(), key=lambda e: e["last_access"], reverse=True
+            )
+
+    def entry(self, place, network_type):
+        return self._manifest.get(cache_key(place, network_type))
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._manifest.values())
+
+    def contains(self, place, network_type):
+        return cache_key(place, network_type) in self._manifest
+
+    def get(self, place, network_type):
+        """Cached graph for ``place`` or None when it is not cached."""
+        key = cache_key(place, network_type)
+        entry = self._manifest.get(key)
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self._graph_path(key), "rb") as handle:
+                G = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # A truncated or corrupt file is treated as a miss
+            with self._lock:
+                self._remove(key)
+                self._write_manifest()
+            return None
+        with self._lock:
+            entry["last_access"] = time.time()
+            self._write_manifest()
+        return G
+
+    def put(self, place, network_type, G, source_hash=None):
+        """Store ``G`` and its sidecars and return its manifest entry.
+
+        The ``sidecars`` graph attribute, if any, is removed from ``G``.
+        """
+        key = cache_key(place, network_type)
+        sidecars = G.graph.pop(SIDECARS_KEY, None) or {}
+        size = self._dump(G, self._graph_path(key))
+        for name, obj in sidecars.items():
+            size += self._dump((source_hash, obj), self._sidecar_path(key, name))
+
+        now = time.time()
+        entry = {
+            "key": key,
+            "place": place,
+            "network_type": network_type,
+            "bbox": graph_bbox(G),
+            "created": now,
+            "last_access": now,
+            "source_hash": source_hash or graph_digest(G),
+            "size": size,
+            "nodes": G.number_of_nodes(),
+            "edges": G.number_of_edges(),
+            "sidecars": sorted(sidecars),
+        }
+        with self._lock:
+            previous = self._manifest.get(key)
+            for name in set(previous.get("sidecars", ()) if previous else ()) - set(sidecars):
+                self._remove_file(self._sidecar_path(key, name))
+            self._manifest[key] = entry
+            self._evict(keep=key)
+            self._write_manifest()
+        return entry
+
+    def get_sidecar(self, place, network_type, name):
+        """Sidecar ``name`` of a cached graph, None if missing or stale."""
+        key = cache_key(place, network_type)
+        entry = self._manifest.get(key)
+        if entry is None or name not in entry.get("sidecars", ()):
+            return None
+        try:
+            with gzip.open(self._sidecar_path(key, name), "rb") as handle:
+                source_hash, obj = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # Stored for other source data than the graph, e.g. by an older put
+        if source_hash is not None and source_hash != entry["source_hash"]:
+            return None
+        return obj
+
+    def put_sidecar(self, place, network_type, name, obj):
+        """Add sidecar ``name`` to a cached graph.
+
+        :returns: False when the graph is not cached (any more).
+        """
+        key = cache_key(place, network_type)
+        entry = self._manifest.get(key)
+        if entry is None:
+            return False
+        source_hash = entry["source_hash"]
+        path = self._sidecar_path(key, name)
+        tmp_path = "{}.{}.part".format(path, threading.get_ident())
+        size = self._dump((source_hash, obj), tmp_path)
+        with self._lock:
+            entry = self._manifest.get(key)
+            # The graph was replaced or evicted while the sidecar was written
+            if entry is None or entry["source_hash"] != source_hash:
+                self._remove_file(tmp_path)
+                return False
+            sidecars = set(entry.get("sidecars", ()))
+            if name in sidecars and os.path.exists(path):
+                entry["size"] -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            entry["size"] += size
+            entry["sidecars"] = sorted(sidecars | {name})
+            self._evict(keep=key)
+            self._write_manifest()
+        return True
+
+    def get_or_build(self, place, network_type, builder=None, source_hash=None):
+        """Cached graph for ``place``, building and storing it on a miss.
+
+        :param builder: Callable ``(place, network_type) -> MultiDiGraph``.
+            Defaults to downloading from Overpass.
+        :param source_hash: Fingerprint of the data ``builder`` reads; a
+            cached graph recorded with another fingerprint is rebuilt.
+        """
+        entry = self.entry(place, network_type)
+        G = None
+        if source_hash is None or (entry and entry["source_hash"] == source_hash):
+            with span("read cache"):
+                G = self.get(place, network_type)
+        if G is None:
+            with span("build" if builder else "fetch"):
+                G = (builder or download_graph)(place, network_type)
+            with span("write cache"):
+                self.put(place, network_type, G, source_hash=source_hash)
+        return G
+
+    def seed_from_xml(self, place, network_type, xml_path):
+        """Populate the cache from a local OSM XML file (no network access)."""
+        import osmnx as ox
+
+        from .costs import ensure_travel_times
+
+        G = ensure_travel_times(ox.graph_from_xml(xml_path))
+        return self.put(place, network_type, G, source_hash=file_digest(xml_path))
+
+    def invalidate(self, place, network_type=None):
+        """Drop ``place`` for one or every network type. Returns the count."""
+        with self._lock:
+            if network_type is not None:
+                keys = [cache_key(place, network_type)]
+            else:
+                wanted = normalize_place(place)
+                keys = [
+                    key
+                    for key, entry in self._manifest.items()
+                    if normalize_place(entry["place"]) == wanted
+                ]
+            removed = sum(1 for key in keys if self._remove(key))
+            self._write_manifest()
+        return removed
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._manifest):
+                self._remove(key)
+            self._write_manifest()
+
+    # Internals
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove(self, key):
+        entry = self._manifest.pop(key, None)
+        if entry is None:
+            return False
+        self._remove_file(self._graph_path(key))
+        for name in entry.get("sidecars", ()):
+            self._remove_file(self._sidecar_path(key, name))
+        return True
+
+    def _evict(self, keep=None):
+        """Remove least recently used entries until under ``max_bytes``."""
+        lru = sorted(self._manifest.values(), key=lambda e: e["last_access"])
+        total = self.total_bytes()
+        for entry in lru:
+            if total <= self.max_bytes:
+                break
+            if entry["key"] == keep:
+                continue
+            total -= entry["size"]
+            self._remove(entry["key"])
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide registry of loaded street graphs.
+
+The registry keeps recently used ``MultiDiGraph`` objects in memory together
+with the indexes derived from them (nearest-node index, routing arrays...),
+so routing repeatedly in the same region only pays for the path search.
+Regions missing from memory are resolved through the on-disk ``GraphCache``.
+
+The registry is shared by background tasks: lookups are guarded by a lock,
+while loading a region only holds a lock specific to that region, so several
+regions can be downloaded at the same time.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .graph_cache import cache_key
+from .route_cache import next_graph_version
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+# Rough CPython/NetworkX footprint of an osmnx node and edge with their
+# attribute dicts; exact accounting would cost more than it saves.
+NODE_BYTES = 600
+EDGE_BYTES = 1200
+
+
+def estimate_graph_bytes(G):
+    return G.number_of_nodes() * NODE_BYTES + G.number_of_edges() * EDGE_BYTES
+
+
+def estimate_index_bytes(index):
+    """Size of a derived index, using its ``nbytes`` when it reports one."""
+    return int(getattr(index, "nbytes", 0))
+
+
+class RegionEntry:
+    """A loaded graph and the indexes derived from it.
+
+    ``version`` changes whenever the graph does (see ``patch``), so results
+    cached for one version are never served for another.
+    """
+
+    def __init__(self, place, network_type, graph, registry=None, source_hash=None):
+        self.place = place
+        self.network_type = network_type
+        self.graph = graph
+        self.source_hash = source_hash
+        self.indexes = {}
+        self.version = next_graph_version()
+        self.last_access = time.time()
+        self._registry = registry
+        self._lock = threading.RLock()
+
+    @property
+    def key(self):
+        return cache_key(self.place, self.network_type)
+
+    @property
+    def nbytes(self):
+        return estimate_graph_bytes(self.graph) + sum(
+            estimate_index_bytes(index) for index in self.indexes.values()
+        )
+
+    def derived(self, name, factory):
+        """Index ``name`` built from the graph by ``factory`` on first use."""
+        index = self.indexes.get(name)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self.indexes.get(name)
+            if index is None:
+                index = self.indexes[name] = factory(self.graph)
+                built = True
+            else:
+                built = False
+        if built and self._registry is not None:
+            self._registry.evict(keep=self.key)
+        return index
+
+    def persisted(self, name, factory, valid=None):
+        """Like ``derived``, also keeping the index as a graph cache sidecar.
+
+        Worth it for indexes slower to build than to read back, such as
+        contraction hierarchies. Entries outside a registry only keep the
+        index in memory.
+
+        :param valid: Optional predicate on a sidecar read back; one it
+            rejects, e.g. built before the graph was edited, is rebuilt
+            and replaced.
+        """
+        cache = self._registry.graph_cache if self._registry is not None else None
+
+        def load_or_build(G):
+            index = None
+            if cache is not None:
+                index = cache.get_sidecar(self.place, self.network_type, name)
+            if index is not None and valid is not None and not valid(index):
+                index = None
+            if index is None:
+                index = factory(G)
+                if cache is not None:
+                    cache.put_sidecar(self.place, self.network_type, name, index)
+            return index
+
+        return self.derived(name, load_or_build)
+
+    def patch(self, change):
+        """Bring the derived indexes up to date after the graph was edited.
+
+        Indexes with a ``patched(G, change)`` method are replaced by their
+        patched copy; the others are dropped and rebuilt on next use. The
+        graph takes a new ``version``.
+        """
+        with self._lock:
+            self.version = next_graph_version()
+            for name, index in list(self.indexes.items()):
+                patch = getattr(index, "patched", None)
+                if patch is None:
+                    del self.indexes[name]
+                else:
+                    self.indexes[name] = patch(self.graph, change)
+
+
+class GraphRegistry:
+    """LRU registry of ``RegionEntry`` objects bounded by ``max_bytes``."""
+
+    def __init__(self, graph_cache, max_bytes=DEFAULT_MAX_BYTES):
+        self.graph_cache = graph_cache
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    def __contains__(self, region):
+        return cache_key(*region) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_access = time.time()
+            return entry
+
+    def resolve(self, place, network_type="drive", builder=None, source_hash=None):
+        """Entry for ``place``, loading it from the graph cache when needed.
+
+        With ``source_hash``, a region loaded from other source data is
+        reloaded (see ``GraphCache.get_or_build``).
+        """
+        key = cache_key(place, network_type)
+
+        def current(entry):
+            return entry is not None and source_hash in (None, entry.source_hash)
+
+        entry = self._lookup(key)
+        if current(entry):
+            return entry
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        # Concurrent callers asking for the same region wait for one load
+        with loading:
+            entry = self._lookup(key)
+            if not current(entry):
+                G = self.graph_cache.get_or_build(
+                    place, network_type, builder, source_hash
+                )
+                cached = self.graph_cache.entry(place, network_type) or {}
+                entry = self.register(
+                    place, network_type, G, cached.get("source_hash", source_hash)
+                )
+        with self._lock:
+            self._loading.pop(key, None)
+        return entry
+
+    def register(self, place, network_type, G, source_hash=None):
+        """Hold ``G`` in memory, replacing any previous graph for ``place``."""
+        key = cache_key(place, network_type)
+        entry = RegionEntry(place, network_type, G, registry=self, source_hash=source_hash)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.evict(keep=key)
+        return entry
+
+    def discard(self, place, network_type="drive"):
+        with self._lock:
+            return self._entries.pop(cache_key(place, network_type), None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def evict(self, keep=None):
+        """Drop least recently used regions until under ``max_bytes``.
+
+        The region named by ``keep`` stays even when it alone exceeds the
+        budget, otherwise a large city could never be routed on.
+        """
+        with self._lock:
+            total = self.total_bytes()
+            for key in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                total -= self._entries.pop(key).nbytes
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+One-to-many and many-to-many travel cost matrices.
+
+Every origin runs one Dijkstra search that stops as soon as all destinations
+are settled. Origins are processed in blocks, in parallel over a process pool
+sharing the graph, and each finished block is streamed to the output: an
+in-memory array, a ``.npy`` memory map, or a Parquet file in long format
+(``origin``, ``destination``, ``cost``) written one row group per block.
+"""
+
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from .parallel import SharedCSR, csr_pool, default_workers, worker_csr
+from .search import INF, one_to_many
+
+# Origins per task handed to a worker
+ORIGINS_PER_BLOCK = 16
+
+
+def cost_rows(csr, origins, destinations, weight):
+    """``len(origins) x len(destinations)`` cost block, ``inf`` if unreachable."""
+    destinations = destinations.tolist()
+    targets = set(destinations)
+    block = np.full((len(origins), len(destinations)), INF)
+    for row, origin in enumerate(origins.tolist()):
+        tree = one_to_many(csr, origin, targets, weight)
+        dist = tree.dist
+        settled = tree.settled
+        block[row] = [dist[d] if d in settled else INF for d in destinations]
+    return block
+
+
+def _cost_rows_in_worker(start, origins, destinations, weight):
+    return start, cost_rows(worker_csr(), origins, destinations, weight)
+
+
+class _ParquetSink:
+    """Appends cost blocks to a Parquet file in long format."""
+
+    def __init__(self, path, origin_ids, destination_ids):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.origin_ids = origin_ids
+        self.destination_ids = destination_ids
+        self.schema = pa.schema(
+            [("origin", pa.int64()), ("destination", pa.int64()), ("cost", pa.float64())]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def __setitem__(self, rows, block):
+        origins = np.repeat(self.origin_ids[rows], len(self.destination_ids))
+        destinations = np.tile(self.destination_ids, block.shape[0])
+        table = self.pa.Table.from_arrays(
+            [
+                self.pa.array(origins),
+                self.pa.array(destinations),
+                self.pa.array(block.ravel()),
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+def cost_matrix(csr, origins, destinations, weight="length", workers=None,
+                output=None, progress=None):
+    """Costs from every origin to every destination (CSR positions).
+
+    :param output: None for an in-memory array, a ``.npy`` path for a memory
+        mapped array, or a ``.parquet`` path for a long-format table with
+        OSM node ids.
+    :param progress: Optional callable receiving the fraction done.
+    :returns: The matrix (array or memory map), or the Parquet path.
+    """
+    origins = np.asarray(origins, dtype=np.int64)
+    destinations = np.asarray(destinations, dtype=np.int64)
+    shape = (len(origins), len(destinations))
+
+    if output is None:
+        sink = np.full(shape, INF)
+    elif output.endswith(".npy"):
+        sink = np.lib.format.open_memmap(output, mode="w+", dtype=np.float64, shape=shape)
+    elif output.endswith(".parquet"):
+        sink = _ParquetSink(output, csr.node_ids[origins], csr.node_ids[destinations])
+    else:
+        raise ValueError(f"Unsupported matrix output: {output}")
+
+    starts = list(range(0, len(origins), ORIGINS_PER_BLOCK))
+    workers = workers or default_workers()
+
+    def store(start, block, done):
+        sink[start: start + block.shape[0]] = block
+        if progress is not None:
+            progress(done / len(starts))
+
+    try:
+        if workers == 1 or len(starts) <= 1:
+            for done, start in enumerate(starts, start=1):
+                block = cost_rows(
+                    csr, origins[start: start + ORIGINS_PER_BLOCK], destinations, weight
+                )
+                store(start, block, done)
+        else:
+            with SharedCSR(csr) as shared, csr_pool(shared, workers) as pool:
+                futures = [
+                    pool.submit(
+                        _cost_rows_in_worker,
+                        start,
+                        origins[start: start + ORIGINS_PER_BLOCK],
+                        destinations,
+                        weight,
+                    )
+                    for start in starts
+                ]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    store(*future.result(), done)
+    finally:
+        if isinstance(sink, _ParquetSink):
+            sink.close()
+
+    if isinstance(sink, _ParquetSink):
+        return output
+    if isinstance(sink, np.memmap):
+        sink.flush()
+    return sink
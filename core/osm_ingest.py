@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+"""
+Offline drive-network builder for local OpenStreetMap extracts.
+
+Reads ``.osm`` (optionally ``.gz`` / ``.bz2``) files with a streaming XML
+parser and ``.osm.pbf`` files with pyosmium, in two passes that only keep
+what the graph needs:
+
+1. ways: drivable ways are selected with the same tag filter osmnx sends to
+   Overpass for ``network_type="drive"``, keeping their node references and
+   a handful of tags;
+2. nodes: coordinates are kept only for nodes those ways reference and that
+   fall inside the clip area (a bbox or a shapely polygon).
+
+Both passes consume the file in chunks of ``chunk_size`` elements, so memory
+grows with the size of the drive network, not of the extract. The graph is
+then assembled like ``osmnx.graph_from_place`` does: largest weakly
+connected component, simplified, with ``street_count``, speeds and travel
+times, ready for the graph cache and the exporters.
+
+The kept ways and nodes are also returned as a ``RawNetwork``, which the
+graph cache stores next to the graph so OSM change files can later be
+applied to it without reading the extract again (see ``osm_update``).
+"""
+
+import bz2
+import gzip
+import hashlib
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from itertools import chain
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .costs import ensure_travel_times
+from .graph_cache import SIDECARS_KEY
+from .profiling import span
+
+CHUNK_SIZE = 100000
+
+# Graph cache sidecar holding the RawNetwork of a graph
+RAW_SIDECAR = "raw"
+
+# osmnx "drive" filter: ways with a highway tag, minus these tag values.
+# Overpass matches them as unanchored regular expressions, so do we.
+DRIVE_EXCLUDE = {
+    "area": re.compile("yes"),
+    "access": re.compile("private"),
+    "highway": re.compile(
+        "abandoned|bridleway|bus_guideway|construction|corridor|cycleway|"
+        "elevator|escalator|footway|no|path|pedestrian|planned|platform|"
+        "proposed|raceway|razed|rest_area|service|services|steps|track"
+    ),
+    "motor_vehicle": re.compile("no"),
+    "motorcar": re.compile("no"),
+    "service": re.compile(
+        "alley|driveway|emergency_access|parking|parking_aisle|private"
+    ),
+}
+
+# Tags copied onto edges and nodes, as osmnx's useful_tags_way / _node
+WAY_TAGS = (
+    "bridge", "tunnel", "oneway", "lanes", "ref", "name", "highway",
+    "maxspeed", "service", "access", "area", "landuse", "width",
+    "est_width", "junction",
+)
+NODE_TAGS = ("highway", "junction", "railway", "ref")
+
+ONEWAY_VALUES = {"yes", "true", "1", "-1", "reverse", "T", "F"}
+REVERSED_VALUES = {"-1", "reverse", "T"}
+
+
+def is_drivable(tags):
+    if "highway" not in tags:
+        return False
+    for key, pattern in DRIVE_EXCLUDE.items():
+        value = tags.get(key)
+        if value is not None and pattern.search(value):
+            return False
+    return True
+
+
+def way_direction(tags):
+    """1 one-way along the node order, -1 against it, 0 both ways."""
+    if tags.get("oneway") in ONEWAY_VALUES or tags.get("junction") == "roundabout":
+        return -1 if tags.get("oneway") in REVERSED_VALUES else 1
+    return 0
+
+
+def extract_fingerprint(path, clip=None):
+    """Cheap identity of an extract and clip area, for cache invalidation.
+
+    Hashing a country extract would take longer than many rebuilds, so the
+    path, size and modification time stand in for the content.
+    """
+    stat = os.stat(path)
+    clip_text = getattr(clip, "wkt", None) or repr(clip)
+    text = "{}|{}|{}|{}".format(
+        os.path.abspath(path), stat.st_size, stat.st_mtime_ns, clip_text
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Readers: generators of element chunks
+
+
+def is_pbf(path):
+    return path.lower().endswith(".pbf")
+
+
+def _open_xml(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _xml_elements(path, tag):
+    """``tag`` elements of an OSM XML file, freed once the caller moves on."""
+    with _open_xml(path) as handle:
+        context = ET.iterparse(handle, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == tag:
+                yield elem
+            if elem.tag in ("node", "way", "relation"):
+                root.clear()
+
+
+def _chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _xml_ways(path):
+    for elem in _xml_elements(path, "way"):
+        yield (
+            int(elem.get("id")),
+            [int(nd.get("ref")) for nd in elem.iter("nd")],
+            {tag.get("k"): tag.get("v") for tag in elem.iter("tag")},
+        )
+
+
+def _xml_nodes(path):
+    for elem in _xml_elements(path, "node"):
+        yield (
+            int(elem.get("id")),
+            float(elem.get("lat")),
+            float(elem.get("lon")),
+            {tag.get("k"): tag.get("v") for tag in elem.iter("tag")},
+        )
+
+
+def _osmium():
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError(
+            "Reading .osm.pbf extracts needs pyosmium (pip install osmium)."
+        ) from e
+    return osmium
+
+
+def _pbf_ways(path):
+    osmium = _osmium()
+    processor = osmium.FileProcessor(path, osmium.osm.WAY).with_filter(
+        osmium.filter.KeyFilter("highway")
+    )
+    for way in processor:
+        yield (
+            way.id,
+            [node.ref for node in way.nodes],
+            {tag.k: tag.v for tag in way.tags},
+        )
+
+
+def _pbf_nodes(path, node_ids):
+    osmium = _osmium()
+    processor = osmium.FileProcessor(path, osmium.osm.NODE).with_filter(
+        osmium.filter.IdFilter(node_ids.tolist())
+    )
+    for node in processor:
+        location = node.location
+        yield (
+            node.id,
+            location.lat,
+            location.lon,
+            {tag.k: tag.v for tag in node.tags},
+        )
+
+
+# Pass 1: ways
+
+
+class WayStore:
+    """Drivable ways: ids, directions, tags and concatenated node refs."""
+
+    def __init__(self):
+        self.ids = []
+        self.directions = []
+        self.tags = []
+        self.counts = []
+        self._refs = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, chunk):
+        refs = []
+        for way_id, nodes, tags in chunk:
+            if len(nodes) < 2 or not is_drivable(tags):
+                continue
+            self.ids.append(way_id)
+            self.directions.append(way_direction(tags))
+            self.tags.append({key: tags[key] for key in WAY_TAGS if key in tags})
+            self.counts.append(len(nodes))
+            refs.append(nodes)
+        if refs:
+            self._refs.append(np.fromiter(chain.from_iterable(refs), np.int64))
+
+    @property
+    def refs(self):
+        if len(self._refs) != 1:
+            self._refs = [np.concatenate(self._refs or [np.empty(0, np.int64)])]
+        return self._refs[0]
+
+    def node_ids(self):
+        """Sorted ids of every node the ways reference."""
+        return np.unique(self.refs)
+
+
+def scan_ways(path, chunk_size=CHUNK_SIZE, progress=None):
+    ways = WayStore()
+    source = _pbf_ways(path) if is_pbf(path) else _xml_ways(path)
+    for chunk in _chunked(source, chunk_size):
+        ways.add(chunk)
+        if progress is not None:
+            progress(len(ways))
+    return ways
+
+
+# Pass 2: nodes
+
+
+def prepare_clip(clip):
+    """``clip`` as a bbox tuple or a prepared shapely geometry (or None)."""
+    if clip is None or isinstance(clip, (tuple, list)):
+        return clip
+    import shapely
+
+    shapely.prepare(clip)
+    return clip
+
+
+def clip_mask(clip, lats, lons):
+    """Mask of the coordinates inside ``clip`` (bbox tuple or geometry)."""
+    if clip is None:
+        return np.ones(len(lats), dtype=bool)
+    if isinstance(clip, (tuple, list)):
+        min_lon, min_lat, max_lon, max_lat = clip
+    else:
+        min_lon, min_lat, max_lon, max_lat = clip.bounds
+    mask = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+    if not isinstance(clip, (tuple, list)) and mask.any():
+        import shapely
+
+        mask[mask] = shapely.contains_xy(clip, lons[mask], lats[mask])
+    return mask
+
+
+class NodeStore:
+    """Coordinates and tags of the kept nodes, sorted by id once complete."""
+
+    def __init__(self):
+        self._ids = []
+        self._lats = []
+        self._lons = []
+        self.tags = {}
+
+    def add(self, chunk, wanted, clip):
+        ids = np.fromiter((node[0] for node in chunk), np.int64, len(chunk))
+        lats = np.fromiter((node[1] for node in chunk), np.float64, len(chunk))
+        lons = np.fromiter((node[2] for node in chunk), np.float64, len(chunk))
+        positions = np.minimum(np.searchsorted(wanted, ids), len(wanted) - 1)
+        keep = (wanted[positions] == ids) & clip_mask(clip, lats, lons)
+        self._ids.append(ids[keep])
+        self._lats.append(lats[keep])
+        self._lons.append(lons[keep])
+        for index in np.flatnonzero(keep).tolist():
+            tags = chunk[index][3]
+            kept = {key: tags[key] for key in NODE_TAGS if key in tags}
+            if kept:
+                self.tags[chunk[index][0]] = kept
+
+    def arrays(self):
+        """(ids, lats, lons) sorted by id."""
+        ids = np.concatenate(self._ids or [np.empty(0, np.int64)])
+        order = np.argsort(ids)
+        return (
+            ids[order],
+            np.concatenate(self._lats or [np.empty(0)])[order],
+            np.concatenate(self._lons or [np.empty(0)])[order],
+        )
+
+
+def scan_nodes(path, wanted, clip=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Nodes of ``wanted`` (sorted ids) that lie inside ``clip``."""
+    nodes = NodeStore()
+    if len(wanted) == 0:
+        return nodes
+    clip = prepare_clip(clip)
+    source = _pbf_nodes(path, wanted) if is_pbf(path) else _xml_nodes(path)
+    for chunk in _chunked(source, chunk_size):
+        nodes.add(chunk, wanted, clip)
+        if progress is not None:
+            progress(sum(len(ids) for ids in nodes._ids))
+    return nodes
+
+
+# Assembly
+
+
+def segment_edges(u, v, osmid, tags, direction, length):
+    """osmnx-style edges of one way segment: one if one-way, else two."""
+    attrs = dict(tags, osmid=osmid, oneway=direction != 0)
+    if direction == -1:
+        u, v = v, u
+    yield u, v, dict(attrs, reversed=False, length=length)
+    if direction == 0:
+        yield v, u, dict(attrs, reversed=True, length=length)
+
+
+def drive_segments(ways, nodes):
+    """Way segments of the largest weakly connected component, as arrays.
+
+    :returns: ``(node_ids, lats, lons, pu, pv, way_of, used)``: the kept
+        nodes sorted by id, the positions of each segment's endpoints in
+        them, the index of its way in ``ways`` and the positions of the
+        nodes segments use.
+    """
+    node_ids, lats, lons = nodes.arrays()
+    if len(ways) == 0 or len(node_ids) == 0:
+        raise ValueError("The extract has no drivable streets in the clip area.")
+
+    refs = ways.refs
+    way_of = np.repeat(np.arange(len(ways)), ways.counts)
+    u, v = refs[:-1], refs[1:]
+    pu = np.minimum(np.searchsorted(node_ids, u), len(node_ids) - 1)
+    pv = np.minimum(np.searchsorted(node_ids, v), len(node_ids) - 1)
+    # Consecutive refs of one way whose endpoints were both kept
+    keep = (way_of[:-1] == way_of[1:]) & (node_ids[pu] == u) & (node_ids[pv] == v)
+    pu, pv, way_of = pu[keep], pv[keep], way_of[:-1][keep]
+    if len(pu) == 0:
+        raise ValueError("The extract has no drivable streets in the clip area.")
+
+    # Largest weakly connected component, found on the arrays before any
+    # networkx object exists rather than by copying a subgraph afterwards
+    adjacency = coo_matrix(
+        (np.ones(len(pu), dtype=np.int8), (pu, pv)), shape=(len(node_ids),) * 2
+    )
+    _, labels = connected_components(adjacency, directed=True, connection="weak")
+    used = np.unique(np.concatenate([pu, pv]))
+    largest = np.bincount(labels[used]).argmax()
+    in_largest = labels[pu] == largest
+    pu, pv, way_of = pu[in_largest], pv[in_largest], way_of[in_largest]
+    used = used[labels[used] == largest]
+    return node_ids, lats, lons, pu, pv, way_of, used
+
+
+def assemble_graph(ways, nodes, source=None):
+    """osmnx-style drive ``MultiDiGraph`` from the scanned ways and nodes."""
+    import networkx as nx
+    import osmnx as ox
+
+    node_ids, lats, lons, pu, pv, way_of, used = drive_segments(ways, nodes)
+    lengths = ox.distance.great_circle(lats[pu], lons[pu], lats[pv], lons[pv])
+    directions = np.asarray(ways.directions, dtype=np.int8)[way_of]
+
+    G = nx.MultiDiGraph(
+        created_date=time.strftime("%Y-%m-%d %H:%M:%S"),
+        created_with="Route Builder offline ingest",
+        crs="epsg:4326",
+        source=os.path.basename(source) if source else None,
+    )
+    G.add_nodes_from(
+        (node, dict(nodes.tags.get(node, ()), y=lat, x=lon))
+        for node, lat, lon in zip(
+            node_ids[used].tolist(), lats[used].tolist(), lons[used].tolist()
+        )
+    )
+
+    ids = node_ids.tolist()
+    edges = []
+    for a, b, way, direction, length in zip(
+        pu.tolist(), pv.tolist(), way_of.tolist(), directions.tolist(), lengths.tolist()
+    ):
+        edges.extend(
+            segment_edges(ids[a], ids[b], ways.ids[way], ways.tags[way], direction, length)
+        )
+    G.add_edges_from(edges)
+    del edges
+
+    with span("simplify"):
+        G = ox.simplify_graph(G)
+    nx.set_node_attributes(G, ox.stats.count_streets_per_node(G), name="street_count")
+    with span("travel times"):
+        return ensure_travel_times(G)
+
+
+class RawNetwork:
+    """Drivable ways and kept nodes behind a graph built from an extract.
+
+    Plain dicts rather than arrays, since change files edit them one element
+    at a time:
+
+    * ``ways``: way id -> (node refs, kept tags);
+    * ``nodes``: node id -> (lat, lon, kept tags), for nodes inside the clip;
+    * ``node_ways``: node id -> ids of the ways referencing it;
+    * ``edges_by_way``: way id -> ``(u, v, key)`` of the graph edges it is
+      part of, several ways sharing an edge after simplification;
+    * ``hwy_speeds``: speed (km/h) osmnx imputed per highway type, reused for
+      new edges so they get the speeds a full rebuild would give them;
+    * ``applied``: digests of the change files applied so far.
+    """
+
+    # Rough CPython footprint of one way or node entry with its containers
+    ENTRY_BYTES = 400
+
+    def __init__(self, ways, nodes, clip=None):
+        self.ways = ways
+        self.nodes = nodes
+        self.clip = clip
+        self.node_ways = {}
+        for way, (refs, _) in ways.items():
+            for node in refs:
+                self.node_ways.setdefault(node, set()).add(way)
+        self.edges_by_way = {}
+        self.hwy_speeds = {}
+        self.applied = []
+
+    @classmethod
+    def from_stores(cls, ways, nodes, clip=None):
+        node_ids, lats, lons = nodes.arrays()
+        refs = np.split(ways.refs, np.cumsum(ways.counts)[:-1]) if len(ways) else []
+        return cls(
+            {
+                way: (tuple(way_refs.tolist()), tags)
+                for way, way_refs, tags in zip(ways.ids, refs, ways.tags)
+            },
+            {
+                node: (lat, lon, nodes.tags.get(node, {}))
+                for node, lat, lon in zip(node_ids.tolist(), lats.tolist(), lons.tolist())
+            },
+            clip,
+        )
+
+    @property
+    def nbytes(self):
+        return (len(self.ways) + len(self.nodes)) * self.ENTRY_BYTES
+
+    def index_graph(self, G):
+        """Record which edges of ``G`` each way became, and their speeds."""
+        for u, v, k, data in G.edges(keys=True, data=True):
+            self.add_edge(u, v, k, data)
+            if "maxspeed" not in data and "speed_kph" in data:
+                highway = data.get("highway")
+                if isinstance(highway, list):
+                    highway = highway[0]
+                self.hwy_speeds.setdefault(highway, data["speed_kph"])
+
+    def patched(self, G, change):
+        # ``apply_change`` updates the raw network together with the graph
+        return self
+
+    def add_edge(self, u, v, k, data):
+        for way in edge_ways(data):
+            self.edges_by_way.setdefault(way, set()).add((u, v, k))
+
+    def remove_edge(self, u, v, k, data):
+        for way in edge_ways(data):
+            edges = self.edges_by_way.get(way)
+            if edges is not None:
+                edges.discard((u, v, k))
+                if not edges:
+                    del self.edges_by_way[way]
+
+
+def edge_ways(data):
+    """OSM way ids merged into an edge (its ``osmid``, a list or a scalar)."""
+    osmid = data.get("osmid")
+    if osmid is None:
+        return ()
+    return osmid if isinstance(osmid, list) else (osmid,)
+
+
+def build_network_from_extract(path, clip=None, chunk_size=CHUNK_SIZE, progress=None):
+    """``(graph, RawNetwork)`` of the drive network of a local extract.
+
+    :param clip: None for the whole extract, a ``(min_lon, min_lat,
+        max_lon, max_lat)`` tuple, or a shapely (multi)polygon in WGS84.
+    :param progress: Optional callable receiving the fraction done; it is
+        called for every chunk, so it can also raise to cancel.
+    """
+
+    def report(fraction):
+        if progress is not None:
+            progress(fraction)
+
+    with span("scan ways"):
+        ways = scan_ways(path, chunk_size, progress=lambda _: report(0.0))
+    report(0.4)
+    with span("scan nodes"):
+        nodes = scan_nodes(
+            path, ways.node_ids(), clip, chunk_size, progress=lambda _: report(0.4)
+        )
+    report(0.7)
+    with span("assemble"):
+        G = assemble_graph(ways, nodes, source=path)
+    with span("raw network"):
+        raw = RawNetwork.from_stores(ways, nodes, clip)
+        raw.index_graph(G)
+    report(1.0)
+    return G, raw
+
+
+def build_graph_from_extract(path, clip=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Drive network of a local extract (see ``build_network_from_extract``)."""
+    return build_network_from_extract(path, clip, chunk_size, progress)[0]
+
+
+def extract_builder(path, clip=None, chunk_size=CHUNK_SIZE, progress=None):
+    """``(place, network_type)`` builder for ``GraphCache.get_or_build``.
+
+    The ``RawNetwork`` is handed to the cache as the ``raw`` sidecar.
+    """
+
+    def build(place, network_type):
+        if network_type != "drive":
+            raise ValueError(
+                f"Offline extracts only provide the drive network, not {network_type}."
+            )
+        G, raw = build_network_from_extract(path, clip, chunk_size, progress)
+        G.graph[SIDECARS_KEY] = {RAW_SIDECAR: raw}
+        return G
+
+    return build
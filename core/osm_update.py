@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental updates of extract-built graphs from OSM change files.
+
+An ``.osc`` file (optionally ``.gz`` / ``.bz2``) lists the nodes and ways
+created, modified and deleted since an extract was cut. Instead of building
+the whole network again, ``apply_change`` edits the graph in place:
+
+1. the ``RawNetwork`` of the graph takes the new node and way versions;
+2. the affected ways are the changed ways, the ways of changed nodes and the
+   ways crossing them, plus every way merged into the same simplified edge
+   as one of those;
+3. their edges are removed, and the ways are assembled and simplified again
+   on their own, with the nodes they share with the rest of the graph kept
+   as edge endpoints;
+4. the new edges get lengths, speeds and travel times the way the full
+   build gives them, and ``street_count`` is recomputed around them.
+
+The ``ChangeSummary`` it returns lets the derived indexes of a registry
+region (``RegionEntry.patch``) and an exported GeoPackage (``export``) be
+patched in turn, so the work grows with the size of the change rather than
+with the size of the graph.
+"""
+
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .costs import FALLBACK_SPEED_KPH
+from .osm_ingest import (
+    NODE_TAGS,
+    WAY_TAGS,
+    _open_xml,
+    clip_mask,
+    edge_ways,
+    is_drivable,
+    prepare_clip,
+    segment_edges,
+    way_direction,
+)
+
+ACTIONS = ("create", "modify", "delete")
+
+# Node attribute marking the nodes a local rebuild must keep as endpoints
+_BOUNDARY = "_boundary"
+
+
+class OsmChange:
+    """Last version of every node and way in a change file.
+
+    ``nodes`` maps ids to ``(lat, lon, tags)`` and ``ways`` to ``(refs,
+    tags)``; deleted elements map to None.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.ways = {}
+
+    def __len__(self):
+        return len(self.nodes) + len(self.ways)
+
+
+def read_osc(path):
+    """Parse an ``osmChange`` file; relations are ignored."""
+    change = OsmChange()
+    action = None
+    with _open_xml(path) as handle:
+        context = ET.iterparse(handle, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "start":
+                if elem.tag in ACTIONS:
+                    action = elem.tag
+                continue
+            if elem.tag == "node":
+                element_id = int(elem.get("id"))
+                if action == "delete":
+                    change.nodes[element_id] = None
+                else:
+                    change.nodes[element_id] = (
+                        float(elem.get("lat")),
+                        float(elem.get("lon")),
+                        {tag.get("k"): tag.get("v") for tag in elem.iter("tag")},
+                    )
+            elif elem.tag == "way":
+                element_id = int(elem.get("id"))
+                if action == "delete":
+                    change.ways[element_id] = None
+                else:
+                    change.ways[element_id] = (
+                        [int(nd.get("ref")) for nd in elem.iter("nd")],
+                        {tag.get("k"): tag.get("v") for tag in elem.iter("tag")},
+                    )
+            if elem.tag in ("node", "way", "relation"):
+                root.clear()
+    return change
+
+
+class ChangeSummary:
+    """Graph elements an update removed and added.
+
+    A node whose coordinates changed is both removed and added; edge keys
+    are those of the graph before (removed) and after (added) the update.
+    """
+
+    def __init__(self):
+        self.removed_edges = []
+        self.added_edges = []
+        self.removed_nodes = set()
+        self.added_nodes = set()
+
+    def __bool__(self):
+        return bool(
+            self.removed_edges or self.added_edges or self.removed_nodes or self.added_nodes
+        )
+
+    def __repr__(self):
+        return (
+            f"ChangeSummary(-{len(self.removed_edges)}/+{len(self.added_edges)} edges, "
+            f"-{len(self.removed_nodes)}/+{len(self.added_nodes)} nodes)"
+        )
+
+
+def _update_raw(raw, change):
+    """Apply ``change`` to ``raw`` and return the ids of the changed ways."""
+    clip = prepare_clip(raw.clip)
+    touched = set()
+    changed_nodes = set()
+
+    for node, value in change.nodes.items():
+        changed_nodes.add(node)
+        touched.update(raw.node_ways.get(node, ()))
+        raw.nodes.pop(node, None)
+        if value is None:
+            continue
+        lat, lon, tags = value
+        if clip_mask(clip, [lat], [lon])[0]:
+            kept = {key: tags[key] for key in NODE_TAGS if key in tags}
+            raw.nodes[node] = (lat, lon, kept)
+
+    for way, value in change.ways.items():
+        touched.add(way)
+        old = raw.ways.pop(way, None)
+        if old is not None:
+            for node in old[0]:
+                changed_nodes.add(node)
+                ways = raw.node_ways.get(node)
+                if ways is not None:
+                    ways.discard(way)
+                    if not ways:
+                        del raw.node_ways[node]
+        if value is None:
+            continue
+        refs, tags = value
+        if len(refs) < 2 or not is_drivable(tags):
+            continue
+        raw.ways[way] = (tuple(refs), {key: tags[key] for key in WAY_TAGS if key in tags})
+        for node in refs:
+            changed_nodes.add(node)
+            raw.node_ways.setdefault(node, set()).add(way)
+
+    # Nodes no drivable way references any more are not kept, as at ingest
+    for node in changed_nodes:
+        if node not in raw.node_ways:
+            raw.nodes.pop(node, None)
+    # Ways crossing a changed node or way may gain or lose a junction there
+    for node in changed_nodes:
+        touched.update(raw.node_ways.get(node, ()))
+    return touched
+
+
+def _affected_edges(G, raw, ways):
+    """Edges of ``ways``, grown to every way sharing a simplified edge."""
+    ways = set(ways)
+    edges = set()
+    pending = list(ways)
+    while pending:
+        way = pending.pop()
+        for edge in raw.edges_by_way.get(way, ()):
+            if edge in edges or not G.has_edge(*edge):
+                continue
+            edges.add(edge)
+            for other in edge_ways(G.edges[edge]):
+                if other not in ways:
+                    ways.add(other)
+                    pending.append(other)
+    return ways, edges
+
+
+def _local_graph(G, raw, ways):
+    """Unsimplified graph of ``ways``, nodes still in ``G`` marked as boundary."""
+    import networkx as nx
+    import osmnx as ox
+
+    segments = []
+    for way in ways:
+        entry = raw.ways.get(way)
+        if entry is None:
+            continue
+        refs, tags = entry
+        direction = way_direction(tags)
+        for u, v in zip(refs[:-1], refs[1:]):
+            if u in raw.nodes and v in raw.nodes:
+                segments.append((u, v, way, tags, direction))
+
+    L = nx.MultiDiGraph(crs=G.graph.get("crs", "epsg:4326"))
+    if not segments:
+        return L
+    coords = np.array(
+        [raw.nodes[u][:2] + raw.nodes[v][:2] for u, v, _, _, _ in segments]
+    )
+    lengths = ox.distance.great_circle(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+    edges = []
+    for (u, v, way, tags, direction), length in zip(segments, lengths.tolist()):
+        edges.extend(segment_edges(u, v, way, tags, direction, length))
+    L.add_edges_from(edges)
+    for node, data in L.nodes(data=True):
+        lat, lon, tags = raw.nodes[node]
+        data.update(tags, y=lat, x=lon)
+        if node in G:
+            data[_BOUNDARY] = True
+
+    # Pieces not touching the rest of the graph are left out, as the full
+    # build keeps only the largest connected component. When the change
+    # touched the whole graph, the largest piece is the graph.
+    components = list(nx.weakly_connected_components(L))
+    anchored = [
+        component
+        for component in components
+        if any(_BOUNDARY in L.nodes[node] for node in component)
+    ]
+    keep = set().union(*(anchored or [max(components, key=len)]))
+    L.remove_nodes_from([node for node in list(L) if node not in keep])
+    return L
+
+
+def street_counts(G, nodes):
+    """osmnx ``street_count`` of ``nodes``, looking only at their neighbours."""
+    import osmnx as ox
+
+    around = set(nodes)
+    for node in nodes:
+        around.update(G.predecessors(node))
+        around.update(G.successors(node))
+    return ox.stats.count_streets_per_node(G.subgraph(around), nodes=nodes)
+
+
+def apply_change(G, raw, change):
+    """Apply an ``OsmChange`` to ``G`` and its ``RawNetwork`` in place.
+
+    :returns: ``ChangeSummary`` of the graph elements removed and added.
+    """
+    import osmnx as ox
+
+    summary = ChangeSummary()
+    touched = _update_raw(raw, change)
+    ways, edges = _affected_edges(G, raw, touched)
+
+    for u, v, k in edges:
+        raw.remove_edge(u, v, k, G.edges[u, v, k])
+        G.remove_edge(u, v, k)
+        summary.removed_edges.append((u, v, k))
+    for node in {node for edge in edges for node in edge[:2]}:
+        if G.degree(node) == 0:
+            G.remove_node(node)
+            summary.removed_nodes.add(node)
+
+    L = _local_graph(G, raw, ways)
+    if L.number_of_edges():
+        L = ox.simplify_graph(L, node_attrs_include=[_BOUNDARY])
+        ox.add_edge_speeds(L, hwy_speeds=raw.hwy_speeds, fallback=FALLBACK_SPEED_KPH)
+        ox.add_edge_travel_times(L)
+
+    for node, data in L.nodes(data=True):
+        if node not in G:
+            data.pop(_BOUNDARY, None)
+            G.add_node(node, **data)
+            summary.added_nodes.add(node)
+    for u, v, data in L.edges(data=True):
+        k = G.add_edge(u, v, **data)
+        raw.add_edge(u, v, k, data)
+        summary.added_edges.append((u, v, k))
+
+    counted = [node for node in L.nodes if node in G]
+    for node, count in street_counts(G, counted).items():
+        G.nodes[node]["street_count"] = count
+    return summary
+
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Process-pool helpers for work that fans out over a read-only ``CSRGraph``.
+
+The CSR arrays are copied once into shared memory blocks; worker processes
+map them without copying, so a pool of N workers does not hold N copies of
+the graph.
+"""
+
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from .csr import CSRGraph
+
+CSR_ARRAYS = ("node_ids", "lats", "lons", "offsets", "targets", "edge_keys")
+
+# Worker-side graph, attached once per process by the pool initializer
+_worker_csr = None
+_worker_blocks = []
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def python_executable():
+    """Interpreter for worker processes.
+
+    Inside QGIS ``sys.executable`` is the QGIS binary, which cannot run
+    multiprocessing children, so look for the bundled Python instead.
+    """
+    name = os.path.basename(sys.executable).lower()
+    if name.startswith("python"):
+        return sys.executable
+    for candidate in ("python.exe", "pythonw.exe", "bin/python3", "bin/python"):
+        path = os.path.join(sys.exec_prefix, candidate)
+        if os.path.exists(path):
+            return path
+    return shutil.which("python3") or shutil.which("python") or sys.executable
+
+
+class SharedCSR:
+    """Copy of a ``CSRGraph`` in shared memory, owned by the parent process."""
+
+    def __init__(self, csr):
+        self.blocks = []
+        self.spec = {"arrays": {}, "max_speed": None}
+        arrays = {name: getattr(csr, name) for name in CSR_ARRAYS}
+        for weight in ("length", "travel_time"):
+            arrays["weight:" + weight] = csr.weights(weight)
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.spec["arrays"][name] = (block.name, array.shape, array.dtype.str)
+        try:
+            self.spec["max_speed"] = csr.max_speed_mps
+        except ValueError:
+            pass
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach_block(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block again, with the resource
+        # tracker that spawned workers share with the parent; that is a
+        # no-op and the parent still unlinks it once.
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_csr(spec):
+    """``CSRGraph`` view over the shared memory described by ``spec``."""
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec["arrays"].items():
+        block = _attach_block(block_name)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    weights = {
+        name.split(":", 1)[1]: array
+        for name, array in arrays.items()
+        if name.startswith("weight:")
+    }
+    csr = CSRGraph(*(arrays[name] for name in CSR_ARRAYS), weights)
+    csr._max_speed = spec["max_speed"]
+    return csr
+
+
+def _init_worker(spec):
+    global _worker_csr
+    _worker_csr = attach_csr(spec)
+
+
+def worker_csr():
+    """Graph attached by the pool initializer of the current worker."""
+    return _worker_csr
+
+
+@contextmanager
+def csr_pool(shared, workers):
+    """``ProcessPoolExecutor`` whose workers see ``shared`` via ``worker_csr()``.
+
+    When the block raises, e.g. a progress callback cancelling its task,
+    queued work is cancelled instead of run before the error propagates;
+    only the calls already handed to workers are waited for.
+    """
+    context = get_context("spawn")
+    context.set_executable(python_executable())
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(shared.spec,),
+    )
+    try:
+        yield pool
+    except BaseException:
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    pool.shutdown(wait=True)
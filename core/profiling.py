@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight instrumentation of the pipeline stages with nested spans.
+
+``with span("flatten"):`` records the wall time, the CPU time of the
+calling thread and the peak RSS of the process over a block, into the
+``Profiler`` made active in the current thread with ``Profiler.active()``.
+Without an active profiler a span costs one context variable lookup, so
+core functions mark their stages unconditionally. Work done in worker
+processes is only seen as the wall time of the span waiting for it.
+
+The peak RSS is the high-water mark of the process and only grows; the
+``rss_growth_mb`` of a span is how much it raised it, which points at the
+stage responsible for the peak.
+
+A profiler can also run cProfile or pyinstrument around every top-level
+span and keep the profile of the slowest one, to see where the time of the
+dominant stage goes.
+"""
+
+import contextvars
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILERS = ("cprofile", "pyinstrument")
+# File suffix of the profile written by each of PROFILERS
+PROFILE_SUFFIXES = {"cprofile": ".prof", "pyinstrument": ".html"}
+
+MB = 1024 * 1024
+
+_active = contextvars.ContextVar("route_builder_profiler", default=None)
+
+
+def peak_rss_bytes():
+    """High-water mark of the process resident memory, None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    # Windows keeps the peak working set
+    return getattr(info, "peak_wset", info.rss)
+
+
+class Span:
+    """Measurements of one stage; ``depth`` 0 for top-level stages."""
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_rss_mb = None
+        self.rss_growth_mb = None
+
+    def record(self):
+        return {
+            "stage": self.name,
+            "depth": self.depth,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "peak_rss_mb": self.peak_rss_mb,
+            "rss_growth_mb": self.rss_growth_mb,
+        }
+
+    def line(self):
+        text = f"{'  ' * self.depth}{self.name}: {self.wall_s:.2f} s wall, {self.cpu_s:.2f} s CPU"
+        if self.peak_rss_mb is not None:
+            text += f", peak RSS {self.peak_rss_mb:.0f} MB (+{self.rss_growth_mb:.0f})"
+        return text
+
+
+class Profiler:
+    """Spans recorded while the profiler is active.
+
+    :param log: Optional callable receiving the ``Span.line()`` of every
+        finished span, e.g. a QGIS message log or ``print``.
+    :param profiler: None, or one of ``PROFILERS`` to profile the top-level
+        spans and keep the profile of the slowest.
+    """
+
+    def __init__(self, log=None, profiler=None):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.log = log
+        self.profiler = profiler
+        self.spans = []
+        # (wall time, stage, profile) of the slowest profiled span
+        self.slowest = None
+        self._depth = 0
+
+    @contextmanager
+    def active(self):
+        """Make this the profiler of ``span`` in the current context."""
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def _start_profile(self):
+        try:
+            if self.profiler == "cprofile":
+                import cProfile
+
+                profile = cProfile.Profile()
+                profile.enable()
+            else:
+                from pyinstrument import Profiler as Sampler
+
+                profile = Sampler()
+                profile.start()
+        except (ImportError, ValueError, RuntimeError):
+            # Not installed, or another profiler or debugger holds the hook
+            return None
+        return profile
+
+    def _stop_profile(self, profile, stage):
+        if self.profiler == "cprofile":
+            profile.disable()
+        else:
+            profile.stop()
+        if self.slowest is None or stage.wall_s > self.slowest[0]:
+            self.slowest = (stage.wall_s, stage.name, profile)
+
+    @contextmanager
+    def span(self, name):
+        stage = Span(name, self._depth)
+        self.spans.append(stage)
+        profile = self._start_profile() if self.profiler and self._depth == 0 else None
+        self._depth += 1
+        start_peak = peak_rss_bytes()
+        start_cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.wall_s = time.perf_counter() - start
+            stage.cpu_s = time.thread_time() - start_cpu
+            peak = peak_rss_bytes()
+            if peak is not None:
+                stage.peak_rss_mb = peak / MB
+                stage.rss_growth_mb = (peak - start_peak) / MB
+            self._depth -= 1
+            if profile is not None:
+                self._stop_profile(profile, stage)
+            if self.log is not None:
+                self.log(stage.line())
+
+    def records(self):
+        """Every span as a dict, in the order the stages started."""
+        return [stage.record() for stage in self.spans]
+
+    def lines(self):
+        return [stage.line() for stage in self.spans]
+
+    @property
+    def profiled_stage(self):
+        return self.slowest[1] if self.slowest else None
+
+    def write_profile(self, path):
+        """Write the profile of the slowest stage; returns the path or None.
+
+        cProfile profiles are ``pstats`` files (open them with snakeviz or
+        ``python -m pstats``), pyinstrument ones HTML pages.
+        """
+        if self.slowest is None:
+            return None
+        profile = self.slowest[2]
+        if self.profiler == "cprofile":
+            profile.dump_stats(path)
+        else:
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(profile.output_html())
+        return path
+
+
+@contextmanager
+def span(name):
+    """Time a stage in the active profiler of the context, if there is one."""
+    profiler = _active.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.span(name) as stage:
+        yield stage
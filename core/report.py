@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+PDF report of a street network build: location, node and edge counts,
+elapsed time, a bar chart comparing the two counts and, when the build was
+timed, the wall time, CPU time and peak memory of every stage.
+"""
+
+import io
+from datetime import datetime
+
+REPORT_NAME = "route_report.pdf"
+
+
+def comparison_chart(num_nodes, num_streets):
+    """PNG bar chart of the node and street counts, in a memory buffer."""
+    # Reports are built inside background tasks and worker threads, so use a
+    # standalone Agg figure: pyplot's global state is not thread safe.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # Dados para o gráfico
+    categories = ['Nodes', 'Streets']
+    quantities = [num_nodes, num_streets]
+
+    # Criar o gráfico de barras
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.bar(categories, quantities, color=['blue', 'green'])
+    axes.set_xlabel('Categories')
+    axes.set_ylabel('Quantity')
+    axes.set_title('Comparison of Nodes and Streets')
+
+    # Salvar o gráfico em um buffer de memória
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    buffer.seek(0)
+
+    return buffer
+
+
+def stage_table(stages):
+    """Table of the ``Profiler.records()`` of a build, nested stages indented."""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+
+    rows = [["Stage", "Wall (s)", "CPU (s)", "Peak RSS (MB)", "RSS growth (MB)"]]
+    for stage in stages:
+        peak = stage["peak_rss_mb"]
+        rows.append([
+            "    " * stage["depth"] + stage["stage"],
+            f"{stage['wall_s']:.2f}",
+            f"{stage['cpu_s']:.2f}",
+            f"{peak:.0f}" if peak is not None else "-",
+            f"{stage['rss_growth_mb']:.0f}" if peak is not None else "-",
+        ])
+    table = Table(rows, hAlign="LEFT")
+    table.setStyle(TableStyle([
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("LINEBELOW", (0, 0), (-1, 0), 0.5, colors.black),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+    ]))
+    return table
+
+
+def write_report(output_path, location, elapsed_time, num_nodes, num_streets,
+                 stages=None):
+    """Write the PDF report to ``output_path`` and return the path.
+
+    :param stages: Optional ``Profiler.records()`` of the build, listed
+        under the chart.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer
+
+    doc = SimpleDocTemplate(output_path, pagesize=letter)
+    styles = getSampleStyleSheet()
+    centered_style = ParagraphStyle(name="Centered", alignment=1)
+
+    story = []
+
+    # Adicionar cabeçalho ao relatório
+    current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Adicionar informações ao relatório
+    report_title = Paragraph("<b>Route Report</b>", styles["Title"])
+    story.append(report_title)
+
+    # Adicionar a data como subtítulo centralizado
+    report_date = Paragraph(f"<i>{current_datetime}</i>", centered_style)
+    story.append(report_date)
+
+    story.append(Spacer(1, 12))
+    location_info = f"Location: {location}"
+    time_info = f"Elapsed Time: {elapsed_time:.2f} seconds"
+    num_nodes_info = f"Number of Nodes: {num_nodes}"
+    num_street_info = f"Number of Edges: {num_streets}"
+    info_paragraph = Paragraph(
+        f"{location_info}<br/>{num_nodes_info}<br/>{num_street_info}<br/>{time_info}",
+        styles["Normal"],
+    )
+    story.append(info_paragraph)
+
+    # Adicionar o gráfico de comparação
+    comparison_image = Image(comparison_chart(num_nodes, num_streets))
+    comparison_image._restrictSize(7 * inch, 6 * inch)
+    story.append(comparison_image)
+
+    if stages:
+        story.append(Spacer(1, 12))
+        story.append(Paragraph("<b>Stages</b>", styles["Heading2"]))
+        story.append(stage_table(stages))
+
+    doc.build(story)
+    return output_path
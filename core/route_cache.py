@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory LRU cache of computed routes.
+
+Routes are keyed by ``(graph, graph version, origin node, destination node,
+weight)``: the endpoints are the street nodes the query snapped to, so
+re-running nearly the same O/D pair hits as well. Graph versions come from
+``next_graph_version``; every loaded or patched graph takes a new one, so
+entries of a graph that changed are never returned again and simply age
+out of the LRU.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+
+_versions = itertools.count(1)
+
+
+def next_graph_version():
+    """A version number no graph of this session has had yet."""
+    return next(_versions)
+
+
+class RouteCache:
+    """Thread-safe LRU of route results with hit and miss counters."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(graph, version, origin, destination, weight):
+        return (graph, version, origin, destination, weight)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Stored value for ``key``, or None (counted as a miss)."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for the diagnostics panel."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Point-to-point routing on a registry region with a selectable backend.
+"""
+
+import time
+
+import networkx as nx
+import numpy as np
+
+from .costs import ensure_travel_times, graph_max_speed_mps, csr_heuristic, networkx_heuristic
+from .csr import CSRGraph
+from .geometry import EdgeGeometries
+from .search import astar, bidirectional
+
+# (label, backend) pairs offered by the route dialog
+ROUTING_ENGINES = [
+    ("NetworkX", "networkx"),
+    ("CSR (NumPy)", "csr"),
+    ("Bidirectional Dijkstra (CSR)", "bidirectional"),
+    ("Bidirectional A* (CSR)", "bidirectional_astar"),
+    ("Contraction hierarchy", "ch"),
+]
+
+
+class RouteResult:
+    """A computed route and the statistics of the search behind it.
+
+    ``edges`` are the CSR edges taken, None for backends not searching the
+    CSR arrays.
+    """
+
+    def __init__(self, nodes, cost, weight, backend, settled, elapsed_ms, edges=None):
+        self.nodes = nodes
+        self.edges = edges
+        self.cost = cost
+        self.weight = weight
+        self.backend = backend
+        self.settled = settled
+        self.elapsed_ms = elapsed_ms
+
+    def summary(self):
+        unit = "m" if self.weight == "length" else "s"
+        return (
+            f"Cost: {self.cost:.1f} {unit} ({self.weight}), "
+            f"{len(self.nodes)} nodes, {self.settled} nodes settled "
+            f"in {self.elapsed_ms:.1f} ms ({self.backend})"
+        )
+
+
+def _build_csr(G):
+    return CSRGraph.from_networkx(ensure_travel_times(G))
+
+
+def csr_graph(region):
+    """CSR arrays of a region, built once and kept in the registry."""
+    return region.derived("csr", _build_csr)
+
+
+def edge_geometries(region):
+    """Packed edge geometries of a region, in the edge order of its CSR arrays."""
+    return region.derived(
+        "edge_geometry", lambda G: EdgeGeometries.from_graph(G, csr_graph(region))
+    )
+
+
+def route_edges(region, route):
+    """CSR edges of ``route``, recovered from its nodes when the backend
+    did not search the CSR arrays."""
+    if route.edges is None:
+        route.edges = csr_graph(region).path_edges(route.nodes, route.weight)
+    return route.edges
+
+
+def route_totals(region, route):
+    """``(length m, travel time s)`` of ``route``, whichever weight it minimised."""
+    csr = csr_graph(region)
+    edges = route_edges(region, route)
+    return (
+        float(csr.weights("length")[edges].sum()),
+        float(csr.weights("travel_time")[edges].sum()),
+    )
+
+
+def route_coordinates(region, route):
+    """``(n, 2)`` (lon, lat) vertices of ``route`` along the real edge shapes."""
+    csr = csr_graph(region)
+    edges = route_edges(region, route)
+    if not len(edges):
+        node = csr.position(route.nodes[0])
+        return np.array([[csr.lons[node], csr.lats[node]]])
+    return edge_geometries(region).route_coordinates(edges)
+
+
+def contraction_hierarchy(region, weight):
+    """Contraction hierarchy of a region for ``weight``.
+
+    It is built on the first query (which takes a while on a city graph)
+    and kept in the registry and the graph cache for the queries after it.
+    A cached hierarchy whose edge count no longer matches the graph is
+    contracted again.
+    """
+    from .contraction import ContractionHierarchy
+
+    return region.persisted(
+        f"ch_{weight}",
+        lambda G: ContractionHierarchy.from_csr(csr_graph(region), weight),
+        valid=lambda ch: ch.n_edges == csr_graph(region).n_edges,
+    )
+
+
+def _networkx_route(region, origin, destination, weight):
+    G = region.graph
+    max_speed = None
+    if weight == "travel_time":
+        ensure_travel_times(G)
+        max_speed = region.derived("max_speed_mps", graph_max_speed_mps)
+    expanded = set()
+
+    def edge_cost(u, v, parallel_edges):
+        # NetworkX calls this for every neighbour of the node it just
+        # settled, so the distinct ``u`` seen are the settled nodes.
+        expanded.add(u)
+        return min(data.get(weight, float("inf")) for data in parallel_edges.values())
+
+    nodes = nx.astar_path(
+        G,
+        origin,
+        destination,
+        heuristic=networkx_heuristic(G, weight, max_speed),
+        weight=edge_cost,
+    )
+    cost = nx.path_weight(G, nodes, weight)
+    # The destination is settled too but never expanded
+    return nodes, None, cost, len(expanded) + 1
+
+
+def _csr_route(region, origin, destination, weight):
+    csr = csr_graph(region)
+    target = csr.position(destination)
+    result = astar(
+        csr,
+        csr.position(origin),
+        target,
+        weight=weight,
+        heuristic=csr_heuristic(csr, target, weight),
+    )
+    if not result:
+        raise nx.NetworkXNoPath(f"No path between {origin} and {destination}.")
+    return csr.node_ids[result.nodes].tolist(), result.edges, result.cost, result.settled
+
+
+def _bidirectional_route(region, origin, destination, weight, use_heuristic):
+    csr = csr_graph(region)
+    source = csr.position(origin)
+    target = csr.position(destination)
+    heuristics = ()
+    if use_heuristic:
+        heuristics = (csr_heuristic(csr, target, weight), csr_heuristic(csr, source, weight))
+    result = bidirectional(csr, source, target, weight, *heuristics)
+    if not result:
+        raise nx.NetworkXNoPath(f"No path between {origin} and {destination}.")
+    return csr.node_ids[result.nodes].tolist(), result.edges, result.cost, result.settled
+
+
+def _ch_route(region, origin, destination, weight):
+    csr = csr_graph(region)
+    result = contraction_hierarchy(region, weight).query(
+        csr.position(origin), csr.position(destination)
+    )
+    if not result:
+        raise nx.NetworkXNoPath(f"No path between {origin} and {destination}.")
+    return csr.node_ids[result.nodes].tolist(), result.edges, result.cost, result.settled
+
+
+def shortest_path(region, origin, destination, backend="networkx", weight="length"):
+    """Route from ``origin`` to ``destination`` minimising ``weight``.
+
+    :returns: ``RouteResult`` with the OSM node ids of the route.
+    :raises networkx.NetworkXNoPath: When the destination is unreachable,
+        whichever backend is used.
+    """
+    start = time.perf_counter()
+    if backend == "networkx":
+        nodes, edges, cost, settled = _networkx_route(region, origin, destination, weight)
+    elif backend == "csr":
+        nodes, edges, cost, settled = _csr_route(region, origin, destination, weight)
+    elif backend in ("bidirectional", "bidirectional_astar"):
+        nodes, edges, cost, settled = _bidirectional_route(
+            region, origin, destination, weight, backend == "bidirectional_astar"
+        )
+    elif backend == "ch":
+        nodes, edges, cost, settled = _ch_route(region, origin, destination, weight)
+    else:
+        raise ValueError(f"Unknown routing backend: {backend}")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return RouteResult(nodes, cost, weight, backend, settled, elapsed_ms, edges)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Heap-based shortest-path searches over a ``CSRGraph``.
+
+Nodes are addressed by their contiguous CSR position; results carry both the
+node positions and the CSR edges used, so callers can recover the exact
+parallel edge (and its geometry) that was taken.
+
+``bidirectional`` searches forwards from the source and backwards from the
+target, over the incoming edges of ``CSRGraph.reverse``, so one-way streets
+are followed in their direction from both ends.
+"""
+
+from heapq import heappop, heappush
+
+INF = float("inf")
+
+
+class SearchResult:
+    """Outcome of a point-to-point search."""
+
+    def __init__(self, nodes, edges, cost, settled):
+        self.nodes = nodes
+        self.edges = edges
+        self.cost = cost
+        self.settled = settled
+
+    def __bool__(self):
+        return bool(self.nodes)
+
+
+def _unwind(pred, source, target):
+    nodes = [target]
+    edges = []
+    node = target
+    while node != source:
+        node, edge = pred[node]
+        nodes.append(node)
+        edges.append(edge)
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges
+
+
+def astar(csr, source, target, weight="length", heuristic=None):
+    """A* from ``source`` to ``target`` (Dijkstra when ``heuristic`` is None).
+
+    :param heuristic: Callable ``position -> lower bound of the remaining
+        cost``. It must be consistent for the result to be optimal.
+    :returns: ``SearchResult``; empty when ``target`` is unreachable.
+    """
+    offsets = csr.offsets
+    targets = csr.targets
+    costs = csr.weights(weight)
+
+    dist = {source: 0.0}
+    pred = {}
+    closed = set()
+    heap = [(heuristic(source) if heuristic else 0.0, 0.0, source)]
+
+    while heap:
+        _, g, u = heappop(heap)
+        if u in closed:
+            continue
+        closed.add(u)
+        if u == target:
+            nodes, edges = _unwind(pred, source, target)
+            return SearchResult(nodes, edges, g, len(closed))
+
+        lo = offsets[u]
+        hi = offsets[u + 1]
+        for edge, v, cost in zip(
+            range(lo, hi), targets[lo:hi].tolist(), costs[lo:hi].tolist()
+        ):
+            if v in closed:
+                continue
+            candidate = g + cost
+            if candidate < dist.get(v, INF):
+                dist[v] = candidate
+                pred[v] = (u, edge)
+                priority = candidate + heuristic(v) if heuristic else candidate
+                heappush(heap, (priority, candidate, v))
+
+    return SearchResult([], [], INF, len(closed))
+
+
+def dijkstra(csr, source, target, weight="length"):
+    return astar(csr, source, target, weight=weight)
+
+
+def bidirectional(csr, source, target, weight="length", forward=None, backward=None):
+    """Bidirectional A* (Dijkstra without heuristics).
+
+    Both searches use the average potential ``(forward(v) - backward(v)) / 2``,
+    which keeps them consistent with each other, so the search can stop as
+    soon as the two smallest open keys add up to the best meeting cost.
+
+    :param forward: Consistent heuristic ``position -> lower bound of the
+        cost to target``, e.g. ``csr_heuristic(csr, target, weight)``.
+    :param backward: Same towards ``source``; both or neither must be given.
+    :returns: ``SearchResult``; ``settled`` counts both searches.
+    """
+    if source == target:
+        return SearchResult([source], [], 0.0, 1)
+    if forward is None:
+        potential = None
+    else:
+        def potential(position):
+            return (forward(position) - backward(position)) / 2
+
+    costs = csr.weights(weight)
+    reverse_offsets, reverse_sources, reverse_edges = csr.reverse
+    # (offsets, heads, edge ids or None) of each side, edge ids mapping the
+    # reverse adjacency back to CSR edges
+    sides = [
+        (csr.offsets, csr.targets, None, 1.0),
+        (reverse_offsets, reverse_sources, reverse_edges, -1.0),
+    ]
+    dists = [{source: 0.0}, {target: 0.0}]
+    preds = [{}, {}]
+    closed = [set(), set()]
+    heaps = [
+        [(potential(source) if potential else 0.0, 0.0, source)],
+        [(-potential(target) if potential else 0.0, 0.0, target)],
+    ]
+    best = INF
+    meeting = None
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        # Expand the side with the smaller frontier
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        offsets, heads, edge_ids, sign = sides[side]
+        dist = dists[side]
+        other = dists[1 - side]
+        _, g, u = heappop(heaps[side])
+        if u in closed[side]:
+            continue
+        closed[side].add(u)
+
+        lo = offsets[u]
+        hi = offsets[u + 1]
+        if edge_ids is None:
+            edges = range(lo, hi)
+            edge_costs = costs[lo:hi]
+        else:
+            edges = edge_ids[lo:hi]
+            edge_costs = costs[edges]
+            edges = edges.tolist()
+        for edge, v, cost in zip(edges, heads[lo:hi].tolist(), edge_costs.tolist()):
+            if v in closed[side]:
+                continue
+            candidate = g + cost
+            if candidate < dist.get(v, INF):
+                dist[v] = candidate
+                preds[side][v] = (u, edge)
+                priority = candidate + sign * potential(v) if potential else candidate
+                heappush(heaps[side], (priority, candidate, v))
+                if v in other and candidate + other[v] < best:
+                    best = candidate + other[v]
+                    meeting = v
+
+    settled = len(closed[0]) + len(closed[1])
+    if meeting is None:
+        return SearchResult([], [], INF, settled)
+    nodes, edges = _unwind(preds[0], source, meeting)
+    node = meeting
+    while node != target:
+        node, edge = preds[1][node]
+        nodes.append(node)
+        edges.append(edge)
+    return SearchResult(nodes, edges, best, settled)
+
+
+class SearchTree:
+    """Shortest-path tree grown from one source by ``one_to_many``."""
+
+    def __init__(self, source, dist, pred, settled):
+        self.source = source
+        self.dist = dist
+        self.pred = pred
+        self.settled = settled
+
+    def cost(self, target):
+        """Final cost to ``target``, ``inf`` when it was not reached."""
+        return self.dist.get(target, INF) if target in self.settled else INF
+
+    def path(self, target):
+        """``(nodes, edges)`` from the source to ``target``, or None."""
+        if target not in self.settled:
+            return None
+        return _unwind(self.pred, self.source, target)
+
+
+def one_to_many(csr, source, targets=None, weight="length", limit=INF):
+    """Dijkstra from ``source`` until every node of ``targets`` is settled.
+
+    The search also stops once the cheapest open node costs more than
+    ``limit``. With ``targets=None`` only ``limit`` bounds the search.
+    """
+    offsets = csr.offsets
+    nodes = csr.targets
+    costs = csr.weights(weight)
+
+    remaining = set(targets) if targets is not None else None
+    dist = {source: 0.0}
+    pred = {}
+    closed = set()
+    heap = [(0.0, source)]
+
+    while heap:
+        g, u = heappop(heap)
+        if u in closed:
+            continue
+        if g > limit:
+            break
+        closed.add(u)
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+
+        lo = offsets[u]
+        hi = offsets[u + 1]
+        for edge, v, cost in zip(
+            range(lo, hi), nodes[lo:hi].tolist(), costs[lo:hi].tolist()
+        ):
+            if v in closed:
+                continue
+            candidate = g + cost
+            if candidate < dist.get(v, INF):
+                dist[v] = candidate
+                pred[v] = (u, edge)
+                heappush(heap, (candidate, v))
+
+    return SearchTree(source, dist, pred, closed)
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Nearest-node index over the coordinates of a street graph.
+
+Nodes are placed on the unit sphere (earth-centred cartesian coordinates) and
+stored in a KD-tree, so straight-line chord distance orders nodes exactly as
+great-circle distance does. Queries are O(log N) and distances are reported
+in metres.
+
+Graph updates patch an index instead of rebuilding it: removed nodes are
+masked out of the existing tree and added nodes go to a small second tree,
+until the changes reach ``COMPACT_SHARE`` of the index and one new tree is
+built.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6371008.8
+
+# Returned in place of a node id when nothing lies within ``max_distance``
+NO_NODE = -1
+
+# Share of the indexed nodes that may be removed or added by patches before
+# the tree is rebuilt
+COMPACT_SHARE = 0.1
+
+
+def to_unit_sphere(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_metres(chord):
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def metres_to_chord(metres):
+    return 2.0 * np.sin(np.minimum(metres / EARTH_RADIUS_M, np.pi) / 2.0)
+
+
+class NodeIndex:
+    """KD-tree over node coordinates of a graph.
+
+    :param node_ids: Graph node ids, in the same order as the coordinates.
+    :param lats: Node latitudes (``y`` attribute of osmnx graphs).
+    :param lons: Node longitudes (``x`` attribute of osmnx graphs).
+    """
+
+    def __init__(self, node_ids, lats, lons, tree=None):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.tree = cKDTree(to_unit_sphere(self.lats, self.lons)) if tree is None else tree
+        # Set by ``patched``: mask of the tree nodes since removed, and the
+        # index of the nodes added since the tree was built
+        self.removed = None
+        self.extra = None
+        self._by_id = None
+
+    @classmethod
+    def from_graph(cls, G):
+        count = G.number_of_nodes()
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=count)
+        lats = np.fromiter((d["y"] for _, d in G.nodes(data=True)), np.float64, count)
+        lons = np.fromiter((d["x"] for _, d in G.nodes(data=True)), np.float64, count)
+        return cls(node_ids, lats, lons)
+
+    def __len__(self):
+        removed = 0 if self.removed is None else int(self.removed.sum())
+        extra = 0 if self.extra is None else len(self.extra)
+        return len(self.node_ids) - removed + extra
+
+    @property
+    def nbytes(self):
+        # The tree holds a copy of the 3D points plus its permutation indices
+        size = self.node_ids.nbytes + self.lats.nbytes + self.lons.nbytes
+        size += len(self.node_ids) * 32
+        if self.removed is not None:
+            size += self.removed.nbytes
+        if self.extra is not None:
+            size += self.extra.nbytes
+        return size
+
+    def _live(self):
+        """(ids, lats, lons) of the tree nodes not removed by patches."""
+        if self.removed is None:
+            return self.node_ids, self.lats, self.lons
+        keep = ~self.removed
+        return self.node_ids[keep], self.lats[keep], self.lons[keep]
+
+    def patched(self, G, change):
+        """Index of ``G`` after the node changes of a ``ChangeSummary``.
+
+        The tree and arrays are shared with this index, which stays valid
+        for the graph it was built from.
+        """
+        removed_ids = np.fromiter(change.removed_nodes, np.int64)
+        added = sorted(change.added_nodes)
+
+        if self._by_id is None:
+            self._by_id = np.argsort(self.node_ids, kind="stable")
+        sorted_ids = self.node_ids[self._by_id]
+        found = np.minimum(np.searchsorted(sorted_ids, removed_ids), len(sorted_ids) - 1)
+        hit = sorted_ids[found] == removed_ids
+        removed = np.zeros(len(self.node_ids), bool) if self.removed is None else self.removed.copy()
+        removed[self._by_id[found[hit]]] = True
+
+        if self.extra is None:
+            extra_ids, extra_lats, extra_lons = (np.empty(0, np.int64), np.empty(0), np.empty(0))
+        else:
+            extra_ids, extra_lats, extra_lons = self.extra._live()
+            keep = ~np.isin(extra_ids, removed_ids)
+            extra_ids, extra_lats, extra_lons = extra_ids[keep], extra_lats[keep], extra_lons[keep]
+        nodes = G.nodes
+        extra_ids = np.concatenate([extra_ids, np.asarray(added, dtype=np.int64)])
+        extra_lats = np.concatenate([extra_lats, [nodes[node]["y"] for node in added]])
+        extra_lons = np.concatenate([extra_lons, [nodes[node]["x"] for node in added]])
+
+        if removed.sum() + len(extra_ids) > COMPACT_SHARE * len(self.node_ids):
+            keep = ~removed
+            return NodeIndex(
+                np.concatenate([self.node_ids[keep], extra_ids]),
+                np.concatenate([self.lats[keep], extra_lats]),
+                np.concatenate([self.lons[keep], extra_lons]),
+            )
+        index = NodeIndex(self.node_ids, self.lats, self.lons, tree=self.tree)
+        index._by_id = self._by_id
+        index.removed = removed if removed.any() else None
+        if len(extra_ids):
+            index.extra = NodeIndex(extra_ids, extra_lats, extra_lons)
+        return index
+
+    def _tree_query(self, points, k, bound):
+        """``(positions, chords)`` of shape ``(n, k)``, skipping removed nodes.
+
+        Missing neighbours come back as position -1 and chord ``inf``.
+        """
+        size = len(self.node_ids)
+        positions = np.full((len(points), k), -1, dtype=np.int64)
+        chords = np.full((len(points), k), np.inf)
+        if size == 0 or k == 0:
+            return positions, chords
+        removed = self.removed
+        asked = min(size, k if removed is None else 2 * k)
+        pending = np.arange(len(points))
+        while len(pending):
+            found_chords, found = self.tree.query(
+                points[pending], k=asked, distance_upper_bound=bound
+            )
+            found_chords = found_chords.reshape(len(pending), asked)
+            found = found.reshape(len(pending), asked)
+            valid = np.isfinite(found_chords)
+            if removed is not None:
+                valid[valid] = ~removed[found[valid]]
+            # Rows with too few live neighbours ask again for more, unless
+            # the tree or the distance bound has nothing more to give
+            done = (
+                (valid.sum(axis=1) >= k)
+                | ~np.isfinite(found_chords[:, -1])
+                | (asked == size)
+            )
+            order = np.argsort(~valid[done], axis=1, kind="stable")[:, :k]
+            picked = np.take_along_axis(valid[done], order, axis=1)
+            rows = pending[done]
+            width = order.shape[1]
+            positions[rows, :width] = np.where(
+                picked, np.take_along_axis(found[done], order, axis=1), -1
+            )
+            chords[rows, :width] = np.where(
+                picked, np.take_along_axis(found_chords[done], order, axis=1), np.inf
+            )
+            pending = pending[~done]
+            asked = min(size, 4 * asked)
+        return positions, chords
+
+    def query(self, lats, lons, k=1, max_distance=None):
+        """Vectorised k-nearest query.
+
+        :returns: ``(node_ids, distances_m)`` with shape ``(n,)`` when
+            ``k == 1`` and ``(n, k)`` otherwise. Neighbours farther than
+            ``max_distance`` metres come back as ``NO_NODE`` / ``inf``.
+        """
+        points = to_unit_sphere(np.atleast_1d(lats), np.atleast_1d(lons))
+        single = k == 1
+        k = min(k, len(self))
+        bound = np.inf if max_distance is None else metres_to_chord(max_distance)
+        if self.removed is None and self.extra is None:
+            chords, positions = self.tree.query(points, k=k, distance_upper_bound=bound)
+            found = np.isfinite(chords)
+            node_ids = np.full(positions.shape, NO_NODE, dtype=np.int64)
+            node_ids[found] = self.node_ids[positions[found]]
+            distances = np.full(chords.shape, np.inf)
+            distances[found] = chord_to_metres(chords[found])
+            return node_ids, distances
+
+        positions, chords = self._tree_query(points, k, bound)
+        node_ids = np.where(positions >= 0, self.node_ids[positions], NO_NODE)
+        if self.extra is not None:
+            extra_positions, extra_chords = self.extra._tree_query(
+                points, min(k, len(self.extra)), bound
+            )
+            node_ids = np.hstack([
+                node_ids,
+                np.where(extra_positions >= 0, self.extra.node_ids[extra_positions], NO_NODE),
+            ])
+            chords = np.hstack([chords, extra_chords])
+            order = np.argsort(chords, axis=1, kind="stable")[:, :k]
+            node_ids = np.take_along_axis(node_ids, order, axis=1)
+            chords = np.take_along_axis(chords, order, axis=1)
+        distances = chord_to_metres(chords)
+        distances[~np.isfinite(chords)] = np.inf
+        if single:
+            return node_ids[:, 0], distances[:, 0]
+        return node_ids, distances
+
+    def nearest(self, lat, lon, max_distance=None):
+        """``(node_id, distance_m)`` of the closest node, ``(None, inf)`` if none."""
+        node_ids, distances = self.query(lat, lon, max_distance=max_distance)
+        if node_ids[0] == NO_NODE:
+            return None, float("inf")
+        return int(node_ids[0]), float(distances[0])
+
+    def within(self, lat, lon, radius):
+        """Nodes within ``radius`` metres as ``[(node_id, distance_m)]``, closest first."""
+        point = to_unit_sphere([lat], [lon])[0]
+        positions = np.asarray(
+            self.tree.query_ball_point(point, metres_to_chord(radius)), dtype=np.int64
+        )
+        if self.removed is not None:
+            positions = positions[~self.removed[positions]]
+        chords = np.linalg.norm(self.tree.data[positions] - point, axis=1)
+        order = np.argsort(chords)
+        distances = chord_to_metres(chords[order])
+        found = [
+            (int(node), float(dist))
+            for node, dist in zip(self.node_ids[positions[order]], distances)
+        ]
+        if self.extra is not None:
+            found = sorted(found + self.extra.within(lat, lon, radius), key=lambda f: f[1])
+        return found
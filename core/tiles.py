@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+Tiled street networks for regions too large to load as one graph.
+
+The network is cut into square tiles of ``tile_deg`` degrees. Each tile is a
+small array file in CSR form holding its nodes (sorted by OSM id) and their
+outgoing edges. An edge records the tile and position of its target, and the
+target's coordinates, so edges crossing a tile border need no special
+handling: the border node is simply the target of edges stored in the
+neighbouring tile.
+
+``TileStore`` loads tiles on demand and keeps the most recently used ones
+under a byte budget, and ``route`` runs A* across them, loading a tile only
+when the search settles one of its nodes. A route therefore touches the
+tiles along its corridor, never the whole region.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from heapq import heappop, heappush
+
+import numpy as np
+
+from .costs import haversine_m, max_speed_mps, weight_scale
+from .graph_cache import cache_key
+from .route_cache import next_graph_version
+from .spatial_index import EARTH_RADIUS_M, NodeIndex
+
+MANIFEST_NAME = "tiles.json"
+
+# About 5.5 km of latitude per tile
+TILE_DEG = 0.05
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+WEIGHTS = ("length", "travel_time")
+
+# Nodes are addressed across tiles as ``tile << NODE_BITS | position``
+NODE_BITS = 32
+NODE_MASK = (1 << NODE_BITS) - 1
+
+INF = float("inf")
+
+
+def tile_cells(lats, lons, tile_deg=TILE_DEG):
+    """(row, column) of the tile holding each coordinate."""
+    return (
+        np.floor(np.asarray(lats) / tile_deg).astype(np.int64),
+        np.floor(np.asarray(lons) / tile_deg).astype(np.int64),
+    )
+
+
+def _tile_file(row, col):
+    return f"tile_{row}_{col}.npz"
+
+
+def write_tiles(tile_dir, node_ids, lats, lons, sources, targets, weights,
+                tile_deg=TILE_DEG, source=None):
+    """Partition a network given as arrays and write its tiles.
+
+    :param sources: Edge sources, as positions in ``node_ids``.
+    :param targets: Edge targets, as positions in ``node_ids``.
+    :param weights: ``{"length": ..., "travel_time": ...}`` arrays per edge.
+    :returns: The manifest written next to the tiles.
+    """
+    os.makedirs(tile_dir, exist_ok=True)
+    remove_tiles(tile_dir)
+
+    rows, cols = tile_cells(lats, lons, tile_deg)
+    cells, tile_of = np.unique(np.column_stack([rows, cols]), axis=0, return_inverse=True)
+    tile_of = tile_of.ravel()
+    # Nodes ordered by tile, then by id: a node's position in its tile is
+    # its rank in that order
+    order = np.lexsort((node_ids, tile_of))
+    counts = np.bincount(tile_of, minlength=len(cells))
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    local = np.empty(len(node_ids), dtype=np.int64)
+    local[order] = np.arange(len(node_ids)) - np.repeat(starts[:-1], counts)
+
+    by_source = np.lexsort((local[sources], tile_of[sources]))
+    edge_starts = np.concatenate(
+        [[0], np.cumsum(np.bincount(tile_of[sources], minlength=len(cells)))]
+    )
+
+    tiles = []
+    for index, (row, col) in enumerate(cells.tolist()):
+        nodes = order[starts[index]:starts[index + 1]]
+        edges = by_source[edge_starts[index]:edge_starts[index + 1]]
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(local[sources[edges]], minlength=len(nodes)), out=offsets[1:])
+        path = os.path.join(tile_dir, _tile_file(row, col))
+        np.savez(
+            path,
+            node_ids=node_ids[nodes],
+            lats=lats[nodes],
+            lons=lons[nodes],
+            offsets=offsets,
+            target_tiles=tile_of[targets[edges]].astype(np.int32),
+            target_nodes=local[targets[edges]].astype(np.int32),
+            target_lats=lats[targets[edges]],
+            target_lons=lons[targets[edges]],
+            **{name: weights[name][edges] for name in WEIGHTS},
+        )
+        tiles.append({
+            "row": row,
+            "col": col,
+            "file": _tile_file(row, col),
+            "nodes": len(nodes),
+            "edges": len(edges),
+            "size": os.path.getsize(path),
+        })
+
+    manifest = {
+        "tile_deg": tile_deg,
+        "created": time.time(),
+        "source": source,
+        "nodes": len(node_ids),
+        "edges": len(sources),
+        "bbox": [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())],
+        "max_speed_mps": max_speed_mps(weights["length"], weights["travel_time"]),
+        "tiles": tiles,
+    }
+    tmp_path = os.path.join(tile_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=1)
+    os.replace(tmp_path, os.path.join(tile_dir, MANIFEST_NAME))
+    return manifest
+
+
+def remove_tiles(tile_dir):
+    """Delete the tile set in ``tile_dir``, if any."""
+    manifest_path = os.path.join(tile_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as handle:
+            tiles = json.load(handle)["tiles"]
+    except (OSError, ValueError, KeyError):
+        return
+    os.remove(manifest_path)
+    for tile in tiles:
+        try:
+            os.remove(os.path.join(tile_dir, tile["file"]))
+        except OSError:
+            pass
+
+
+def tiles_from_graph(G, tile_dir, tile_deg=TILE_DEG):
+    """Tile an osmnx graph, e.g. one already in the graph cache."""
+    from .costs import ensure_travel_times
+    from .csr import CSRGraph
+
+    csr = CSRGraph.from_networkx(ensure_travel_times(G))
+    sources = np.repeat(np.arange(len(csr)), np.diff(csr.offsets))
+    return write_tiles(
+        tile_dir,
+        csr.node_ids,
+        csr.lats,
+        csr.lons,
+        sources,
+        csr.targets.astype(np.int64),
+        {name: csr.weights(name) for name in WEIGHTS},
+        tile_deg,
+        source=G.graph.get("source"),
+    )
+
+
+def tiles_from_extract(path, tile_dir, clip=None, tile_deg=TILE_DEG, progress=None):
+    """Tile the drive network of a local extract without building a graph.
+
+    Only arrays are held in memory: ways are not simplified, so every OSM
+    node of the network is a routing node and routes follow the streets'
+    full geometry. Speeds are imputed per highway type as osmnx does.
+
+    :param progress: Optional callable receiving the fraction done.
+    """
+    import osmnx as ox
+
+    from .costs import way_speeds_kph
+    from .osm_ingest import drive_segments, scan_nodes, scan_ways
+
+    def report(fraction):
+        if progress is not None:
+            progress(fraction)
+
+    ways = scan_ways(path, progress=lambda _: report(0.0))
+    report(0.3)
+    nodes = scan_nodes(path, ways.node_ids(), clip, progress=lambda _: report(0.3))
+    report(0.6)
+    node_ids, lats, lons, pu, pv, way_of, used = drive_segments(ways, nodes)
+    # Only the nodes of the kept component become routing nodes
+    pu, pv = np.searchsorted(used, pu), np.searchsorted(used, pv)
+    node_ids, lats, lons = node_ids[used], lats[used], lons[used]
+
+    lengths = ox.distance.great_circle(lats[pu], lons[pu], lats[pv], lons[pv])
+    speeds = way_speeds_kph(
+        [tags.get("highway") for tags in ways.tags],
+        [tags.get("maxspeed") for tags in ways.tags],
+    )[way_of]
+    directions = np.asarray(ways.directions, dtype=np.int8)[way_of]
+    both = directions == 0
+    against = directions == -1
+    sources = np.concatenate([np.where(against, pv, pu), pv[both]])
+    targets = np.concatenate([np.where(against, pu, pv), pu[both]])
+    lengths = np.concatenate([lengths, lengths[both]])
+    speeds = np.concatenate([speeds, speeds[both]])
+    report(0.8)
+
+    manifest = write_tiles(
+        tile_dir,
+        node_ids,
+        lats,
+        lons,
+        sources,
+        targets,
+        {"length": lengths, "travel_time": lengths / (speeds / 3.6)},
+        tile_deg,
+        source=os.path.basename(path),
+    )
+    report(1.0)
+    return manifest
+
+
+class Tile:
+    """Arrays of one tile, as written by ``write_tiles``."""
+
+    def __init__(self, index, arrays):
+        self.index = index
+        for name, values in arrays.items():
+            setattr(self, name, values)
+        self._arrays = list(arrays.values())
+        self._node_index = None
+
+    @property
+    def nbytes(self):
+        size = sum(values.nbytes for values in self._arrays)
+        if self._node_index is not None:
+            size += self._node_index.nbytes
+        return size
+
+    def node_index(self):
+        if self._node_index is None:
+            self._node_index = NodeIndex(self.node_ids, self.lats, self.lons)
+        return self._node_index
+
+    def weights(self, name):
+        if name not in WEIGHTS:
+            raise ValueError(f"Unknown edge weight: {name}")
+        return getattr(self, name)
+
+
+class TileStore:
+    """Tiles of one region, loaded lazily and kept under ``max_bytes``.
+
+    The tile just loaded always stays, even when it alone exceeds the
+    budget; ``loads`` and ``evictions`` count tile reads and drops.
+    """
+
+    def __init__(self, tile_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.tile_dir = tile_dir
+        self.max_bytes = max_bytes
+        with open(os.path.join(tile_dir, MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            self.manifest = json.load(handle)
+        self.tile_deg = self.manifest["tile_deg"]
+        self._cells = {
+            (tile["row"], tile["col"]): index
+            for index, tile in enumerate(self.manifest["tiles"])
+        }
+        self._tiles = OrderedDict()
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.evictions = 0
+        # Tile sets are never edited, tiling again opens a new store
+        self.version = next_graph_version()
+
+    @staticmethod
+    def exists(tile_dir):
+        return os.path.exists(os.path.join(tile_dir, MANIFEST_NAME))
+
+    def __len__(self):
+        return len(self.manifest["tiles"])
+
+    @property
+    def max_speed_mps(self):
+        return self.manifest["max_speed_mps"]
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(tile.nbytes for tile in self._tiles.values())
+
+    def loaded(self):
+        """Indexes of the tiles in memory, least recently used first."""
+        with self._lock:
+            return list(self._tiles)
+
+    def tile(self, index):
+        """Tile ``index``, read from disk if it is not in memory."""
+        with self._lock:
+            tile = self._tiles.get(index)
+            if tile is not None:
+                self._tiles.move_to_end(index)
+                return tile
+        path = os.path.join(self.tile_dir, self.manifest["tiles"][index]["file"])
+        with np.load(path) as data:
+            tile = Tile(index, {name: data[name] for name in data.files})
+        with self._lock:
+            self._tiles[index] = tile
+            self.loads += 1
+            self._evict(keep=index)
+        return tile
+
+    def _evict(self, keep):
+        total = sum(tile.nbytes for tile in self._tiles.values())
+        for index in list(self._tiles):
+            if total <= self.max_bytes:
+                break
+            if index == keep:
+                continue
+            total -= self._tiles.pop(index).nbytes
+            self.evictions += 1
+
+    def node(self, node):
+        """``(osm_id, lat, lon)`` of a tiled node address."""
+        tile = self.tile(node >> NODE_BITS)
+        position = node & NODE_MASK
+        return int(tile.node_ids[position]), float(tile.lats[position]), float(tile.lons[position])
+
+    def snap(self, lat, lon, max_distance=None):
+        """``(node, distance_m)`` of the closest node, ``(None, inf)`` if none.
+
+        Every tile within ``max_distance`` of the point is searched, or the
+        point's tile and its neighbours without a distance limit.
+        """
+        if max_distance is None:
+            rows = cols = 1
+        else:
+            degrees = np.degrees(max_distance / EARTH_RADIUS_M)
+            rows = int(np.ceil(degrees / self.tile_deg))
+            cols = int(np.ceil(degrees / max(np.cos(np.radians(lat)), 1e-6) / self.tile_deg))
+        row, col = (int(cell[0]) for cell in tile_cells([lat], [lon], self.tile_deg))
+        best, best_distance = None, INF
+        for r in range(row - rows, row + rows + 1):
+            for c in range(col - cols, col + cols + 1):
+                index = self._cells.get((r, c))
+                if index is None:
+                    continue
+                tile = self.tile(index)
+                node_id, distance = tile.node_index().nearest(lat, lon, max_distance)
+                if node_id is not None and distance < best_distance:
+                    position = int(np.searchsorted(tile.node_ids, node_id))
+                    best, best_distance = index << NODE_BITS | position, distance
+        return best, best_distance
+
+
+class TileRoute:
+    """A route found across tiles."""
+
+    def __init__(self, nodes, coordinates, cost, settled, tiles, length=None, travel_time=None):
+        self.nodes = nodes
+        self.coordinates = coordinates
+        self.cost = cost
+        self.settled = settled
+        self.tiles = tiles
+        self.length = length
+        self.travel_time = travel_time
+
+
+def route(store, source, target, weight="length"):
+    """A* between two tiled node addresses (see ``TileStore.snap``).
+
+    :returns: ``TileRoute`` with OSM node ids, (lon, lat) coordinates and
+        the length and travel time of the route, or None when ``target`` is
+        unreachable.
+    """
+    scale = weight_scale(weight, store.max_speed_mps if weight == "travel_time" else None)
+    _, target_lat, target_lon = store.node(target)
+    _, source_lat, source_lon = store.node(source)
+
+    dist = {source: 0.0}
+    pred = {}
+    closed = set()
+    visited = set()
+    heap = [(haversine_m(source_lat, source_lon, target_lat, target_lon) * scale, 0.0, source)]
+    tile = None
+    while heap:
+        _, g, u = heappop(heap)
+        if u in closed:
+            continue
+        closed.add(u)
+        if u == target:
+            break
+        index = u >> NODE_BITS
+        if tile is None or tile.index != index:
+            tile = store.tile(index)
+            visited.add(index)
+        position = u & NODE_MASK
+        lo = tile.offsets[position]
+        hi = tile.offsets[position + 1]
+        for edge, v_tile, v_position, cost, lat, lon in zip(
+            range(lo, hi),
+            tile.target_tiles[lo:hi].tolist(),
+            tile.target_nodes[lo:hi].tolist(),
+            tile.weights(weight)[lo:hi].tolist(),
+            tile.target_lats[lo:hi].tolist(),
+            tile.target_lons[lo:hi].tolist(),
+        ):
+            v = v_tile << NODE_BITS | v_position
+            if v in closed:
+                continue
+            candidate = g + cost
+            if candidate < dist.get(v, INF):
+                dist[v] = candidate
+                pred[v] = (u, edge)
+                heappush(
+                    heap,
+                    (candidate + haversine_m(lat, lon, target_lat, target_lon) * scale,
+                     candidate, v),
+                )
+    else:
+        return None
+
+    path = [target]
+    length = travel_time = 0.0
+    while path[-1] != source:
+        u, edge = pred[path[-1]]
+        # Edges are stored in the tile of the node they leave
+        tile = store.tile(u >> NODE_BITS)
+        length += float(tile.weights("length")[edge])
+        travel_time += float(tile.weights("travel_time")[edge])
+        path.append(u)
+    path.reverse()
+    nodes = []
+    coordinates = []
+    for node in path:
+        osm_id, lat, lon = store.node(node)
+        nodes.append(osm_id)
+        coordinates.append((lon, lat))
+    return TileRoute(
+        nodes, coordinates, dist[target], len(closed), len(visited), length, travel_time
+    )
+
+
+class TileCatalog:
+    """Tile sets of the places tiled so far, one directory per place."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._stores = {}
+        self._lock = threading.RLock()
+
+    def path(self, place):
+        return os.path.join(self.root, cache_key(place, "drive"))
+
+    def contains(self, place):
+        return TileStore.exists(self.path(place))
+
+    def store(self, place):
+        """Open ``TileStore`` of ``place``, shared by every caller."""
+        key = cache_key(place, "drive")
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                store = self._stores[key] = TileStore(self.path(place), self.max_bytes)
+            return store
+
+    def open_stores(self):
+        """Stores opened so far, for diagnostics."""
+        with self._lock:
+            return list(self._stores.values())
+
+    def discard(self, place):
+        """Forget the open store of ``place``, e.g. before tiling it again."""
+        with self._lock:
+            self._stores.pop(cache_key(place, "drive"), None)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostics panel: what the plugin holds in memory and on disk, and how well
+its caches are doing.
+"""
+
+from qgis.PyQt.QtCore import QTimer
+from qgis.PyQt.QtGui import QFontDatabase
+from qgis.PyQt.QtWidgets import (
+    QDialog,
+    QDialogButtonBox,
+    QPlainTextEdit,
+    QPushButton,
+    QVBoxLayout,
+)
+
+REFRESH_MS = 1000
+MB = 1024 * 1024
+
+
+def diagnostics_lines(route_cache, registry, graph_cache, tiles=None):
+    """Plain text lines describing the caches of the plugin."""
+    stats = route_cache.stats()
+    lines = [
+        "Route cache",
+        f"  routes stored    {stats['entries']} of {stats['max_entries']}",
+        f"  hits / misses    {stats['hits']} / {stats['misses']} "
+        f"({stats['hit_rate']:.0%} hit rate)",
+        f"  evictions        {stats['evictions']}",
+        "",
+        "Loaded graphs",
+        f"  regions          {len(registry)}",
+        f"  memory           {registry.total_bytes() / MB:.1f} of "
+        f"{registry.max_bytes / MB:.0f} MB",
+        "",
+        "Graph cache",
+        f"  graphs on disk   {len(graph_cache.entries())}",
+        f"  disk             {graph_cache.total_bytes() / MB:.1f} of "
+        f"{graph_cache.max_bytes / MB:.0f} MB",
+    ]
+    if tiles is not None:
+        stores = tiles.open_stores()
+        lines += [
+            "",
+            "Tiled networks",
+            f"  open regions     {len(stores)}",
+            f"  tiles in memory  {sum(len(store.loaded()) for store in stores)}",
+            f"  memory           {sum(store.nbytes for store in stores) / MB:.1f} of "
+            f"{tiles.max_bytes / MB:.0f} MB per region",
+            f"  loads / evictions {sum(store.loads for store in stores)} / "
+            f"{sum(store.evictions for store in stores)}",
+        ]
+    return lines
+
+
+class DiagnosticsDialog(QDialog):
+    """Live view of ``diagnostics_lines``, refreshed while it is open."""
+
+    def __init__(self, route_cache, registry, graph_cache, tiles=None, parent=None):
+        super().__init__(parent)
+        self.route_cache = route_cache
+        self.registry = registry
+        self.graph_cache = graph_cache
+        self.tiles = tiles
+        self.setWindowTitle("Route Builder Diagnostics")
+
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        buttons = QDialogButtonBox(QDialogButtonBox.Close, self)
+        clear = QPushButton("Clear route cache", self)
+        buttons.addButton(clear, QDialogButtonBox.ActionRole)
+        clear.clicked.connect(self.clear_route_cache)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text)
+        layout.addWidget(buttons)
+        self.resize(460, 420)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        self.text.setPlainText(
+            "\n".join(
+                diagnostics_lines(self.route_cache, self.registry, self.graph_cache, self.tiles)
+            )
+        )
+
+    def clear_route_cache(self):
+        self.route_cache.clear()
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
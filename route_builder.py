@@ -1,8 +1,9 @@
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
+from qgis.PyQt.QtCore import QSettings, QTimer, QTranslator, QCoreApplication
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import (
     QAction,
     QFileDialog,
+    QInputDialog,
     QLineEdit,
     QMessageBox,
     QToolButton,
@@ -16,28 +17,18 @@ from qgis.gui import QgsMapTool, QgsMapToolEmitPoint, QgsMapToolIdentifyFeature
 # Initialize Qt resources from file resources.py
 from .resources import *
 
-# Import the code for the dialog
-from .route_builder_dialog import RouteBuilderDialog
-from .second_dialog import SecondDialog
-import os.path
-import processing
-import sys, os
-from osgeo import ogr
-import osmnx as ox
-import networkx as nx
-import geopandas as gpd
-import pandas as pd
-import time
-from shapely.geometry import LineString, Point
-from osmnx.distance import nearest_nodes
-import matplotlib.pyplot as plt
-import io
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle 
-from datetime import datetime 
+# Only the standard library is imported here: QGIS imports this module at
+# startup through classFactory, while the dialogs, tasks and the scientific
+# stack behind them (numpy, scipy, networkx, pandas, osmnx, matplotlib,
+# reportlab) are imported by the actions that need them.
+from .core.graph_cache import GraphCache
+from .core.graph_registry import GraphRegistry
+from .core.route_cache import DEFAULT_MAX_ENTRIES, RouteCache
+from .warm_up import WarmUpTask
+import os
+
+# Delay before the background warm-up starts, leaving QGIS to finish starting
+WARM_UP_DELAY_MS = 5000
 
 class CaptureCoordinatesTool(QgsMapToolIdentifyFeature):
     def __init__(self, canvas):
@@ -90,12 +81,54 @@ class RouteBuilder:
 
         self.first_start = None
 
+        cache_dir = os.path.join(
+            QgsApplication.qgisSettingsDirPath(), "route_builder", "graph_cache"
+        )
+        max_mb = QSettings().value("route_builder/graph_cache_max_mb", 2048, type=int)
+        self.graph_cache = GraphCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+
+        # Graphs loaded in this session, shared by every dialog of the plugin
+        budget_mb = QSettings().value("route_builder/registry_max_mb", 1024, type=int)
+        self.registry = GraphRegistry(self.graph_cache, max_bytes=budget_mb * 1024 * 1024)
+
+        # Routes already computed, keyed by snapped endpoints and graph version
+        self.route_cache = RouteCache(
+            QSettings().value("route_builder/route_cache_size", DEFAULT_MAX_ENTRIES, type=int)
+        )
+
+        # Tiled networks of regions too large to load whole, see tile_catalog
+        self.tiles = None
+        self.second_dialog = None
+        self.diagnostics_dialog = None
+
+        # Running background tasks, kept referenced until they finish
+        self.tasks = []
+
     def tr(self, message):
         return QCoreApplication.translate("RouteBuilder", message)
 
     def run_second_part(self):
-        second_dialog = SecondDialog()
-        second_dialog.exec_()
+        if self.second_dialog is None:
+            from .second_dialog import SecondDialog
+
+            self.second_dialog = SecondDialog(
+                self.registry, self.tile_catalog(), self.route_cache
+            )
+        self.second_dialog.exec_()
+
+    def show_diagnostics(self):
+        if self.diagnostics_dialog is None:
+            from .diagnostics_dialog import DiagnosticsDialog
+
+            self.diagnostics_dialog = DiagnosticsDialog(
+                self.route_cache,
+                self.registry,
+                self.graph_cache,
+                self.tile_catalog(),
+                parent=self.iface.mainWindow(),
+            )
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
 
     def add_action(
         self,
@@ -157,8 +190,338 @@ class RouteBuilder:
             add_to_toolbar=False,
         )
 
+        self.add_action(
+            icon_path,
+            text=self.tr("Cost Matrix"),
+            callback=self.run_cost_matrix,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
+        self.add_action(
+            icon_path,
+            text=self.tr("Isochrones"),
+            callback=self.run_isochrones,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
+        self.add_action(
+            icon_path,
+            text=self.tr("Build Tiled Network"),
+            callback=self.run_tiling,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
+        self.add_action(
+            icon_path,
+            text=self.tr("Apply OSM Change"),
+            callback=self.run_osm_update,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
+        self.add_action(
+            icon_path,
+            text=self.tr("Clear Graph Cache"),
+            callback=self.clear_graph_cache,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
+        self.add_action(
+            icon_path,
+            text=self.tr("Diagnostics"),
+            callback=self.show_diagnostics,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+        )
+
         self.first_start = True
 
+        if QSettings().value("route_builder/warm_up", True, type=bool):
+            QTimer.singleShot(WARM_UP_DELAY_MS, self.warm_up)
+
+    def warm_up(self):
+        """Import the heavy modules in the background before first use."""
+        self.start_task(WarmUpTask(__package__))
+
+    def tile_catalog(self):
+        if self.tiles is None:
+            from .core.tiles import TileCatalog
+
+            tiles_dir = os.path.join(
+                QgsApplication.qgisSettingsDirPath(), "route_builder", "tiles"
+            )
+            tiles_mb = QSettings().value("route_builder/tile_cache_mb", 256, type=int)
+            self.tiles = TileCatalog(tiles_dir, max_bytes=tiles_mb * 1024 * 1024)
+        return self.tiles
+
+    def clear_graph_cache(self):
+        size_mb = self.graph_cache.total_bytes() / (1024 * 1024)
+        self.graph_cache.clear()
+        self.registry.clear()
+        self.route_cache.clear()
+        QMessageBox.information(
+            None,
+            "Graph Cache",
+            f"Removed {size_mb:.1f} MB of cached street graphs.",
+        )
+
+    def layer_points(self, layer):
+        """(lat, lon) of every point feature of ``layer``."""
+        wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+        transform = QgsCoordinateTransform(layer.crs(), wgs84, QgsProject.instance())
+        points = []
+        for feature in layer.getFeatures():
+            point = transform.transform(feature.geometry().asPoint())
+            points.append((point.y(), point.x()))
+        return points
+
+    def point_layers(self):
+        """Point layers of the project by name."""
+        return {
+            layer.name(): layer
+            for layer in QgsProject.instance().mapLayers().values()
+            if isinstance(layer, QgsVectorLayer)
+            and layer.geometryType() == QgsWkbTypes.PointGeometry
+        }
+
+    def run_cost_matrix(self):
+        from .core.costs import COST_MODES
+        from .core.parallel import default_workers
+        from .tasks import MatrixTask
+
+        parent = self.iface.mainWindow()
+        layers = self.point_layers()
+        if not layers:
+            QMessageBox.critical(
+                None, "Error", "Add the origin and destination point layers first."
+            )
+            return
+
+        local, ok = QInputDialog.getText(parent, "Cost Matrix", "Location:")
+        if not ok or local.strip() == "":
+            return
+        names = sorted(layers)
+        origins, ok = QInputDialog.getItem(parent, "Cost Matrix", "Origins layer:", names, 0, False)
+        if not ok:
+            return
+        destinations, ok = QInputDialog.getItem(
+            parent, "Cost Matrix", "Destinations layer:", names, 0, False
+        )
+        if not ok:
+            return
+        modes = [label for label, _ in COST_MODES]
+        mode, ok = QInputDialog.getItem(parent, "Cost Matrix", "Cost:", modes, 0, False)
+        if not ok:
+            return
+        output, _ = QFileDialog.getSaveFileName(
+            parent,
+            "Save Cost Matrix",
+            "",
+            "Parquet (*.parquet);;NumPy array (*.npy)",
+        )
+        if not output:
+            return
+        if not output.endswith((".parquet", ".npy")):
+            output += ".parquet"
+
+        workers = QSettings().value(
+            "route_builder/workers", default_workers(), type=int
+        )
+        task = MatrixTask(
+            self.registry,
+            local,
+            self.layer_points(layers[origins]),
+            self.layer_points(layers[destinations]),
+            dict(COST_MODES)[mode],
+            workers,
+            output,
+        )
+        task.succeeded.connect(self.on_matrix_ready)
+        task.failed.connect(self.on_matrix_failed)
+        self.start_task(task)
+
+    def on_matrix_failed(self, message):
+        QMessageBox.critical(
+            None, "Error", f"An error occurred while computing the cost matrix: {message}"
+        )
+
+    def on_matrix_ready(self, result):
+        rows, columns = result["shape"]
+        self.iface.messageBar().pushMessage(
+            "Route Builder",
+            f"Cost matrix {rows} x {columns} saved to {result['output']}",
+            level=Qgis.Success,
+            duration=10,
+        )
+
+    def run_isochrones(self):
+        from .core.isochrones import DEFAULT_BUFFER_M
+        from .core.parallel import default_workers
+        from .tasks import IsochroneTask
+
+        parent = self.iface.mainWindow()
+        layers = self.point_layers()
+        if not layers:
+            QMessageBox.critical(None, "Error", "Add the depot point layer first.")
+            return
+
+        local, ok = QInputDialog.getText(parent, "Isochrones", "Location:")
+        if not ok or local.strip() == "":
+            return
+        depots, ok = QInputDialog.getItem(
+            parent, "Isochrones", "Depots layer:", sorted(layers), 0, False
+        )
+        if not ok:
+            return
+        minutes, ok = QInputDialog.getText(
+            parent, "Isochrones", "Travel times (minutes):", QLineEdit.Normal, "5, 10, 15"
+        )
+        if not ok:
+            return
+        try:
+            minutes = sorted({float(value) for value in minutes.replace(";", ",").split(",")})
+        except ValueError:
+            minutes = []
+        if not minutes or minutes[0] <= 0:
+            QMessageBox.critical(
+                None, "Error", "Enter positive travel times in minutes, separated by commas."
+            )
+            return
+        methods = [("Street buffer", "buffer"), ("Concave hull", "concave")]
+        method, ok = QInputDialog.getItem(
+            parent, "Isochrones", "Polygons:", [label for label, _ in methods], 0, False
+        )
+        if not ok:
+            return
+
+        points = self.layer_points(layers[depots])
+        if not points:
+            QMessageBox.critical(None, "Error", f"The layer {depots} has no points.")
+            return
+        settings = QSettings()
+        task = IsochroneTask(
+            self.registry,
+            local,
+            points,
+            minutes,
+            dict(methods)[method],
+            settings.value("route_builder/isochrone_buffer_m", DEFAULT_BUFFER_M, type=float),
+            settings.value("route_builder/workers", default_workers(), type=int),
+        )
+        task.succeeded.connect(self.on_isochrones_ready)
+        task.failed.connect(self.on_isochrones_failed)
+        self.start_task(task)
+
+    def on_isochrones_failed(self, message):
+        QMessageBox.critical(
+            None, "Error", f"An error occurred while computing the isochrones: {message}"
+        )
+
+    def on_isochrones_ready(self, result):
+        from .route_layer import isochrone_layer
+
+        layer = isochrone_layer(f"isochrones_{result['place']}", result["features"])
+        QgsProject.instance().addMapLayer(layer)
+        self.iface.messageBar().pushMessage(
+            "Route Builder",
+            f"{layer.featureCount()} isochrones added for {result['place']}",
+            level=Qgis.Success,
+            duration=10,
+        )
+
+    def run_tiling(self):
+        from .tasks import TileTask
+
+        parent = self.iface.mainWindow()
+        local, ok = QInputDialog.getText(parent, "Build Tiled Network", "Location:")
+        if not ok or local.strip() == "":
+            return
+        extract, _ = QFileDialog.getOpenFileName(
+            parent,
+            "Select OSM Extract",
+            "",
+            "OpenStreetMap (*.osm *.osm.gz *.osm.bz2 *.pbf)",
+        )
+        if not extract:
+            return
+
+        task = TileTask(self.tile_catalog(), local, extract)
+        task.succeeded.connect(self.on_tiling_ready)
+        task.failed.connect(self.on_tiling_failed)
+        self.start_task(task)
+
+    def on_tiling_failed(self, message):
+        QMessageBox.critical(
+            None, "Error", f"An error occurred while tiling the street network: {message}"
+        )
+
+    def on_tiling_ready(self, result):
+        self.iface.messageBar().pushMessage(
+            "Route Builder",
+            f"{result['place']}: {result['nodes']:,} nodes and {result['edges']:,} edges "
+            f"in {result['tiles']} tiles; routes there now load only the tiles they cross",
+            level=Qgis.Success,
+            duration=10,
+        )
+
+    def run_osm_update(self):
+        from .core.osm_ingest import RAW_SIDECAR
+        from .tasks import UpdateTask
+
+        parent = self.iface.mainWindow()
+        places = sorted(
+            entry["place"]
+            for entry in self.graph_cache.entries()
+            if entry["network_type"] == "drive" and RAW_SIDECAR in entry.get("sidecars", ())
+        )
+        if not places:
+            QMessageBox.critical(
+                None, "Error", "Build a street network from a local OSM extract first."
+            )
+            return
+
+        place, ok = QInputDialog.getItem(parent, "Apply OSM Change", "Location:", places, 0, False)
+        if not ok:
+            return
+        change, _ = QFileDialog.getOpenFileName(
+            parent,
+            "Select OSM Change File",
+            "",
+            "OSM change (*.osc *.osc.gz *.osc.bz2)",
+        )
+        if not change:
+            return
+        # Optional: cancelling leaves the exported files as they are
+        geopackage, _ = QFileDialog.getOpenFileName(
+            parent, "GeoPackage Export to Update", "", "GeoPackage (*.gpkg)"
+        )
+
+        task = UpdateTask(self.registry, place, change, geopackage or None)
+        task.succeeded.connect(self.on_update_ready)
+        task.failed.connect(self.on_update_failed)
+        self.start_task(task)
+
+    def on_update_failed(self, message):
+        QMessageBox.critical(
+            None, "Error", f"An error occurred while applying the OSM change: {message}"
+        )
+
+    def on_update_ready(self, result):
+        summary = result["summary"]
+        message = (
+            f"Street network updated: {len(summary.removed_edges)} edges removed, "
+            f"{len(summary.added_edges)} added"
+        )
+        if result["geopackage"]:
+            message += f"; {result['geopackage']} updated"
+        self.iface.messageBar().pushMessage(
+            "Route Builder", message, level=Qgis.Success, duration=10
+        )
+
     def capture_coordinates(self):
         self.capture_tool = CaptureCoordinatesTool(self.iface.mapCanvas())
         self.iface.mapCanvas().setMapTool(self.capture_tool)
@@ -169,6 +532,12 @@ class RouteBuilder:
             self.iface.removeToolBarIcon(action)
 
     def run(self):
+        from .core.api import report_path_for
+        from .core.export import EXPORT_FORMATS
+        from .core.flatten import FLATTEN_MODES
+        from .route_builder_dialog import RouteBuilderDialog
+        from .tasks import BuildNetworkTask
+
         if self.first_start == True:
             self.first_start = False
             self.dlg = RouteBuilderDialog()
@@ -176,7 +545,13 @@ class RouteBuilder:
             # Connect the clicked signals of the folder selection buttons
             self.dlg.botaoVias.clicked.connect(self.select_via_path)
             self.dlg.botaoNos.clicked.connect(self.select_nos_path)
+            for label, mode in FLATTEN_MODES:
+                self.dlg.listMode.addItem(label, mode)
+            for label, fmt in EXPORT_FORMATS:
+                self.dlg.outputFormat.addItem(label, fmt)
+            self.dlg.botaoExtract.clicked.connect(self.select_extract)
 
+        self.refresh_clip_sources()
         result = self.dlg.exec_()
         if result:
             local = self.dlg.local_edit.text()
@@ -195,120 +570,116 @@ class RouteBuilder:
                 )
                 return
 
-            try:
-                start_time = time.time()
-                G = ox.graph_from_place(local, network_type="drive")
-
-                gdf_streets = ox.graph_to_gdfs(G, nodes=False)
-                gdf_nodes = ox.graph_to_gdfs(G, edges=False)
-
-                gdf_streets = gdf_streets.applymap(
-                    lambda x: x if not isinstance(x, list) else str(x)
-                )
-                gdf_nodes = gdf_nodes.applymap(
-                    lambda x: x if not isinstance(x, list) else str(x)
-                )
-
-                via_path = self.vias_output_dir
-                nos_path = self.nos_output_dir
-
-                output_path_streets = os.path.join(
-                    via_path, f"{local}_street_network.shp"
-                )
-                output_path_nodes = os.path.join(nos_path, f"{local}_nodes.shp")
-                gdf_streets.to_file(output_path_streets)
-                gdf_nodes.to_file(output_path_nodes)
-
-                elapsed_time = time.time() - start_time
-
-                num_nodes = len(gdf_nodes)
-                num_streets = len(gdf_streets)
+            extract = self.dlg.extract.text().strip() or None
+            if extract is not None and not os.path.isfile(extract):
+                QMessageBox.critical(None, "Error", f"OSM extract not found: {extract}")
+                return
+            clip = self.clip_area(self.dlg.clipSource.currentData()) if extract else None
+            # "cprofile" or "pyinstrument" to profile the slowest build stage
+            profiler = QSettings().value("route_builder/profiler", "", type=str) or None
+            # Large networks are streamed to their files so they are never
+            # held whole as GeoDataFrames; this setting overrides the chunk
+            # size, 0 turning streaming off
+            chunk_size = QSettings().value("route_builder/export_chunk_size", "", type=str).strip()
+            chunk_size = int(chunk_size) if chunk_size.isdigit() else None
+
+            # Download, export and report run in the QGIS task manager;
+            # several regions can be built at the same time.
+            task = BuildNetworkTask(
+                self.registry,
+                local,
+                self.vias_output_dir,
+                self.nos_output_dir,
+                report_path_for(self.vias_output_dir),
+                self.dlg.listMode.currentData(),
+                self.dlg.outputFormat.currentData(),
+                extract,
+                clip,
+                profiler,
+                chunk_size,
+            )
+            task.succeeded.connect(self.on_network_built)
+            task.failed.connect(self.on_network_failed)
+            self.start_task(task)
+            self.iface.messageBar().pushMessage(
+                "Route Builder",
+                f"Building the street network of {local} in the background.",
+                level=Qgis.Info,
+                duration=5,
+            )
+
+    def refresh_clip_sources(self):
+        """Offer the canvas extent and every polygon layer as clip areas."""
+        combo = self.dlg.clipSource
+        combo.clear()
+        combo.addItem("Whole extract", None)
+        combo.addItem("Map canvas extent", "canvas")
+        for layer in QgsProject.instance().mapLayers().values():
+            if (
+                isinstance(layer, QgsVectorLayer)
+                and layer.geometryType() == QgsWkbTypes.PolygonGeometry
+            ):
+                combo.addItem(f"Layer: {layer.name()}", layer.id())
+
+    def clip_area(self, source):
+        """WGS84 bbox tuple or shapely geometry for a clip combo choice."""
+        wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+        if source is None:
+            return None
+        if source == "canvas":
+            transform = QgsCoordinateTransform(
+                QgsProject.instance().crs(), wgs84, QgsProject.instance()
+            )
+            extent = transform.transformBoundingBox(self.iface.mapCanvas().extent())
+            return (
+                extent.xMinimum(),
+                extent.yMinimum(),
+                extent.xMaximum(),
+                extent.yMaximum(),
+            )
+        import shapely.wkb
+
+        layer = QgsProject.instance().mapLayer(source)
+        geometry = QgsGeometry.unaryUnion([f.geometry() for f in layer.getFeatures()])
+        geometry.transform(
+            QgsCoordinateTransform(layer.crs(), wgs84, QgsProject.instance())
+        )
+        return shapely.wkb.loads(bytes(geometry.asWkb()))
 
-                self.generate_pdf_report(local, elapsed_time, num_nodes, num_streets)
+    def select_extract(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self.iface.mainWindow(),
+            "Select OSM Extract",
+            "",
+            "OpenStreetMap (*.osm *.osm.gz *.osm.bz2 *.pbf)",
+        )
+        if path:
+            self.dlg.extract.setText(path)
 
-                QMessageBox.information(
-                    None,
-                    "Success",
-                    f"Street network exported as {output_path_streets} and nodes exported as {output_path_nodes}\nElapsed time: {elapsed_time:.2f} seconds",
-                )
-
-            except Exception as e:
-                QMessageBox.critical(
-                    None,
-                    "Error",
-                    f"An error occurred while extracting street network: {str(e)}",
-                )
-                return
-            
-    def generate_pdf_report(self, location, elapsed_time, num_nodes, num_streets):
-        output_dir = "C:/Users/Usuario/Desktop/aa/"
-        output_path = os.path.join(output_dir, "route_report.pdf")
-        doc = SimpleDocTemplate(output_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        centered_style = ParagraphStyle(name="Centered", alignment=1)
-
-        story = []
-
-        # Adicionar cabeçalho ao relatório
-        current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S") 
-
-        # Adicionar informações ao relatório
-        report_title = Paragraph(f"<b>Route Report</b>", styles["Title"])
-        story.append(report_title)
-        
-        # Adicionar a data como subtítulo centralizado
-        report_date = Paragraph(f"<i>{current_datetime}</i>", centered_style)
-        story.append(report_date)
-
-        story.append(Spacer(1, 12))
-        location_info = f"Location: {location}"
-        time_info = f"Elapsed Time: {elapsed_time:.2f} seconds"
-        num_nodes_info = f"Number of Nodes: {num_nodes}"
-        num_street_info = f"Number of Edges: {num_streets}"
-        info_paragraph = Paragraph(
-            f"{location_info}<br/>{num_nodes_info}<br/>{num_street_info}<br/>{time_info}",
-            styles["Normal"],
-        )
-        story.append(info_paragraph)
-
-        # Adicionar o gráfico de comparação
-        comparison_graph_buffer = self.plot_comparison_graph(num_nodes, num_streets)
-        comparison_image = Image(comparison_graph_buffer)
-        comparison_image._restrictSize(7 * inch, 6 * inch)
-        story.append(comparison_image)
-
-        doc.build(story)
+    def start_task(self, task):
+        task.taskCompleted.connect(lambda: self.tasks.remove(task))
+        task.taskTerminated.connect(lambda: self.tasks.remove(task))
+        self.tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
 
+    def on_network_built(self, result):
         QMessageBox.information(
             None,
             "Report Generated",
-            f"PDF report generated successfully at: {output_path}",
+            f"PDF report generated successfully at: {result['report_path']}",
+        )
+        QMessageBox.information(
+            None,
+            "Success",
+            f"Street network exported as {result['streets_path']} and nodes exported as {result['nodes_path']}\nElapsed time: {result['elapsed_time']:.2f} seconds",
         )
 
-
-    def plot_comparison_graph(self, num_nodes, num_streets):
-        import matplotlib.pyplot as plt
-        import io
-
-        # Dados para o gráfico
-        categories = ['Nodes', 'Streets']
-        quantities = [num_nodes, num_streets]
-
-        # Criar o gráfico de barras
-        plt.bar(categories, quantities, color=['blue', 'green'])
-        plt.xlabel('Categories')
-        plt.ylabel('Quantity')
-        plt.title('Comparison of Nodes and Streets')
-        
-        # Salvar o gráfico em um buffer de memória
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-
-        # Limpar o gráfico para evitar sobreposições
-        plt.clf()
-
-        return buffer
+    def on_network_failed(self, message):
+        QMessageBox.critical(
+            None,
+            "Error",
+            f"An error occurred while extracting street network: {message}",
+        )
 
     def select_via_path(self):
         self.vias_output_dir = QFileDialog.getExistingDirectory(
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Reusable project layer collecting the results of route queries.
+
+Every query of the route dialog used to add a memory layer of its own,
+without CRS or attributes, and the layer tree and canvas slowed down after a
+few hundred of them. ``RouteResultsLayer`` keeps one WGS84 line layer
+instead, found again through a custom layer property. Results are buffered
+and written with one ``addFeatures`` call per flush (at most ``BATCH_SIZE``
+features each), and only the newest ``retention`` routes are kept.
+
+``isochrone_layer`` builds the polygon layer of an isochrone run the same
+way, in one bulk write.
+"""
+
+from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsProject, QgsVectorLayer
+from qgis.PyQt.QtCore import QDateTime, QTimer, QVariant
+
+LAYER_NAME = "route_results"
+LAYER_PROPERTY = "route_builder/route_results"
+DEFAULT_RETENTION = 1000
+BATCH_SIZE = 500
+# Results finishing within this many milliseconds are written together
+FLUSH_DELAY_MS = 250
+
+FIELDS = (
+    ("place", QVariant.String),
+    ("origin_lat", QVariant.Double),
+    ("origin_lon", QVariant.Double),
+    ("dest_lat", QVariant.Double),
+    ("dest_lon", QVariant.Double),
+    ("backend", QVariant.String),
+    ("weight", QVariant.String),
+    ("cost", QVariant.Double),
+    ("length_m", QVariant.Double),
+    ("travel_time_s", QVariant.Double),
+    ("settled", QVariant.Int),
+    ("compute_ms", QVariant.Double),
+    ("created", QVariant.DateTime),
+)
+
+ISOCHRONE_FIELDS = (
+    ("depot", QVariant.Int),
+    ("minutes", QVariant.Double),
+    ("area_km2", QVariant.Double),
+    ("nodes", QVariant.Int),
+)
+ISOCHRONE_OPACITY = 0.5
+
+
+class RouteResultsLayer:
+    """The route results layer of the current project.
+
+    :param retention: Routes kept, oldest dropped first; 0 keeps them all.
+    :param spatial_index: Give the memory layer a spatial index, which
+        speeds up identify and selection once many routes pile up.
+    """
+
+    def __init__(self, retention=DEFAULT_RETENTION, spatial_index=True):
+        self.retention = retention
+        self.spatial_index = spatial_index
+        self.pending = []
+        self._layer_id = None
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def layer(self):
+        """The layer in the project, created when missing."""
+        project = QgsProject.instance()
+        layer = project.mapLayer(self._layer_id) if self._layer_id else None
+        if layer is None:
+            for candidate in project.mapLayers().values():
+                if candidate.customProperty(LAYER_PROPERTY):
+                    layer = candidate
+                    break
+        if layer is None:
+            layer = self.create_layer()
+            project.addMapLayer(layer)
+        self._layer_id = layer.id()
+        return layer
+
+    def create_layer(self):
+        uri = "LineString?crs=EPSG:4326"
+        if self.spatial_index:
+            uri += "&index=yes"
+        layer = QgsVectorLayer(uri, LAYER_NAME, "memory")
+        layer.dataProvider().addAttributes([QgsField(name, kind) for name, kind in FIELDS])
+        layer.updateFields()
+        layer.setCustomProperty(LAYER_PROPERTY, True)
+        return layer
+
+    def add(self, wkb, attributes):
+        """Queue a route line (WKB) and its ``FIELDS`` values by name."""
+        attributes = dict(attributes, created=QDateTime.currentDateTime())
+        self.pending.append((wkb, [attributes.get(name) for name, _ in FIELDS]))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+        elif not self._timer.isActive():
+            self._timer.start(FLUSH_DELAY_MS)
+
+    def flush(self):
+        """Write the queued routes and drop those beyond the retention."""
+        self._timer.stop()
+        if not self.pending:
+            return
+        layer = self.layer()
+        provider = layer.dataProvider()
+        fields = layer.fields()
+        pending, self.pending = self.pending, []
+        for start in range(0, len(pending), BATCH_SIZE):
+            features = []
+            for wkb, values in pending[start:start + BATCH_SIZE]:
+                geometry = QgsGeometry()
+                geometry.fromWkb(wkb)
+                feature = QgsFeature(fields)
+                feature.setGeometry(geometry)
+                feature.setAttributes(values)
+                features.append(feature)
+            provider.addFeatures(features)
+
+        # Memory layer ids grow with every insert, so the lowest are oldest
+        excess = provider.featureCount() - self.retention
+        if self.retention and excess > 0:
+            provider.deleteFeatures(sorted(layer.allFeatureIds())[:excess])
+        layer.updateExtents()
+        layer.triggerRepaint()
+
+
+def isochrone_layer(name, features):
+    """Memory layer of isochrone polygons.
+
+    :param features: ``(wkb, attributes)`` pairs, attributes keyed by the
+        names of ``ISOCHRONE_FIELDS``. The longest times are written first,
+        so the shorter bands are drawn on top of them.
+    """
+    layer = QgsVectorLayer("MultiPolygon?crs=EPSG:4326&index=yes", name, "memory")
+    provider = layer.dataProvider()
+    provider.addAttributes([QgsField(field, kind) for field, kind in ISOCHRONE_FIELDS])
+    layer.updateFields()
+    fields = layer.fields()
+    ordered = sorted(features, key=lambda feature: -feature[1]["minutes"])
+    for start in range(0, len(ordered), BATCH_SIZE):
+        batch = []
+        for wkb, attributes in ordered[start:start + BATCH_SIZE]:
+            geometry = QgsGeometry()
+            geometry.fromWkb(wkb)
+            feature = QgsFeature(fields)
+            feature.setGeometry(geometry)
+            feature.setAttributes([attributes.get(field) for field, _ in ISOCHRONE_FIELDS])
+            batch.append(feature)
+        provider.addFeatures(batch)
+    layer.updateExtents()
+    layer.setOpacity(ISOCHRONE_OPACITY)
+    return layer
@@ -1,13 +1,42 @@
-from PyQt5.QtWidgets import QDialog, QLineEdit, QMessageBox
-import osmnx as ox
-import networkx as nx
-from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsProject
-from shapely.geometry import Point, LineString
+import os
+from functools import partial
+
+from PyQt5.QtCore import QSettings, QVariant
+from PyQt5.QtWidgets import QDialog, QFileDialog, QLineEdit, QMessageBox
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsField,
+    QgsVectorLayer,
+    QgsFeature,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsWkbTypes,
+)
 from .create_route_dialog_base import CreateRouteDialog
+from .core.batch import STATUS_OK, read_od_csv
+from .core.costs import COST_MODES
+from .core.parallel import default_workers
+from .core.routing import ROUTING_ENGINES
+from .route_layer import DEFAULT_RETENTION, RouteResultsLayer
+from .tasks import BatchRouteTask, RouteTask
+
+WGS84 = QgsCoordinateReferenceSystem("EPSG:4326")
+
+
+def finite_or_none(value):
+    return value if value != float("inf") else None
+
 
 class SecondDialog(QDialog):
-    def __init__(self):
+    def __init__(self, registry, tiles=None, route_cache=None):
         super().__init__()
+        self.registry = registry
+        self.tiles = tiles
+        self.route_cache = route_cache
+        self.tasks = []
         self.ui = CreateRouteDialog()
         self.ui.setupUi(self)
         self.setWindowTitle("Builder Router")
@@ -15,87 +44,215 @@ class SecondDialog(QDialog):
         self.lineEditLocal = self.ui.local
         self.lineEditOrigem = self.ui.origem
         self.lineEditDestino = self.ui.destino
+        self.comboEngine = self.ui.engine
+        for label, backend in ROUTING_ENGINES:
+            self.comboEngine.addItem(label, backend)
+        self.comboCost = self.ui.cost
+        for label, weight in COST_MODES:
+            self.comboCost.addItem(label, weight)
 
         self.ui.buscar.clicked.connect(self.buscar_redes_e_calcular_rota)
 
-    def buscar_redes_e_calcular_rota(self):
-        location = self.lineEditLocal.text()
+        settings = QSettings()
+        self.route_layer = RouteResultsLayer(
+            retention=settings.value(
+                "route_builder/route_retention", DEFAULT_RETENTION, type=int
+            ),
+            spatial_index=settings.value(
+                "route_builder/route_layer_index", True, type=bool
+            ),
+        )
 
-        try:
-            G = ox.graph_from_place(location, network_type="drive")
-        except Exception as e:
-            QMessageBox.critical(
-                self, "Error", f"Failed to fetch road networks: {str(e)}"
-            )
-            return
+        self.batch_csv_path = None
+        self.comboBatch = self.ui.batchSource
+        self.ui.botaoBatch.clicked.connect(self.select_batch_csv)
+        self.ui.batchRun.clicked.connect(self.run_batch)
 
-        # Get origin and destination points from QLineEdit widgets
-        origem_text = self.lineEditOrigem.text()
-        destino_text = self.lineEditDestino.text()
+    def showEvent(self, event):
+        self.refresh_batch_sources()
+        super().showEvent(event)
 
-        # Convert origin and destination text to Points
-        origem = Point(
-            float(origem_text.split(",")[0]), float(origem_text.split(",")[1])
+    def refresh_batch_sources(self):
+        """List the chosen CSV file followed by the point layers of the project."""
+        self.comboBatch.clear()
+        csv_label = (
+            f"CSV: {os.path.basename(self.batch_csv_path)}"
+            if self.batch_csv_path
+            else "CSV file (choose with ...)"
         )
-        destino = Point(
-            float(destino_text.split(",")[0]), float(destino_text.split(",")[1])
+        self.comboBatch.addItem(csv_label, None)
+        for layer in QgsProject.instance().mapLayers().values():
+            if (
+                isinstance(layer, QgsVectorLayer)
+                and layer.geometryType() == QgsWkbTypes.PointGeometry
+            ):
+                self.comboBatch.addItem(f"Layer: {layer.name()}", layer.id())
+
+    def select_batch_csv(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Select O/D pairs", "", "CSV files (*.csv)"
         )
+        if path:
+            self.batch_csv_path = path
+            self.refresh_batch_sources()
+            self.comboBatch.setCurrentIndex(0)
 
-        # Find the nearest nodes to the origin and destination
-        origem_node = self.find_nearest_node(G, origem)
-        destino_node = self.find_nearest_node(G, destino)
+    def read_od_layer(self, layer):
+        """O/D pairs from points carrying ``pair_id`` and ``role`` fields."""
+        names = layer.fields().names()
+        if "pair_id" not in names or "role" not in names:
+            raise ValueError(f"Layer {layer.name()} needs pair_id and role fields.")
+        transform = QgsCoordinateTransform(layer.crs(), WGS84, QgsProject.instance())
+        endpoints = {}
+        for feature in layer.getFeatures():
+            point = transform.transform(feature.geometry().asPoint())
+            role = str(feature["role"]).strip().lower()
+            endpoints.setdefault(str(feature["pair_id"]), {})[role] = point
+        return [
+            (pair_id, ends["origin"].y(), ends["origin"].x(),
+             ends["destination"].y(), ends["destination"].x())
+            for pair_id, ends in endpoints.items()
+            if "origin" in ends and "destination" in ends
+        ]
 
-        # Calculate the shortest path using A* algorithm
+    def run_batch(self):
+        location = self.lineEditLocal.text()
+        layer_id = self.comboBatch.currentData()
         try:
-            shortest_path = nx.astar_path(
-                G,
-                origem_node,
-                destino_node,
-                heuristic=lambda u, v: self.distance_heuristic(G, u, v),
-            )
+            if layer_id is None:
+                if not self.batch_csv_path:
+                    raise ValueError("Choose a CSV file or a point layer first.")
+                pairs = read_od_csv(self.batch_csv_path)
+            else:
+                pairs = self.read_od_layer(QgsProject.instance().mapLayer(layer_id))
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
 
-            # Retrieve the geometry of the route
-            route_nodes = [G.nodes[node] for node in shortest_path]
-            route_line = LineString([(node["x"], node["y"]) for node in route_nodes])
+        workers = QSettings().value(
+            "route_builder/workers", default_workers(), type=int
+        )
+        task = BatchRouteTask(
+            self.registry, location, pairs, self.comboCost.currentData(), workers
+        )
+        task.succeeded.connect(self.on_batch_ready)
+        task.failed.connect(self.on_task_failed)
+        self.start_task(task)
 
-            # Convert Shapely LineString to QgsGeometry
-            route_geometry = QgsGeometry.fromPolylineXY(
-                [QgsPointXY(point[0], point[1]) for point in route_line.coords]
+    def on_batch_ready(self, result):
+        layer = QgsVectorLayer("LineString?crs=EPSG:4326", "batch_routes", "memory")
+        provider = layer.dataProvider()
+        provider.addAttributes(
+            [
+                QgsField("pair_id", QVariant.String),
+                QgsField("status", QVariant.String),
+                QgsField("cost", QVariant.Double),
+                QgsField("weight", QVariant.String),
+                QgsField("origin_snap_m", QVariant.Double),
+                QgsField("dest_snap_m", QVariant.Double),
+            ]
+        )
+        layer.updateFields()
+
+        features = []
+        for route, coordinates in zip(result["routes"], result["coordinates"]):
+            feature = QgsFeature(layer.fields())
+            if coordinates is not None:
+                feature.setGeometry(
+                    QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in coordinates])
+                )
+            feature.setAttributes(
+                [
+                    route.pair_id,
+                    route.status,
+                    finite_or_none(route.cost),
+                    result["weight"],
+                    finite_or_none(route.origin_snap),
+                    finite_or_none(route.destination_snap),
+                ]
             )
+            features.append(feature)
+        provider.addFeatures(features)
+        layer.updateExtents()
+        QgsProject.instance().addMapLayer(layer)
 
-            # Create a QgsVectorLayer from the route geometry
-            route_layer = QgsVectorLayer("LineString", "route_temp", "memory")
-            provider = route_layer.dataProvider()
-            features = [QgsFeature()]
-            features[0].setGeometry(route_geometry)
-            provider.addFeatures(features)
+        routed = sum(1 for route in result["routes"] if route.status == STATUS_OK)
+        QMessageBox.information(
+            self,
+            "Batch finished",
+            f"{routed} of {len(features)} O/D pairs routed into the batch_routes layer.",
+        )
+
+    def buscar_redes_e_calcular_rota(self):
+        location = self.lineEditLocal.text()
 
-            # Add the layer to the QGIS project
-            QgsProject.instance().addMapLayer(route_layer)
+        # Get origin and destination points from QLineEdit widgets
+        origem_text = self.lineEditOrigem.text()
+        destino_text = self.lineEditDestino.text()
 
-            QMessageBox.information(
-                self, "Success", "Route line added as a temporary layer in QGIS"
-            )
-        except nx.NetworkXNoPath:
+        # Convert origin and destination text to (lat, lon)
+        try:
+            origem = [float(value) for value in origem_text.split(",")[:2]]
+            destino = [float(value) for value in destino_text.split(",")[:2]]
+        except ValueError:
             QMessageBox.critical(
-                self, "Error", "No path found between the origin and destination."
+                self, "Error", "Coordinates must be written as: latitude, longitude"
             )
+            return
+
+        # Snapping and the A* search run in the QGIS task manager
+        task = RouteTask(
+            self.registry,
+            location,
+            origem,
+            destino,
+            backend=self.comboEngine.currentData(),
+            weight=self.comboCost.currentData(),
+            tiles=self.tiles,
+            simplify_m=QSettings().value("route_builder/route_simplify_m", 0, type=float),
+            route_cache=self.route_cache,
+        )
+        task.succeeded.connect(partial(self.on_route_ready, location, origem, destino))
+        task.failed.connect(self.on_task_failed)
+        self.start_task(task)
+
+    def start_task(self, task):
+        task.taskCompleted.connect(lambda: self.tasks.remove(task))
+        task.taskTerminated.connect(lambda: self.tasks.remove(task))
+        self.tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def on_route_ready(self, location, origem, destino, result):
+        route = result["route"]
+
+        # Every query lands in the same route_results layer; routes finishing
+        # close together are written in one batch once the delay runs out
+        self.route_layer.add(
+            result["wkb"],
+            {
+                "place": location,
+                "origin_lat": origem[0],
+                "origin_lon": origem[1],
+                "dest_lat": destino[0],
+                "dest_lon": destino[1],
+                "backend": route.backend,
+                "weight": route.weight,
+                "cost": route.cost,
+                "length_m": result["length_m"],
+                "travel_time_s": result["travel_time_s"],
+                "settled": route.settled,
+                "compute_ms": route.elapsed_ms,
+            },
+        )
+
+        QMessageBox.information(
+            self,
+            "Success",
+            "Route line added to the route_results layer\n"
+            f"Snap distance: origin {result['origin_snap']:.1f} m, "
+            f"destination {result['destination_snap']:.1f} m, "
+            f"{result['vertices']} vertices\n{route.summary()}",
+        )
 
-    def find_nearest_node(self, G, point):
-        nearest_node = None
-        nearest_distance = float("inf")
-        for node in G.nodes():
-            distance = point.distance(Point(G.nodes[node]["y"], G.nodes[node]["x"]))
-            if distance < nearest_distance:
-                nearest_node = node
-                nearest_distance = distance
-        return nearest_node
-
-    def distance_heuristic(self, G, u, v):
-        """Heuristic function for A* algorithm."""
-        # Assuming Euclidean distance as the heuristic
-        u_data = G.nodes[u]
-        v_data = G.nodes[v]
-        return (
-            (u_data["x"] - v_data["x"]) ** 2 + (u_data["y"] - v_data["y"]) ** 2
-        ) ** 0.5
+    def on_task_failed(self, message):
+        QMessageBox.critical(self, "Error", message)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Background tasks for the download -> convert -> export -> report pipeline and
+for route queries, run through the QGIS task manager so the GUI stays
+responsive and long operations can be cancelled.
+
+The work itself is done by ``core.api``, which runs without QGIS; tasks
+only carry its arguments across threads and map its progress to theirs.
+Tasks never touch widgets: results and errors are delivered through the
+``succeeded`` / ``failed`` signals, which are emitted from ``finished`` on the
+main thread.
+"""
+
+from qgis.core import Qgis, QgsMessageLog, QgsTask
+from qgis.PyQt.QtCore import pyqtSignal
+
+from .core import api
+from .core.profiling import Profiler
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class PipelineTask(QgsTask):
+    """Base task running ``work()`` and reporting its outcome via signals."""
+
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, description):
+        super().__init__(description, QgsTask.CanCancel)
+        self.result = None
+        self.error = None
+
+    def checkpoint(self, progress):
+        """Report progress at a stage boundary and stop if cancelled."""
+        self.setProgress(progress)
+        if self.isCanceled():
+            raise TaskCancelled()
+
+    def step(self, done):
+        """``checkpoint`` taking a fraction, for the ``progress`` of ``core.api``."""
+        self.checkpoint(100 * done)
+
+    def work(self):
+        raise NotImplementedError
+
+    def run(self):
+        try:
+            self.result = self.work()
+            return True
+        except TaskCancelled:
+            return False
+        except Exception as e:
+            self.error = e
+            return False
+
+    def finished(self, ok):
+        if ok:
+            self.succeeded.emit(self.result)
+        elif self.error is None:
+            self.failed.emit(f"{self.description()} was cancelled.")
+        else:
+            self.failed.emit(str(self.error))
+
+
+def log_message(message):
+    """Write to the plugin tab of the QGIS message log (safe from any thread)."""
+    QgsMessageLog.logMessage(message, "Route Builder", Qgis.Info)
+
+
+class BuildNetworkTask(PipelineTask):
+    """Load a region and export its streets and nodes, then write the report.
+
+    The time and memory of every stage are written to the message log as
+    they finish; with ``profiler`` ("cprofile" or "pyinstrument") the
+    slowest stage is profiled too, next to the exported streets. With
+    ``chunk_size`` the layers are streamed to their files in chunks; by
+    default only large networks are (see ``api.build_network``).
+    """
+
+    def __init__(
+        self,
+        registry,
+        place,
+        vias_output_dir,
+        nos_output_dir,
+        report_path,
+        list_mode="join",
+        output_format="gpkg",
+        extract=None,
+        clip=None,
+        profiler=None,
+        chunk_size=None,
+    ):
+        super().__init__(f"Building street network of {place}")
+        self.registry = registry
+        self.place = place
+        self.vias_output_dir = vias_output_dir
+        self.nos_output_dir = nos_output_dir
+        self.report_path = report_path
+        self.list_mode = list_mode
+        self.output_format = output_format
+        # Local .osm / .osm.pbf file replacing the Overpass download
+        self.extract = extract
+        self.clip = clip
+        self.profiler = profiler
+        self.chunk_size = chunk_size
+
+    def work(self):
+        profile_path = None
+        if self.profiler:
+            profile_path = api.profile_path_for(self.vias_output_dir, self.profiler)
+        result = api.build_network(
+            self.registry,
+            self.place,
+            self.vias_output_dir,
+            self.nos_output_dir,
+            list_mode=self.list_mode,
+            output_format=self.output_format,
+            extract=self.extract,
+            clip=self.clip,
+            report_path=self.report_path,
+            progress=self.step,
+            # Builds of several places may run at once, so tag their lines
+            profiler=Profiler(
+                log=lambda line: log_message(f"{self.place} | {line}"),
+                profiler=self.profiler,
+            ),
+            profile_path=profile_path,
+            chunk_size=self.chunk_size,
+        )
+        if result["profile_path"]:
+            log_message(
+                f"{self.place} | profile of the {result['profiled_stage']} stage: "
+                f"{result['profile_path']}"
+            )
+        return result
+
+
+class UpdateTask(PipelineTask):
+    """Apply an OSM change file to a region built from a local extract.
+
+    See ``core.api.update_network``; the task cannot be cancelled once the
+    graph is being edited.
+    """
+
+    def __init__(self, registry, place, change_path, geopackage=None, list_mode="join"):
+        super().__init__(f"Updating street network of {place}")
+        self.registry = registry
+        self.place = place
+        self.change_path = change_path
+        self.geopackage = geopackage
+        self.list_mode = list_mode
+
+    def work(self):
+        result = api.update_network(
+            self.registry,
+            self.place,
+            self.change_path,
+            self.geopackage,
+            self.list_mode,
+            progress=self.step,
+        )
+        self.setProgress(100)
+        return result
+
+
+class TileTask(PipelineTask):
+    """Cut the drive network of a local extract into routing tiles."""
+
+    def __init__(self, tiles, place, extract):
+        super().__init__(f"Tiling street network of {place}")
+        self.tiles = tiles
+        self.place = place
+        self.extract = extract
+
+    def work(self):
+        result = api.tile_network(
+            self.tiles, self.place, self.extract, progress=lambda done: self.step(0.99 * done)
+        )
+        self.setProgress(100)
+        return result
+
+
+class RouteTask(PipelineTask):
+    """Snap two (lat, lon) endpoints and route between them.
+
+    See ``core.api.route`` for tiled places, line simplification and the
+    route cache.
+    """
+
+    def __init__(
+        self,
+        registry,
+        place,
+        origin,
+        destination,
+        backend,
+        weight,
+        tiles=None,
+        simplify_m=0,
+        route_cache=None,
+    ):
+        super().__init__(f"Routing in {place}")
+        self.registry = registry
+        self.place = place
+        self.origin = origin
+        self.destination = destination
+        self.backend = backend
+        self.weight = weight
+        self.tiles = tiles
+        self.simplify_m = simplify_m
+        self.route_cache = route_cache
+
+    def work(self):
+        return api.route(
+            self.registry,
+            self.place,
+            self.origin,
+            self.destination,
+            backend=self.backend,
+            weight=self.weight,
+            tiles=self.tiles,
+            simplify_m=self.simplify_m,
+            route_cache=self.route_cache,
+            progress=self.step,
+        )
+
+
+class BatchRouteTask(PipelineTask):
+    """Route many O/D pairs of one region with a process pool."""
+
+    def __init__(self, registry, place, pairs, weight, workers):
+        super().__init__(f"Routing {len(pairs)} O/D pairs in {place}")
+        self.registry = registry
+        self.place = place
+        self.pairs = pairs
+        self.weight = weight
+        self.workers = workers
+
+    def work(self):
+        return api.route_pairs(
+            self.registry,
+            self.place,
+            self.pairs,
+            weight=self.weight,
+            workers=self.workers,
+            progress=self.step,
+        )
+
+
+class MatrixTask(PipelineTask):
+    """Travel cost matrix between two sets of (lat, lon) points."""
+
+    def __init__(self, registry, place, origins, destinations, weight, workers, output):
+        super().__init__(
+            f"Cost matrix {len(origins)} x {len(destinations)} in {place}"
+        )
+        self.registry = registry
+        self.place = place
+        self.origins = origins
+        self.destinations = destinations
+        self.weight = weight
+        self.workers = workers
+        self.output = output
+
+    def work(self):
+        return api.matrix(
+            self.registry,
+            self.place,
+            self.origins,
+            self.destinations,
+            weight=self.weight,
+            workers=self.workers,
+            output=self.output,
+            progress=self.step,
+        )
+
+
+class IsochroneTask(PipelineTask):
+    """Travel time isochrones around every (lat, lon) depot."""
+
+    def __init__(self, registry, place, depots, minutes, method, buffer_m, workers):
+        super().__init__(f"Isochrones of {len(depots)} depots in {place}")
+        self.registry = registry
+        self.place = place
+        self.depots = depots
+        self.minutes = sorted(minutes)
+        self.method = method
+        self.buffer_m = buffer_m
+        self.workers = workers
+
+    def work(self):
+        return api.isochrone_features(
+            self.registry,
+            self.place,
+            self.depots,
+            self.minutes,
+            method=self.method,
+            buffer_m=self.buffer_m,
+            workers=self.workers,
+            progress=self.step,
+        )
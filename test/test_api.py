@@ -0,0 +1,193 @@
+# coding=utf-8
+"""Headless API and command line test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import networkx as nx
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core import api
+from core.cli import main
+from core.graph_cache import GraphCache
+from core.route_cache import RouteCache
+
+
+class ApiTest(unittest.TestCase):
+    """Test the plugin workflows run without QGIS."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.G = grid_graph(400, seed=6)
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.cache_dir = os.path.join(cls.tmp_dir, 'cache')
+        GraphCache(cls.cache_dir).put('Grid', 'drive', cls.G)
+        cls.pairs = random_pairs(cls.G, 5, seed=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def point(self, node):
+        return self.G.nodes[node]['y'], self.G.nodes[node]['x']
+
+    def routable_pair(self):
+        for origin, destination in self.pairs:
+            if nx.has_path(self.G, origin, destination):
+                return origin, destination
+        self.fail('no routable pair')
+
+    def test_route(self):
+        """Test a route matches networkx and is served again from the cache."""
+        registry = api.open_registry(self.cache_dir)
+        origin, destination = self.routable_pair()
+        route_cache = RouteCache()
+        fractions = []
+        result = api.route(
+            registry, 'Grid', self.point(origin), self.point(destination),
+            weight='travel_time', route_cache=route_cache, progress=fractions.append)
+        expected = nx.shortest_path_length(self.G, origin, destination, weight='travel_time')
+        self.assertAlmostEqual(result['route'].cost, expected, places=6)
+        self.assertAlmostEqual(result['origin_snap'], 0.0, places=3)
+        self.assertEqual(fractions[-1], 1.0)
+        again = api.route(
+            registry, 'Grid', self.point(origin), self.point(destination),
+            weight='travel_time', route_cache=route_cache)
+        self.assertTrue(again['route'].backend.endswith('cached'))
+
+    def test_snap_failure(self):
+        """Test points far from the network raise a RuntimeError."""
+        registry = api.open_registry(self.cache_dir)
+        with self.assertRaises(RuntimeError):
+            api.matrix(registry, 'Grid', [(10.0, 10.0)], [self.point(self.pairs[0][0])])
+
+    def test_build_network(self):
+        """Test exports and the report are written."""
+        out_dir = os.path.join(self.tmp_dir, 'build')
+        os.makedirs(out_dir)
+        registry = api.open_registry(self.cache_dir)
+        result = api.build_network(
+            registry, 'Grid', out_dir, out_dir, report_path=api.report_path_for(out_dir))
+        self.assertEqual(result['nodes'], len(self.G))
+        self.assertEqual(result['streets'], self.G.number_of_edges())
+        for key in ('streets_path', 'nodes_path', 'report_path'):
+            self.assertTrue(os.path.exists(result[key]))
+        stages = [stage['stage'] for stage in result['stages']]
+        for stage in ('load', 'read cache', 'graph_to_gdfs', 'flatten', 'write edges',
+                      'write nodes', 'report'):
+            self.assertIn(stage, stages)
+        self.assertEqual(len(registry), 1)
+
+    def test_build_network_release(self):
+        """Test export-only builds, whole and streamed, drop the graph."""
+        import geopandas as gpd
+
+        for chunk_size in (None, 100):
+            out_dir = os.path.join(self.tmp_dir, f'export_only_{chunk_size}')
+            os.makedirs(out_dir)
+            registry = api.open_registry(self.cache_dir)
+            result = api.build_network(
+                registry, 'Grid', out_dir, out_dir, keep_graph=False, chunk_size=chunk_size)
+            self.assertEqual(result['streets'], self.G.number_of_edges())
+            streets = gpd.read_file(result['streets_path'], layer='streets')
+            self.assertEqual(len(streets), self.G.number_of_edges())
+            self.assertEqual(len(registry), 0)
+
+    def test_build_network_streams_large(self):
+        """Test networks above the threshold stream unless told not to."""
+        registry = api.open_registry(self.cache_dir)
+        with mock.patch('core.export.STREAM_THRESHOLD_EDGES', self.G.number_of_edges()):
+            for chunk_size, whole in ((None, False), (0, True)):
+                out_dir = os.path.join(self.tmp_dir, f'large_{chunk_size}')
+                os.makedirs(out_dir)
+                result = api.build_network(
+                    registry, 'Grid', out_dir, out_dir, chunk_size=chunk_size)
+                stages = [stage['stage'] for stage in result['stages']]
+                self.assertEqual('graph_to_gdfs' in stages, whole)
+                self.assertTrue(os.path.exists(result['streets_path']))
+
+    def run_cli(self, *argv):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            code = main(['--cache-dir', self.cache_dir] + list(argv))
+        return code, stdout.getvalue()
+
+    def test_cli_route_and_batch(self):
+        """Test the route and batch commands."""
+        origin, destination = self.routable_pair()
+        code, output = self.run_cli(
+            'route', 'Grid',
+            '--origin={},{}'.format(*self.point(origin)),
+            '--destination={},{}'.format(*self.point(destination)),
+            '--backend', 'bidirectional')
+        self.assertEqual(code, 0)
+        expected = nx.shortest_path_length(self.G, origin, destination, weight='length')
+        self.assertAlmostEqual(json.loads(output)['cost'], expected, places=6)
+
+        pairs_path = os.path.join(self.tmp_dir, 'pairs.csv')
+        with open(pairs_path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['id', 'origin_lat', 'origin_lon', 'destination_lat',
+                             'destination_lon'])
+            for number, (o, d) in enumerate(self.pairs):
+                writer.writerow([f'p{number}', *self.point(o), *self.point(d)])
+        routes_path = os.path.join(self.tmp_dir, 'routes.csv')
+        code, output = self.run_cli(
+            'batch', 'Grid', pairs_path, '--output', routes_path, '--workers', '1')
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(output)['pairs'], len(self.pairs))
+        with open(routes_path, newline='') as handle:
+            self.assertEqual(len(list(csv.DictReader(handle))), len(self.pairs))
+
+    def test_cli_isochrones(self):
+        """Test the isochrones command writes one polygon per depot and time."""
+        import geopandas as gpd
+
+        depots_path = os.path.join(self.tmp_dir, 'depots.csv')
+        with open(depots_path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['lat', 'lon'])
+            for origin, _ in self.pairs[:2]:
+                writer.writerow(self.point(origin))
+        output = os.path.join(self.tmp_dir, 'iso.gpkg')
+        code, _ = self.run_cli(
+            'isochrones', 'Grid', '--depots', depots_path, '--minutes', '1', '2',
+            '--output', output, '--workers', '1')
+        self.assertEqual(code, 0)
+        frame = gpd.read_file(output)
+        self.assertEqual(len(frame), 4)
+        self.assertEqual(sorted(frame['minutes'].unique()), [1.0, 2.0])
+
+    def test_cli_error(self):
+        """Test failures are reported on stderr with a non-zero exit code."""
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            code, _ = self.run_cli(
+                'matrix', 'Grid', '--origins', 'missing.csv',
+                '--destinations', 'missing.csv', '--output', 'm.npy')
+        self.assertEqual(code, 1)
+        self.assertIn('missing.csv', stderr.getvalue())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ApiTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
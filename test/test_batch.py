@@ -0,0 +1,125 @@
+# coding=utf-8
+"""Batch O/D routing test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.synthetic import grid_graph
+from core.batch import (
+    GROUPS_PER_TASK, STATUS_OK, STATUS_SNAP_FAILED, read_od_csv, route_batch)
+from core.csr import CSRGraph
+from core.search import dijkstra
+from core.spatial_index import NodeIndex
+
+
+class BatchRoutingTest(unittest.TestCase):
+    """Test batch routing agrees with one search per pair."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.csr = CSRGraph.from_networkx(grid_graph(900, seed=11))
+        cls.index = NodeIndex(cls.csr.node_ids, cls.csr.lats, cls.csr.lons)
+        rng = np.random.default_rng(8)
+        # Few distinct origins so several pairs share a search tree
+        origins = rng.integers(0, len(cls.csr), 20)
+        cls.pairs = []
+        for number in range(60):
+            o = origins[number % 20]
+            d = rng.integers(0, len(cls.csr))
+            cls.pairs.append((
+                str(number), cls.csr.lats[o], cls.csr.lons[o],
+                cls.csr.lats[d], cls.csr.lons[d]))
+        cls.pairs.append(('far away', 10.0, 10.0, cls.csr.lats[0], cls.csr.lons[0]))
+
+    def check(self, results):
+        self.assertEqual([r.pair_id for r in results], [p[0] for p in self.pairs])
+        self.assertEqual(results[-1].status, STATUS_SNAP_FAILED)
+        for pair, result in zip(self.pairs[:-1], results[:-1]):
+            o = self.index.nearest(pair[1], pair[2])[0]
+            d = self.index.nearest(pair[3], pair[4])[0]
+            expected = dijkstra(
+                self.csr, self.csr.position(o), self.csr.position(d),
+                weight='travel_time')
+            if expected:
+                self.assertEqual(result.status, STATUS_OK)
+                self.assertAlmostEqual(result.cost, expected.cost, places=6)
+                self.assertEqual(result.nodes[0], self.csr.position(o))
+                self.assertEqual(result.nodes[-1], self.csr.position(d))
+
+    def test_in_process(self):
+        """Test routing without a process pool."""
+        self.check(route_batch(
+            self.csr, self.index, self.pairs, weight='travel_time', workers=1))
+
+    def test_process_pool(self):
+        """Test workers sharing the graph give the same answers."""
+        self.check(route_batch(
+            self.csr, self.index, self.pairs, weight='travel_time', workers=2))
+
+    def test_cancel(self):
+        """Test cancelling after the first chunk leaves later chunks unrouted."""
+        class Cancelled(Exception):
+            pass
+
+        def progress(done):
+            raise Cancelled()
+
+        futures = []
+        submit = ProcessPoolExecutor.submit
+
+        def recording_submit(pool, *args, **kwargs):
+            futures.append(submit(pool, *args, **kwargs))
+            return futures[-1]
+
+        # Chunks slow enough for the queue to outlast the first one
+        csr = CSRGraph.from_networkx(grid_graph(10000, seed=11))
+        index = NodeIndex(csr.node_ids, csr.lats, csr.lons)
+        chunks = 30
+        rng = np.random.default_rng(2)
+        origins = rng.choice(len(csr), GROUPS_PER_TASK * chunks, replace=False)
+        pairs = []
+        for number, o in enumerate(origins.tolist()):
+            d = len(csr) - 1 - o
+            pairs.append((str(number), csr.lats[o], csr.lons[o], csr.lats[d], csr.lons[d]))
+        with mock.patch.object(ProcessPoolExecutor, 'submit', recording_submit):
+            with self.assertRaises(Cancelled):
+                route_batch(csr, index, pairs, weight='travel_time', workers=2,
+                            progress=progress)
+        self.assertEqual(len(futures), chunks)
+        ran = [future for future in futures if not future.cancelled()]
+        self.assertTrue(futures[-1].cancelled())
+        self.assertLess(len(ran), chunks // 2)
+
+    def test_read_csv(self):
+        """Test the CSV reader numbers pairs when there is no id column."""
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as csv_file:
+            csv_file.write(
+                'origin_lat,origin_lon,destination_lat,destination_lon\n'
+                '-7.1,-39.3,-7.2,-39.4\n')
+        try:
+            self.assertEqual(read_od_csv(path), [('1', -7.1, -39.3, -7.2, -39.4)])
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BatchRoutingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
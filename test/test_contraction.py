@@ -0,0 +1,127 @@
+# coding=utf-8
+"""Contraction hierarchy test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.contraction import ContractionHierarchy
+from core.csr import CSRGraph
+from core.graph_cache import GraphCache
+from core.graph_registry import GraphRegistry
+from core.routing import contraction_hierarchy, shortest_path
+from core.search import dijkstra
+
+
+class ContractionTest(unittest.TestCase):
+    """Test hierarchy queries give the routes of a plain search."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.G = grid_graph(900, seed=3)
+        cls.csr = CSRGraph.from_networkx(cls.G)
+        cls.hierarchies = {
+            weight: ContractionHierarchy.from_csr(cls.csr, weight)
+            for weight in ('length', 'travel_time')
+        }
+
+    def test_costs_match_dijkstra(self):
+        """Test optimal costs, including unreachable pairs."""
+        for weight, ch in self.hierarchies.items():
+            self.assertEqual(len(ch), len(self.csr))
+            for origin, destination in random_pairs(self.G, 25):
+                source = self.csr.position(origin)
+                target = self.csr.position(destination)
+                expected = dijkstra(self.csr, source, target, weight=weight)
+                result = ch.query(source, target)
+                self.assertAlmostEqual(result.cost, expected.cost, places=6)
+                self.assertEqual(bool(result), bool(expected))
+
+    def test_unpacked_path(self):
+        """Test shortcuts unpack to chained edges of the original graph."""
+        ch = self.hierarchies['travel_time']
+        self.assertGreater(ch.n_shortcuts, 0)
+        costs = self.csr.weights('travel_time')
+        for origin, destination in random_pairs(self.G, 10, seed=7):
+            result = ch.query(self.csr.position(origin), self.csr.position(destination))
+            if not result:
+                continue
+            self.assertEqual(len(result.edges), len(result.nodes) - 1)
+            for edge, u, v in zip(result.edges, result.nodes, result.nodes[1:]):
+                self.assertEqual(self.csr.edge_source(edge), u)
+                self.assertEqual(self.csr.targets[edge], v)
+            self.assertAlmostEqual(costs[result.edges].sum(), result.cost, places=6)
+
+    def test_same_endpoints(self):
+        """Test a query from a node to itself."""
+        result = self.hierarchies['length'].query(5, 5)
+        self.assertEqual(result.nodes, [5])
+        self.assertEqual(result.cost, 0.0)
+
+    def test_cached_with_graph(self):
+        """Test the routing engine stores the hierarchy in the graph cache."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = GraphCache(tmp_dir)
+            cache.put('Grid', 'drive', self.G.copy())
+            region = GraphRegistry(cache).resolve('Grid')
+            origin, destination = random_pairs(self.G, 1, seed=11)[0]
+            try:
+                expected = nx.shortest_path_length(
+                    self.G, origin, destination, weight='length')
+            except nx.NetworkXNoPath:
+                expected = None
+            try:
+                route = shortest_path(region, origin, destination, 'ch', 'length')
+                self.assertAlmostEqual(route.cost, expected, places=6)
+                self.assertAlmostEqual(
+                    nx.path_weight(self.G, route.nodes, 'length'), route.cost, places=6)
+            except nx.NetworkXNoPath:
+                self.assertIsNone(expected)
+            self.assertIn('ch_length', cache.entry('Grid', 'drive')['sidecars'])
+
+            # A new session reads it back instead of contracting again
+            reloaded = GraphRegistry(GraphCache(tmp_dir)).resolve('Grid')
+            ch = reloaded.persisted('ch_length', lambda G: self.fail('rebuilt'))
+            self.assertEqual(ch.n_edges, self.csr.n_edges)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_stale_cached(self):
+        """Test a cached hierarchy of another edge count is contracted again."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = GraphCache(tmp_dir)
+            cache.put('Grid', 'drive', self.G.copy())
+            stale = self.hierarchies['length']
+            stale = ContractionHierarchy(
+                stale.weight, stale.rank, stale.up, stale.down, stale.n_edges - 1)
+            cache.put_sidecar('Grid', 'drive', 'ch_length', stale)
+            region = GraphRegistry(cache).resolve('Grid')
+            ch = contraction_hierarchy(region, 'length')
+            self.assertIsNot(ch, stale)
+            self.assertEqual(ch.n_edges, self.csr.n_edges)
+            self.assertEqual(
+                cache.get_sidecar('Grid', 'drive', 'ch_length').n_edges, self.csr.n_edges)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ContractionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
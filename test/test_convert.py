@@ -0,0 +1,59 @@
+# coding=utf-8
+"""Single pass graph to GeoDataFrames conversion test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import unittest
+
+import osmnx as ox
+from geopandas.testing import assert_geodataframe_equal
+
+from benchmarks.synthetic import grid_graph
+from core.convert import graph_frames
+from core.osm_ingest import build_graph_from_extract
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+
+class ConvertTest(unittest.TestCase):
+    """Test graph_frames matches the two osmnx conversions."""
+
+    def assertMatchesOsmnx(self, G):
+        nodes, edges = graph_frames(G)
+        assert_geodataframe_equal(nodes, ox.graph_to_gdfs(G, edges=False))
+        assert_geodataframe_equal(edges, ox.graph_to_gdfs(G, nodes=False))
+
+    def test_simplified_extract(self):
+        """Test a simplified graph, whose merged edges carry geometries."""
+        G = build_graph_from_extract(FIXTURE)
+        self.assertTrue(any('geometry' in d for _, _, d in G.edges(data=True)))
+        self.assertMatchesOsmnx(G)
+
+    def test_grid(self):
+        """Test a synthetic grid."""
+        self.assertMatchesOsmnx(grid_graph(500, seed=3))
+
+    def test_release(self):
+        """Test releasing empties the graph but keeps the frames whole."""
+        G = grid_graph(300, seed=4)
+        expected_nodes, expected_edges = ox.graph_to_gdfs(G)
+        nodes, edges = graph_frames(G, release=True)
+        self.assertEqual(len(G), 0)
+        assert_geodataframe_equal(nodes, expected_nodes)
+        assert_geodataframe_equal(edges, expected_edges)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ConvertTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
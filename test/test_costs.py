@@ -0,0 +1,96 @@
+# coding=utf-8
+"""Cost modes and heuristic test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import unittest
+
+import networkx as nx
+import osmnx as ox
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.costs import csr_heuristic, ensure_travel_times
+from core.csr import CSRGraph
+from core.graph_registry import RegionEntry
+from core.routing import shortest_path
+from core.search import dijkstra
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+
+class HeuristicTest(unittest.TestCase):
+    """Test the haversine heuristics are consistent and pay off."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.grid = grid_graph(1600, seed=5)
+        cls.fixture = ensure_travel_times(ox.graph_from_xml(FIXTURE))
+
+    def assert_consistent(self, G, weight):
+        csr = CSRGraph.from_networkx(G)
+        costs = csr.weights(weight)
+        for target in range(0, len(csr), max(1, len(csr) // 7)):
+            h = csr_heuristic(csr, target, weight)
+            self.assertEqual(h(target), 0.0)
+            for u in range(len(csr)):
+                for edge in range(csr.offsets[u], csr.offsets[u + 1]):
+                    v = csr.targets[edge]
+                    self.assertLessEqual(h(u), costs[edge] + h(v) + 1e-9)
+
+    def test_consistent_on_fixture(self):
+        """Test h(u) <= w(u, v) + h(v) on real osmnx lengths."""
+        self.assert_consistent(self.fixture, 'length')
+        self.assert_consistent(self.fixture, 'travel_time')
+
+    def test_consistent_on_grid(self):
+        """Test h(u) <= w(u, v) + h(v) on a synthetic grid."""
+        self.assert_consistent(self.grid, 'travel_time')
+
+    def test_backends_find_optimal_routes(self):
+        """Test both backends return the Dijkstra optimum and count work."""
+        region = RegionEntry('grid', 'drive', self.grid)
+        for weight in ('length', 'travel_time'):
+            for origin, destination in random_pairs(self.grid, 8, seed=2):
+                try:
+                    expected = nx.dijkstra_path_length(
+                        self.grid, origin, destination, weight=weight)
+                except nx.NetworkXNoPath:
+                    continue
+                for backend in ('networkx', 'csr'):
+                    result = shortest_path(
+                        region, origin, destination, backend, weight)
+                    self.assertAlmostEqual(result.cost, expected, places=6)
+                    self.assertEqual(result.nodes[0], origin)
+                    self.assertEqual(result.nodes[-1], destination)
+                    self.assertGreater(result.settled, 0)
+
+    def test_astar_settles_fewer_nodes(self):
+        """Test the heuristic shrinks the search compared to Dijkstra."""
+        region = RegionEntry('grid', 'drive', self.grid)
+        astar_total = dijkstra_total = 0
+        for origin, destination in random_pairs(self.grid, 10, seed=4):
+            try:
+                astar_total += shortest_path(
+                    region, origin, destination, 'csr', 'length').settled
+            except nx.NetworkXNoPath:
+                continue
+            csr = region.indexes['csr']
+            dijkstra_total += dijkstra(
+                csr, csr.position(origin), csr.position(destination)).settled
+        self.assertLess(astar_total, dijkstra_total)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(HeuristicTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,118 @@
+# coding=utf-8
+"""CSR graph and search test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.costs import csr_heuristic
+from core.csr import CSRGraph
+from core.search import astar, bidirectional, dijkstra
+
+
+class CSRSearchTest(unittest.TestCase):
+    """Test the CSR engine agrees with NetworkX."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.G = grid_graph(900, seed=3)
+        cls.csr = CSRGraph.from_networkx(cls.G)
+
+    def test_structure(self):
+        """Test every edge survives the conversion."""
+        self.assertEqual(len(self.csr), self.G.number_of_nodes())
+        self.assertEqual(self.csr.n_edges, self.G.number_of_edges())
+        for edge in range(0, self.csr.n_edges, 97):
+            u, v, key = self.csr.edge_tuple(edge)
+            self.assertAlmostEqual(
+                self.G.edges[u, v, key]['length'],
+                self.csr.weights('length')[edge])
+
+    def test_costs_match_networkx(self):
+        """Test shortest path costs for both weights."""
+        for weight in ('length', 'travel_time'):
+            for origin, destination in random_pairs(self.G, 15):
+                try:
+                    expected = nx.dijkstra_path_length(
+                        self.G, origin, destination, weight=weight)
+                except nx.NetworkXNoPath:
+                    expected = float('inf')
+                result = dijkstra(
+                    self.csr, self.csr.position(origin),
+                    self.csr.position(destination), weight=weight)
+                self.assertAlmostEqual(result.cost, expected, places=6)
+
+    def test_path_is_connected(self):
+        """Test returned edges chain from origin to destination."""
+        origin, destination = random_pairs(self.G, 1, seed=7)[0]
+        result = astar(
+            self.csr, self.csr.position(origin), self.csr.position(destination))
+        self.assertEqual(len(result.edges), len(result.nodes) - 1)
+        for a, b, edge in zip(result.nodes, result.nodes[1:], result.edges):
+            self.assertEqual(self.csr.edge_source(edge), a)
+            self.assertEqual(self.csr.targets[edge], b)
+
+    def test_bidirectional_one_way(self):
+        """Test bidirectional searches follow one-way streets from both ends."""
+        G = self.G.copy()
+        rng = np.random.default_rng(5)
+        edges = list(G.edges(keys=True))
+        G.remove_edges_from(edges[i] for i in rng.choice(len(edges), len(edges) // 3, False))
+        csr = CSRGraph.from_networkx(G)
+        for weight in ('length', 'travel_time'):
+            for origin, destination in random_pairs(G, 15, seed=2):
+                try:
+                    expected = nx.dijkstra_path_length(G, origin, destination, weight=weight)
+                except nx.NetworkXNoPath:
+                    expected = float('inf')
+                source = csr.position(origin)
+                target = csr.position(destination)
+                plain = bidirectional(csr, source, target, weight)
+                guided = bidirectional(
+                    csr, source, target, weight,
+                    csr_heuristic(csr, target, weight), csr_heuristic(csr, source, weight))
+                for result in (plain, guided):
+                    self.assertAlmostEqual(result.cost, expected, places=6)
+                    if not result:
+                        continue
+                    self.assertEqual(result.nodes[0], source)
+                    self.assertEqual(result.nodes[-1], target)
+                    for a, b, edge in zip(result.nodes, result.nodes[1:], result.edges):
+                        self.assertEqual(csr.edge_source(edge), a)
+                        self.assertEqual(csr.targets[edge], b)
+                if expected < float('inf'):
+                    self.assertLess(
+                        plain.settled, dijkstra(csr, source, target, weight).settled + 2)
+
+    def test_unreachable(self):
+        """Test an isolated node yields an empty result."""
+        G = nx.MultiDiGraph()
+        G.add_node(1, x=0.0, y=0.0)
+        G.add_node(2, x=0.001, y=0.0)
+        G.add_edge(2, 1, length=100.0)
+        csr = CSRGraph.from_networkx(G)
+        result = dijkstra(csr, csr.position(1), csr.position(2))
+        self.assertFalse(result)
+        self.assertFalse(bidirectional(csr, csr.position(1), csr.position(2)))
+        self.assertEqual(bidirectional(csr, csr.position(2), csr.position(1)).cost, 100.0)
+        with self.assertRaises(KeyError):
+            csr.position(3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CSRSearchTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Network export test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import geopandas as gpd
+import osmnx as ox
+from geopandas.testing import assert_geodataframe_equal
+
+from core.export import EXPORT_FORMATS, export_network, stream_network
+from core.flatten import flatten_list_columns
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+
+class ExportTest(unittest.TestCase):
+    """Test every export format round-trips both layers."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.G = ox.graph_from_xml(FIXTURE)
+        cls.streets = flatten_list_columns(ox.graph_to_gdfs(cls.G, nodes=False))
+        cls.nodes = flatten_list_columns(ox.graph_to_gdfs(cls.G, edges=False))
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self, path, layer):
+        if path.endswith('.parquet'):
+            return gpd.read_parquet(path)
+        if path.endswith('.gpkg'):
+            return gpd.read_file(path, layer=layer)
+        return gpd.read_file(path)
+
+    def test_formats(self):
+        """Test the layers read back with their features and attributes."""
+        for _, fmt in EXPORT_FORMATS:
+            with self.subTest(fmt=fmt):
+                streets_path, nodes_path = export_network(
+                    self.streets, self.nodes, 'Crato', self.tmp_dir,
+                    self.tmp_dir, fmt)
+                streets = self.read(streets_path, 'streets')
+                nodes = self.read(nodes_path, 'nodes')
+                self.assertEqual(len(streets), len(self.streets))
+                self.assertEqual(len(nodes), len(self.nodes))
+                self.assertIn('highway', streets.columns)
+
+    def test_geopackage(self):
+        """Test one GeoPackage holds both layers with spatial indexes."""
+        progress = []
+        streets_path, nodes_path = export_network(
+            self.streets, self.nodes, 'Crato', self.tmp_dir, self.tmp_dir,
+            'gpkg', progress=progress.append)
+        self.assertEqual(streets_path, nodes_path)
+        self.assertEqual(progress, [0.5, 1.0])
+        with sqlite3.connect(streets_path) as db:
+            extensions = {
+                row[0] for row in db.execute(
+                    "SELECT table_name FROM gpkg_extensions "
+                    "WHERE extension_name = 'gpkg_rtree_index'")}
+        self.assertEqual(extensions, {'streets', 'nodes'})
+
+    def test_stream(self):
+        """Test streamed layers read back like the whole-frame exports."""
+        for _, fmt in EXPORT_FORMATS:
+            with self.subTest(fmt=fmt):
+                whole = export_network(
+                    self.streets, self.nodes, 'Whole', self.tmp_dir, self.tmp_dir, fmt)
+                streamed = stream_network(
+                    self.G, 'Streamed', self.tmp_dir, self.tmp_dir, fmt, chunk_size=4)
+                for whole_path, path, layer in zip(whole, streamed, ('streets', 'nodes')):
+                    expected = self.read(whole_path, layer)
+                    if fmt == 'parquet':
+                        # Keys are plain columns rather than a pandas index
+                        expected = expected.reset_index()
+                    assert_geodataframe_equal(self.read(path, layer), expected)
+
+    def test_stream_cancel(self):
+        """Test an error in progress is raised as is and no files are left."""
+        class Cancelled(Exception):
+            pass
+
+        def progress(done):
+            if done > 0.5:
+                raise Cancelled()
+
+        with self.assertRaises(Cancelled):
+            stream_network(self.G.copy(), 'Crato', self.tmp_dir, self.tmp_dir, 'gpkg',
+                           chunk_size=4, progress=progress)
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_stream_release(self):
+        """Test a released graph is emptied once written."""
+        G = self.G.copy()
+        streets_path, _ = stream_network(
+            G, 'Crato', self.tmp_dir, self.tmp_dir, 'fgb', chunk_size=4, release=True)
+        self.assertEqual(len(G), 0)
+        self.assertEqual(len(gpd.read_file(streets_path)), len(self.streets))
+
+    def test_unknown_format(self):
+        """Test an unknown format is rejected."""
+        with self.assertRaises(ValueError):
+            export_network(
+                self.streets, self.nodes, 'Crato', self.tmp_dir,
+                self.tmp_dir, 'kml')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ExportTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""List attribute flattening test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import json
+import unittest
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import LineString
+
+from core.flatten import flatten_list_columns
+
+
+class FlattenTest(unittest.TestCase):
+    """Test list cells become scalars and everything else is kept."""
+
+    def setUp(self):
+        index = pd.MultiIndex.from_tuples(
+            [(1, 2, 0), (2, 3, 0), (3, 1, 0)], names=['u', 'v', 'key'])
+        self.gdf = gpd.GeoDataFrame(
+            {
+                'osmid': [[10, 11], 12, [13]],
+                'name': ['Rua A', ['Rua B', 'Rua C'], None],
+                'length': [1.5, 2.5, 3.5],
+                'note': [['kept'], None, None],
+            },
+            geometry=[LineString([(0, 0), (1, 1)])] * 3,
+            index=index,
+            crs='EPSG:4326')
+
+    def test_join(self):
+        """Test joining list values."""
+        flat = flatten_list_columns(self.gdf)
+        self.assertEqual(flat['osmid'].tolist(), ['10;11', '12', '13'])
+        self.assertEqual(flat['name'].tolist(), ['Rua A', 'Rua B;Rua C', None])
+        self.assertEqual(flat.index.tolist(), self.gdf.index.tolist())
+        self.assertTrue(flat.geometry.equals(self.gdf.geometry))
+
+    def test_first(self):
+        """Test keeping the first value."""
+        flat = flatten_list_columns(self.gdf, 'first')
+        self.assertEqual(flat['osmid'].tolist(), [10, 12, 13])
+        self.assertEqual(flat['name'].tolist(), ['Rua A', 'Rua B', None])
+
+    def test_json(self):
+        """Test writing JSON arrays."""
+        flat = flatten_list_columns(self.gdf, 'json')
+        self.assertEqual(json.loads(flat['name'].iloc[1]), ['Rua B', 'Rua C'])
+
+    def test_leaves_input_and_other_columns(self):
+        """Test the input frame and unknown columns are untouched."""
+        flat = flatten_list_columns(self.gdf)
+        self.assertEqual(self.gdf['osmid'].iloc[0], [10, 11])
+        self.assertEqual(flat['note'].iloc[0], ['kept'])
+
+    def test_unknown_mode(self):
+        """Test an unknown mode is rejected."""
+        with self.assertRaises(ValueError):
+            flatten_list_columns(self.gdf, 'csv')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FlattenTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,138 @@
+# coding=utf-8
+"""Route geometry test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+
+from benchmarks.synthetic import grid_graph, random_pairs, write_osm_xml
+from core.geometry import EARTH_RADIUS_M, EdgeGeometries, douglas_peucker, line_wkb
+from core.graph_registry import RegionEntry
+from core.osm_ingest import build_graph_from_extract
+from core.routing import (
+    csr_graph, edge_geometries, route_coordinates, route_totals, shortest_path)
+
+
+def line_length_m(coords):
+    return ox.distance.great_circle(
+        coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0]).sum()
+
+
+def segment_distances_m(points, line):
+    """Distance in metres of each (lon, lat) point to a (lon, lat) line."""
+    scale = np.radians([np.cos(np.radians(line[:, 1].mean())), 1.0]) * EARTH_RADIUS_M
+    return shapely.distance(shapely.points(points * scale), shapely.linestrings(line * scale))
+
+
+class GeometryTest(unittest.TestCase):
+    """Test route lines follow the edge geometries of the graph."""
+
+    @classmethod
+    def setUpClass(cls):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            # Dropped grid streets leave bends that simplification turns
+            # into curved edge geometries
+            G = build_graph_from_extract(
+                write_osm_xml(grid_graph(900, seed=2), os.path.join(tmp_dir, 'grid.osm')))
+        finally:
+            shutil.rmtree(tmp_dir)
+        cls.region = RegionEntry('Grid', 'drive', G)
+        cls.csr = csr_graph(cls.region)
+        cls.geometries = edge_geometries(cls.region)
+
+    def test_packed_edges(self):
+        """Test each edge keeps its own vertices, curved or straight."""
+        G = self.region.graph
+        self.assertIsInstance(self.geometries, EdgeGeometries)
+        self.assertEqual(len(self.geometries), self.csr.n_edges)
+        curved = 0
+        for edge in range(self.csr.n_edges):
+            u, v, k = self.csr.edge_tuple(edge)
+            geometry = G.edges[u, v, k].get('geometry')
+            if geometry is None:
+                expected = [(G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])]
+            else:
+                curved += 1
+                expected = shapely.get_coordinates(geometry)
+            np.testing.assert_array_equal(self.geometries.edge_coordinates(edge), expected)
+        self.assertGreater(curved, 0)
+
+    def test_route_follows_edges(self):
+        """Test route lines are as long as the route and end at its nodes."""
+        G = self.region.graph
+        for origin, destination in random_pairs(G, 10):
+            for backend in ('networkx', 'csr'):
+                try:
+                    route = shortest_path(
+                        self.region, origin, destination, backend, 'travel_time')
+                except nx.NetworkXNoPath:
+                    continue
+                length, travel_time = route_totals(self.region, route)
+                self.assertAlmostEqual(travel_time, route.cost, places=6)
+                coords = route_coordinates(self.region, route)
+                self.assertAlmostEqual(line_length_m(coords), length, delta=length * 1e-6)
+                np.testing.assert_array_equal(
+                    coords[0], (G.nodes[origin]['x'], G.nodes[origin]['y']))
+                np.testing.assert_array_equal(
+                    coords[-1], (G.nodes[destination]['x'], G.nodes[destination]['y']))
+                # No vertex is repeated where two edges join
+                self.assertTrue((np.diff(coords, axis=0) != 0).any(axis=1).all())
+
+    def test_single_node_route(self):
+        """Test a route without edges gives a two-vertex line at its node."""
+        node = next(iter(self.region.graph.nodes))
+        route = shortest_path(self.region, node, node, 'csr')
+        line = shapely.from_wkb(line_wkb(route_coordinates(self.region, route)))
+        node_xy = (self.region.graph.nodes[node]['x'], self.region.graph.nodes[node]['y'])
+        self.assertEqual(list(line.coords), [node_xy, node_xy])
+
+    def test_wkb(self):
+        """Test WKB reads back to the exact coordinates."""
+        coords = np.random.default_rng(0).uniform(-40, -7, (50, 2))
+        line = shapely.from_wkb(line_wkb(coords))
+        self.assertEqual(line.geom_type, 'LineString')
+        np.testing.assert_array_equal(shapely.get_coordinates(line), coords)
+
+    def test_douglas_peucker(self):
+        """Test dropped vertices stay within the tolerance of the kept line."""
+        rng = np.random.default_rng(1)
+        lons = -39.4 + np.cumsum(rng.uniform(0, 0.0005, 400))
+        lats = -7.2 + np.cumsum(rng.normal(0, 0.0003, 400))
+        coords = np.column_stack([lons, lats])
+        self.assertTrue(douglas_peucker(coords, 0).all())
+        for tolerance in (1.0, 10.0, 50.0):
+            keep = douglas_peucker(coords, tolerance)
+            self.assertTrue(keep[0] and keep[-1])
+            self.assertLess(keep.sum(), len(coords))
+            distances = segment_distances_m(coords[~keep], coords[keep])
+            self.assertLessEqual(distances.max(), tolerance * 1.001)
+
+        # Collinear vertices all go, a loop back to the start is kept
+        line = np.column_stack([np.linspace(0, 0.01, 20), np.zeros(20)])
+        self.assertEqual(douglas_peucker(line, 0.1).sum(), 2)
+        loop = np.array([[0, 0], [0.001, 0], [0.001, 0.001], [0, 0]], dtype=float)
+        self.assertGreater(douglas_peucker(loop, 1.0).sum(), 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GeometryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,142 @@
+# coding=utf-8
+"""Graph cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from core.graph_cache import GraphCache, graph_digest
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+
+def line_graph(n, x0=0.0):
+    """A tiny osmnx-like graph with ``n`` nodes on a line."""
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    for i in range(n):
+        G.add_node(i, x=x0 + i * 0.001, y=0.0)
+    for i in range(n - 1):
+        G.add_edge(i, i + 1, length=111.0)
+    return G
+
+
+class GraphCacheTest(unittest.TestCase):
+    """Test the on-disk graph cache works offline."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = GraphCache(self.cache_dir)
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_seed_from_xml(self):
+        """Test seeding from a local OSM file needs no builder."""
+        entry = self.cache.seed_from_xml('Fixture Town', 'drive', FIXTURE)
+        self.assertEqual(entry['place'], 'Fixture Town')
+        self.assertEqual(len(entry['source_hash']), 64)
+        min_x, min_y, max_x, max_y = entry['bbox']
+        self.assertLess(min_x, max_x)
+        self.assertLess(min_y, max_y)
+
+        def fail(place, network_type):
+            raise AssertionError('cache miss on a seeded place')
+
+        G = self.cache.get_or_build(' fixture  town ', 'drive', builder=fail)
+        self.assertEqual(G.number_of_nodes(), entry['nodes'])
+
+    def test_source_hash_rebuilds(self):
+        """Test a graph built from other source data is rebuilt."""
+        built = []
+
+        def builder(place, network_type):
+            built.append(place)
+            return line_graph(3 + len(built))
+
+        self.cache.get_or_build('Line', 'drive', builder, source_hash='a')
+        self.cache.get_or_build('Line', 'drive', builder, source_hash='a')
+        self.assertEqual(len(built), 1)
+        G = self.cache.get_or_build('Line', 'drive', builder, source_hash='b')
+        self.assertEqual(len(built), 2)
+        self.assertEqual(G.number_of_nodes(), 5)
+        self.assertEqual(self.cache.entry('Line', 'drive')['source_hash'], 'b')
+
+    def test_sidecars(self):
+        """Test sidecars are stored apart, go stale and are removed."""
+        G = line_graph(3)
+        G.graph['sidecars'] = {'raw': {'ways': [1, 2]}}
+        self.cache.put('Line', 'drive', G, source_hash='a')
+        self.assertNotIn('sidecars', G.graph)
+        self.assertNotIn('sidecars', self.cache.get('Line', 'drive').graph)
+        self.assertEqual(self.cache.get_sidecar('Line', 'drive', 'raw'), {'ways': [1, 2]})
+        self.assertIsNone(self.cache.get_sidecar('Line', 'drive', 'other'))
+
+        self.cache.put('Line', 'drive', line_graph(4), source_hash='b')
+        self.assertIsNone(self.cache.get_sidecar('Line', 'drive', 'raw'))
+        G = line_graph(4)
+        G.graph['sidecars'] = {'raw': {}}
+        self.cache.put('Line', 'drive', G, source_hash='b')
+        self.cache.invalidate('Line')
+        self.assertEqual(os.listdir(self.cache_dir), ['manifest.json'])
+
+    def test_manifest_survives_reopen(self):
+        """Test a second cache instance sees stored graphs."""
+        self.cache.put('Line', 'drive', line_graph(5))
+        reopened = GraphCache(self.cache_dir)
+        self.assertTrue(reopened.contains('Line', 'drive'))
+        self.assertEqual(reopened.get('Line', 'drive').number_of_nodes(), 5)
+
+    def test_lru_eviction(self):
+        """Test the least recently used graph is evicted first."""
+        self.cache.put('A', 'drive', line_graph(200))
+        self.cache.put('B', 'drive', line_graph(200))
+        self.cache.get('A', 'drive')
+        self.cache.max_bytes = self.cache.total_bytes()
+        self.cache.put('C', 'drive', line_graph(200))
+        self.assertTrue(self.cache.contains('A', 'drive'))
+        self.assertFalse(self.cache.contains('B', 'drive'))
+        self.assertTrue(self.cache.contains('C', 'drive'))
+
+    def test_invalidate(self):
+        """Test explicit invalidation per network type and per place."""
+        self.cache.put('Town', 'drive', line_graph(3))
+        self.cache.put('Town', 'walk', line_graph(3))
+        self.assertEqual(self.cache.invalidate('Town', 'walk'), 1)
+        self.assertTrue(self.cache.contains('Town', 'drive'))
+        self.assertEqual(self.cache.invalidate('town'), 1)
+        self.assertEqual(self.cache.entries(), [])
+
+        calls = []
+        self.cache.get_or_build(
+            'Town', 'drive', builder=lambda p, n: calls.append(p) or line_graph(3))
+        self.assertEqual(calls, ['Town'])
+
+    def test_digest_separates_ids(self):
+        """Test node ids are hashed apart, not as one concatenation."""
+        one, other = nx.MultiDiGraph(), nx.MultiDiGraph()
+        one.add_nodes_from([1, 23])
+        other.add_nodes_from([12, 3])
+        self.assertNotEqual(graph_digest(one), graph_digest(other))
+        self.assertEqual(graph_digest(line_graph(3)), graph_digest(line_graph(3)))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GraphCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
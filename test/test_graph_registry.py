@@ -0,0 +1,101 @@
+# coding=utf-8
+"""Graph registry test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from core.graph_cache import GraphCache
+from core.graph_registry import GraphRegistry, estimate_graph_bytes
+
+
+def line_graph(n):
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    for i in range(n):
+        G.add_node(i, x=i * 0.001, y=0.0)
+    for i in range(n - 1):
+        G.add_edge(i, i + 1, length=111.0)
+    return G
+
+
+class SizedIndex:
+    nbytes = 10 ** 6
+
+
+class GraphRegistryTest(unittest.TestCase):
+    """Test regions are loaded once and evicted under a memory budget."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.builds = []
+        self.registry = GraphRegistry(GraphCache(self.cache_dir))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.cache_dir)
+
+    def build(self, place, network_type):
+        self.builds.append(place)
+        return line_graph(10)
+
+    def test_resolve_reuses_loaded_graph(self):
+        """Test a second resolve neither builds nor reads the disk cache."""
+        first = self.registry.resolve('Crato', builder=self.build)
+        second = self.registry.resolve('Crato', builder=self.build)
+        self.assertIs(first.graph, second.graph)
+        self.assertEqual(self.builds, ['Crato'])
+
+        # A new registry goes through the disk cache, not the builder
+        other = GraphRegistry(self.registry.graph_cache)
+        other.resolve('Crato', builder=self.build)
+        self.assertEqual(self.builds, ['Crato'])
+
+    def test_derived_index_built_once(self):
+        """Test derived indexes are cached on the region entry."""
+        entry = self.registry.resolve('Crato', builder=self.build)
+        calls = []
+        factory = lambda G: calls.append(G) or SizedIndex()
+        entry.derived('nodes', factory)
+        entry.derived('nodes', factory)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            entry.nbytes, estimate_graph_bytes(entry.graph) + SizedIndex.nbytes)
+
+    def test_eviction_under_budget(self):
+        """Test the least recently used region is dropped first."""
+        one_region = estimate_graph_bytes(line_graph(10))
+        self.registry.max_bytes = 2 * one_region
+        self.registry.resolve('A', builder=self.build)
+        self.registry.resolve('B', builder=self.build)
+        self.registry.resolve('A', builder=self.build)
+        self.registry.resolve('C', builder=self.build)
+        self.assertIn(('A', 'drive'), self.registry)
+        self.assertNotIn(('B', 'drive'), self.registry)
+        self.assertIn(('C', 'drive'), self.registry)
+
+    def test_oversized_region_is_kept(self):
+        """Test a region larger than the budget is still usable."""
+        self.registry.max_bytes = 1
+        entry = self.registry.resolve('Huge', builder=self.build)
+        entry.derived('nodes', lambda G: SizedIndex())
+        self.assertEqual(len(self.registry), 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GraphRegistryTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,131 @@
+# coding=utf-8
+"""Isochrone test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import networkx as nx
+import numpy as np
+import shapely
+
+from benchmarks.synthetic import grid_graph
+from core.csr import CSRGraph
+from core.isochrones import (
+    SOURCES_PER_TASK,
+    isochrones,
+    reached_segments,
+    source_isochrones,
+)
+
+
+class IsochroneTest(unittest.TestCase):
+    """Test isochrones cover what a bounded search reaches."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.G = grid_graph(900, seed=4)
+        cls.csr = CSRGraph.from_networkx(cls.G)
+        cls.limits = [60.0, 120.0, 180.0]
+
+    def test_reached_nodes(self):
+        """Test node counts and polygons against networkx."""
+        source = len(self.csr) // 2
+        reached = nx.single_source_dijkstra_path_length(
+            self.G, int(self.csr.node_ids[source]), cutoff=self.limits[-1],
+            weight='travel_time')
+        for method in ('buffer', 'concave'):
+            result = source_isochrones(self.csr, source, self.limits, method=method)
+            self.assertEqual([iso.limit for iso in result], self.limits)
+            for iso in result:
+                inside = [node for node, time in reached.items() if time <= iso.limit]
+                self.assertEqual(iso.nodes, len(inside))
+                self.assertTrue(iso.geometry.is_valid)
+                positions = self.csr.node_ids.searchsorted(inside)
+                covered = shapely.intersects_xy(
+                    iso.geometry, self.csr.lons[positions], self.csr.lats[positions])
+                self.assertTrue(covered.all())
+            areas = [iso.area_m2 for iso in result]
+            self.assertEqual(areas, sorted(areas))
+
+    def test_partial_edge(self):
+        """Test the last street is cut where the time runs out."""
+        csr = self.csr
+        source = 0
+        edge = csr.offsets[source]
+        cost = csr.weights('travel_time')[edge]
+        segments = reached_segments(
+            csr, np.array([source]), np.array([0.0]), cost / 4)
+        target = csr.targets[edge]
+        start = np.array([csr.lons[source], csr.lats[source]])
+        end = np.array([csr.lons[target], csr.lats[target]])
+        np.testing.assert_allclose(segments[0, 0], start)
+        np.testing.assert_allclose(segments[0, 1], start + (end - start) / 4)
+
+    def test_isolated_source(self):
+        """Test a zero limit still yields a small disc."""
+        iso = source_isochrones(self.csr, 0, [0.0], buffer_m=50.0)[0]
+        self.assertEqual(iso.nodes, 1)
+        self.assertAlmostEqual(iso.area_m2, np.pi * 50.0 ** 2, delta=1000)
+
+    def test_workers(self):
+        """Test workers sharing the graph give the same isochrones."""
+        sources = np.arange(0, len(self.csr), 31)[:SOURCES_PER_TASK + 3]
+        fractions = []
+        serial = isochrones(self.csr, sources, self.limits, workers=1,
+                            progress=fractions.append)
+        parallel = isochrones(self.csr, sources, self.limits, workers=2)
+        self.assertEqual(fractions[-1], 1.0)
+        self.assertEqual(len(serial), len(sources))
+        for one, other, source in zip(serial, parallel, sources.tolist()):
+            self.assertEqual([iso.source for iso in one], [source] * len(self.limits))
+            self.assertEqual([iso.nodes for iso in one], [iso.nodes for iso in other])
+            for a, b in zip(one, other):
+                self.assertTrue(a.geometry.equals(b.geometry))
+
+    def test_cancel(self):
+        """Test cancelling after the first task leaves later tasks unrun."""
+        class Cancelled(Exception):
+            pass
+
+        def progress(done):
+            raise Cancelled()
+
+        futures = []
+        submit = ProcessPoolExecutor.submit
+
+        def recording_submit(pool, *args, **kwargs):
+            futures.append(submit(pool, *args, **kwargs))
+            return futures[-1]
+
+        tasks = 30
+        sources = np.arange(SOURCES_PER_TASK * tasks)
+        with mock.patch.object(ProcessPoolExecutor, 'submit', recording_submit):
+            with self.assertRaises(Cancelled):
+                isochrones(self.csr, sources, self.limits, workers=2, progress=progress)
+        self.assertEqual(len(futures), tasks)
+        ran = [future for future in futures if not future.cancelled()]
+        self.assertTrue(futures[-1].cancelled())
+        self.assertLess(len(ran), tasks // 2)
+
+    def test_unknown_method(self):
+        """Test an unknown polygon method is rejected."""
+        with self.assertRaises(ValueError):
+            isochrones(self.csr, [0], self.limits, method='voronoi')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(IsochroneTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""Cost matrix test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.synthetic import grid_graph
+from core.csr import CSRGraph
+from core.matrix import ORIGINS_PER_BLOCK, cost_matrix
+from core.search import dijkstra
+
+
+class CostMatrixTest(unittest.TestCase):
+    """Test cost matrices agree with one search per pair."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.csr = CSRGraph.from_networkx(grid_graph(400, seed=5))
+        rng = np.random.default_rng(3)
+        cls.origins = rng.choice(len(cls.csr), ORIGINS_PER_BLOCK * 2 + 3, replace=False)
+        cls.destinations = rng.choice(len(cls.csr), 12, replace=False)
+        cls.expected = np.array([
+            [dijkstra(cls.csr, o, d, weight='travel_time').cost
+             for d in cls.destinations.tolist()]
+            for o in cls.origins.tolist()])
+        cls.tmp_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_in_memory(self):
+        """Test the in-process matrix matches Dijkstra."""
+        fractions = []
+        matrix = cost_matrix(
+            self.csr, self.origins, self.destinations, 'travel_time',
+            workers=1, progress=fractions.append)
+        np.testing.assert_allclose(matrix, self.expected)
+        self.assertEqual(fractions[-1], 1)
+
+    def test_process_pool_npy(self):
+        """Test workers fill a memory-mapped .npy file."""
+        path = os.path.join(self.tmp_dir, 'matrix.npy')
+        cost_matrix(
+            self.csr, self.origins, self.destinations, 'travel_time',
+            workers=2, output=path)
+        np.testing.assert_allclose(np.load(path), self.expected)
+
+    def test_parquet(self):
+        """Test the long-format Parquet output carries OSM node ids."""
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.tmp_dir, 'matrix.parquet')
+        cost_matrix(
+            self.csr, self.origins, self.destinations, 'travel_time',
+            workers=1, output=path)
+        table = pq.read_table(path).to_pandas()
+        self.assertEqual(len(table), self.expected.size)
+        row = table.iloc[len(self.destinations) + 1]
+        self.assertEqual(row['origin'], self.csr.node_ids[self.origins[1]])
+        self.assertEqual(row['destination'], self.csr.node_ids[self.destinations[1]])
+        self.assertAlmostEqual(row['cost'], self.expected[1, 1])
+
+    def test_cancel(self):
+        """Test cancelling after the first block leaves later blocks unrun."""
+        class Cancelled(Exception):
+            pass
+
+        def progress(done):
+            raise Cancelled()
+
+        futures = []
+        submit = ProcessPoolExecutor.submit
+
+        def recording_submit(pool, *args, **kwargs):
+            futures.append(submit(pool, *args, **kwargs))
+            return futures[-1]
+
+        # Blocks slow enough for the queue to outlast the first one
+        csr = CSRGraph.from_networkx(grid_graph(2500, seed=5))
+        blocks = 30
+        with mock.patch.object(ProcessPoolExecutor, 'submit', recording_submit):
+            with self.assertRaises(Cancelled):
+                cost_matrix(
+                    csr, np.arange(ORIGINS_PER_BLOCK * blocks),
+                    np.arange(0, len(csr), 7), 'travel_time', workers=2,
+                    progress=progress)
+        self.assertEqual(len(futures), blocks)
+        ran = [future for future in futures if not future.cancelled()]
+        self.assertTrue(futures[-1].cancelled())
+        self.assertLess(len(ran), blocks // 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CostMatrixTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
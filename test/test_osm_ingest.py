@@ -0,0 +1,128 @@
+# coding=utf-8
+"""Offline OSM extract ingestion test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import osmnx as ox
+from shapely.geometry import box
+
+from core.osm_ingest import (
+    build_graph_from_extract, extract_fingerprint, is_drivable, way_direction)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+# The fixture's west half, nodes 1-3, 5-7, 9-11 and 13-15
+WEST_BBOX = (-40.5951, -7.0901, -40.5929, -7.0869)
+
+
+class OsmIngestTest(unittest.TestCase):
+    """Test the streaming builder matches osmnx on the drive network."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        # osmnx.graph_from_xml applies no network filter, so drop the
+        # fixture's footway to get the drive network osmnx would fetch.
+        with open(FIXTURE, encoding='utf-8') as handle:
+            text = handle.read()
+        start = text.index('<way id="108"')
+        end = text.index('</way>', start) + len('</way>')
+        cls.drive_path = os.path.join(cls.tmp_dir, 'drive.osm')
+        with open(cls.drive_path, 'w', encoding='utf-8') as handle:
+            handle.write(text[:start] + text[end:])
+        cls.G = build_graph_from_extract(FIXTURE)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_matches_osmnx(self):
+        """Test nodes, edges and their attributes match osmnx."""
+        expected = ox.graph_from_xml(self.drive_path)
+        self.assertEqual(sorted(self.G.edges(keys=True)), sorted(expected.edges(keys=True)))
+        for u, v, k, data in expected.edges(keys=True, data=True):
+            built = self.G.edges[u, v, k]
+            self.assertAlmostEqual(built['length'], data['length'], places=6)
+            self.assertEqual(built['oneway'], data['oneway'])
+            self.assertEqual(built['osmid'], data['osmid'])
+            if 'geometry' in data:
+                self.assertTrue(built['geometry'].equals(data['geometry']))
+        self.assertIn('travel_time', next(iter(self.G.edges(data=True)))[2])
+        self.assertEqual(self.G.graph['crs'], 'epsg:4326')
+
+    def test_chunk_size(self):
+        """Test tiny chunks build the same graph."""
+        G = build_graph_from_extract(FIXTURE, chunk_size=1)
+        self.assertEqual(sorted(G.edges(keys=True)), sorted(self.G.edges(keys=True)))
+
+    def test_clip(self):
+        """Test clipping by bbox and by polygon keeps the same nodes."""
+        by_bbox = build_graph_from_extract(FIXTURE, clip=WEST_BBOX)
+        by_polygon = build_graph_from_extract(FIXTURE, clip=box(*WEST_BBOX))
+        self.assertEqual(sorted(by_bbox.edges()), sorted(by_polygon.edges()))
+        self.assertTrue(set(by_bbox.nodes) <= {1, 2, 3, 5, 6, 7, 9, 10, 11, 13, 14, 15})
+        for _, data in by_bbox.nodes(data=True):
+            self.assertLessEqual(data['x'], WEST_BBOX[2])
+
+    def test_empty_clip(self):
+        """Test a clip area without streets is reported."""
+        with self.assertRaises(ValueError):
+            build_graph_from_extract(FIXTURE, clip=(0.0, 0.0, 1.0, 1.0))
+
+    def test_pbf(self):
+        """Test a PBF extract gives the same graph as its XML source."""
+        try:
+            import osmium
+        except ImportError:
+            self.skipTest('pyosmium is not installed')
+        path = os.path.join(self.tmp_dir, 'small.osm.pbf')
+        writer = osmium.SimpleWriter(path)
+        for obj in osmium.FileProcessor(FIXTURE):
+            if obj.is_node():
+                writer.add_node(obj)
+            elif obj.is_way():
+                writer.add_way(obj)
+        writer.close()
+        G = build_graph_from_extract(path)
+        self.assertEqual(
+            sorted(G.edges(keys=True, data='length')),
+            sorted(self.G.edges(keys=True, data='length')))
+
+    def test_tag_rules(self):
+        """Test the drive filter and one-way rules."""
+        self.assertTrue(is_drivable({'highway': 'residential'}))
+        self.assertFalse(is_drivable({'highway': 'footway'}))
+        self.assertFalse(is_drivable({'highway': 'primary', 'access': 'private'}))
+        self.assertFalse(is_drivable({'name': 'Praça'}))
+        self.assertEqual(way_direction({'oneway': 'yes'}), 1)
+        self.assertEqual(way_direction({'oneway': '-1'}), -1)
+        self.assertEqual(way_direction({'junction': 'roundabout'}), 1)
+        self.assertEqual(way_direction({'oneway': 'no'}), 0)
+
+    def test_fingerprint(self):
+        """Test the fingerprint follows the clip area."""
+        self.assertNotEqual(
+            extract_fingerprint(FIXTURE), extract_fingerprint(FIXTURE, WEST_BBOX))
+        self.assertEqual(
+            extract_fingerprint(FIXTURE, box(*WEST_BBOX)),
+            extract_fingerprint(FIXTURE, box(*WEST_BBOX)))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(OsmIngestTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,164 @@
+# coding=utf-8
+"""Incremental OSM change update test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import osmnx as ox
+import pyogrio
+
+from benchmarks.synthetic import (
+    apply_osm_change, grid_graph, write_osm_change, write_osm_xml)
+from core.csr import CSRGraph
+from core.export import export_network, update_geopackage
+from core.flatten import flatten_list_columns
+from core.graph_registry import RegionEntry
+from core.osm_ingest import build_graph_from_extract, build_network_from_extract
+from core.osm_update import apply_change, read_osc
+from core.spatial_index import NodeIndex
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+CHANGE = os.path.join(os.path.dirname(__file__), 'small_network_change.osc')
+
+
+def edge_set(G):
+    return sorted(
+        (u, v, round(data['length'], 6), round(data['travel_time'], 3))
+        for u, v, data in G.edges(data=True))
+
+
+def csr_edges(csr):
+    sources = np.repeat(csr.node_ids, np.diff(csr.offsets))
+    return sorted(zip(
+        sources.tolist(), csr.node_ids[csr.targets].tolist(), csr.edge_keys.tolist(),
+        csr.weights('length').round(6).tolist(),
+        csr.weights('travel_time').round(6).tolist()))
+
+
+class OsmUpdateTest(unittest.TestCase):
+    """Test change files give the graph a full rebuild would."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.grid = grid_graph(900)
+        cls.extract = write_osm_xml(cls.grid, os.path.join(cls.tmp_dir, 'grid.osm'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def assertMatchesRebuild(self, G, extract, change):
+        expected = build_graph_from_extract(apply_osm_change(
+            extract, change, os.path.join(self.tmp_dir, 'after.osm')))
+        self.assertEqual(edge_set(G), edge_set(expected))
+        self.assertEqual(sorted(G.nodes), sorted(expected.nodes))
+        for node, data in expected.nodes(data=True):
+            self.assertEqual(G.nodes[node], data)
+
+    def test_read_osc(self):
+        """Test created, modified and deleted elements are read."""
+        change = read_osc(CHANGE)
+        refs, tags = change.ways[109]
+        self.assertEqual(refs, [8, 17, 18])
+        self.assertEqual(tags, {'highway': 'tertiary', 'name': 'Rua Nova'})
+        self.assertEqual(change.nodes[10][2], {'highway': 'traffic_signals'})
+        self.assertIsNone(change.ways[106])
+        self.assertEqual(len(change), 7)
+
+    def test_fixture_change(self):
+        """Test a change touching the whole fixture matches a rebuild."""
+        G, raw = build_network_from_extract(FIXTURE)
+        summary = apply_change(G, raw, read_osc(CHANGE))
+        self.assertTrue(summary)
+        self.assertMatchesRebuild(G, FIXTURE, CHANGE)
+        # Way 106 is gone, so nodes 7 and 11 are no longer intersections
+        self.assertNotIn(7, G)
+        self.assertEqual(G.nodes[10]['highway'], 'traffic_signals')
+
+    def test_local_change(self):
+        """Test a small change only replaces the edges around it."""
+        G, raw = build_network_from_extract(self.extract)
+        edges = G.number_of_edges()
+        path = write_osm_change(self.grid, os.path.join(self.tmp_dir, 'small.osc'), 6)
+        summary = apply_change(G, raw, read_osc(path))
+        self.assertLess(len(summary.removed_edges), edges / 10)
+        self.assertMatchesRebuild(G, self.extract, path)
+
+        # The raw network follows, so a second change applies on top
+        second = write_osm_change(
+            self.grid, os.path.join(self.tmp_dir, 'second.osc'), 6, seed=4)
+        apply_change(G, raw, read_osc(second))
+        self.assertMatchesRebuild(
+            G, os.path.join(self.tmp_dir, 'after.osm'), second)
+
+    def test_indexes(self):
+        """Test patched nearest-node and CSR indexes match fresh ones."""
+        G, raw = build_network_from_extract(self.extract)
+        region = RegionEntry('Grid', 'drive', G)
+        region.derived('node_index', NodeIndex.from_graph)
+        region.derived('csr', CSRGraph.from_networkx)
+        region.derived('max_speed_mps', lambda G: 1.0)
+        path = write_osm_change(self.grid, os.path.join(self.tmp_dir, 'index.osc'), 9)
+        region.patch(apply_change(G, raw, read_osc(path)))
+        self.assertNotIn('max_speed_mps', region.indexes)
+
+        csr = region.indexes['csr']
+        expected = CSRGraph.from_networkx(G)
+        np.testing.assert_array_equal(csr.node_ids, expected.node_ids)
+        np.testing.assert_array_equal(csr.offsets, expected.offsets)
+        self.assertEqual(csr_edges(csr), csr_edges(expected))
+
+        index = region.indexes['node_index']
+        self.assertIsNotNone(index.removed)
+        self.assertEqual(len(index), G.number_of_nodes())
+        fresh = NodeIndex.from_graph(G)
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(fresh.lats.min(), fresh.lats.max(), 200)
+        lons = rng.uniform(fresh.lons.min(), fresh.lons.max(), 200)
+        for k in (1, 4):
+            nodes, distances = index.query(lats, lons, k=k)
+            expected_nodes, expected_distances = fresh.query(lats, lons, k=k)
+            np.testing.assert_array_equal(nodes, expected_nodes)
+            np.testing.assert_allclose(distances, expected_distances)
+        self.assertEqual(
+            index.within(lats[0], lons[0], 300), fresh.within(lats[0], lons[0], 300))
+
+    def test_geopackage(self):
+        """Test a GeoPackage export is patched to the updated graph."""
+        G, raw = build_network_from_extract(self.extract)
+        path, _ = export_network(
+            flatten_list_columns(ox.graph_to_gdfs(G, nodes=False)),
+            flatten_list_columns(ox.graph_to_gdfs(G, edges=False)),
+            'Grid', self.tmp_dir, self.tmp_dir, 'gpkg')
+        change = write_osm_change(self.grid, os.path.join(self.tmp_dir, 'gpkg.osc'), 9)
+        update_geopackage(path, G, apply_change(G, raw, read_osc(change)))
+
+        streets = pyogrio.read_dataframe(path, layer='streets')
+        nodes = pyogrio.read_dataframe(path, layer='nodes')
+        self.assertEqual(
+            sorted(zip(streets.u, streets.v, streets.key)), sorted(G.edges(keys=True)))
+        self.assertEqual(sorted(nodes.osmid), sorted(G.nodes))
+        # The R-tree index sees the appended rows
+        within = pyogrio.read_dataframe(path, layer='streets', bbox=tuple(streets.total_bounds))
+        self.assertEqual(len(within), len(streets))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(OsmUpdateTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,99 @@
+# coding=utf-8
+"""Stage timing and profiling test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+
+from core.osm_ingest import build_network_from_extract
+from core.profiling import Profiler, span
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+
+class ProfilingTest(unittest.TestCase):
+    """Test spans are recorded in the active profiler only."""
+
+    def test_nested_spans(self):
+        """Test nested spans get their depth, times and memory."""
+        lines = []
+        profiler = Profiler(log=lines.append)
+        with profiler.active():
+            with span('outer'):
+                with span('inner'):
+                    time.sleep(0.02)
+                sum(range(100000))
+        records = profiler.records()
+        self.assertEqual([(r['stage'], r['depth']) for r in records],
+                         [('outer', 0), ('inner', 1)])
+        outer, inner = records
+        self.assertGreaterEqual(inner['wall_s'], 0.02)
+        self.assertGreaterEqual(outer['wall_s'], inner['wall_s'])
+        # Sleeping takes no CPU time
+        self.assertLess(inner['cpu_s'], inner['wall_s'])
+        self.assertGreater(outer['peak_rss_mb'], 0)
+        self.assertGreaterEqual(outer['rss_growth_mb'], 0)
+        # Logged as they finish, inner stages indented
+        self.assertTrue(lines[0].startswith('  inner: '))
+        self.assertTrue(lines[1].startswith('outer: '))
+
+    def test_inactive(self):
+        """Test spans outside an active profiler record nothing."""
+        profiler = Profiler()
+        with span('alone') as stage:
+            self.assertIsNone(stage)
+        with profiler.active():
+            pass
+        with span('after'):
+            pass
+        self.assertEqual(profiler.records(), [])
+
+    def test_ingest_stages(self):
+        """Test an offline build times its scan and simplify stages."""
+        profiler = Profiler()
+        with profiler.active():
+            build_network_from_extract(FIXTURE)
+        stages = [record['stage'] for record in profiler.records()]
+        for stage in ('scan ways', 'scan nodes', 'assemble', 'simplify'):
+            self.assertIn(stage, stages)
+
+    def test_cprofile_slowest(self):
+        """Test only the profile of the slowest top-level stage is kept."""
+        profiler = Profiler(profiler='cprofile')
+        with profiler.active():
+            with span('fast'):
+                pass
+            with span('slow'):
+                time.sleep(0.05)
+        self.assertEqual(profiler.profiled_stage, 'slow')
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = profiler.write_profile(os.path.join(tmp_dir, 'slow.prof'))
+            self.assertTrue(pstats.Stats(path).total_calls > 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_unknown_profiler(self):
+        """Test an unknown profiler name is rejected."""
+        with self.assertRaises(ValueError):
+            Profiler(profiler='perf')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ProfilingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Route cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.synthetic import grid_graph, write_osm_change, write_osm_xml
+from core.graph_cache import GraphCache
+from core.graph_registry import GraphRegistry, RegionEntry
+from core.osm_ingest import build_network_from_extract
+from core.osm_update import apply_change, read_osc
+from core.route_cache import RouteCache
+
+
+class RouteCacheTest(unittest.TestCase):
+    """Test cached routes are bounded, counted and tied to a graph version."""
+
+    def test_lru(self):
+        """Test the least recently used route goes first."""
+        cache = RouteCache(max_entries=2)
+        for origin in (1, 2):
+            cache.put(cache.key('Grid', 1, origin, 9, 'length'), {'cost': origin})
+        self.assertEqual(cache.get(cache.key('Grid', 1, 1, 9, 'length')), {'cost': 1})
+        cache.put(cache.key('Grid', 1, 3, 9, 'length'), {'cost': 3})
+        self.assertIsNone(cache.get(cache.key('Grid', 1, 2, 9, 'length')))
+        self.assertIsNone(cache.get(cache.key('Grid', 1, 1, 9, 'travel_time')))
+        self.assertEqual(len(cache), 2)
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 2, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_versions(self):
+        """Test loading or updating a graph gives it a new version."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            grid = grid_graph(400)
+            extract = write_osm_xml(grid, os.path.join(tmp_dir, 'grid.osm'))
+            G, raw = build_network_from_extract(extract)
+            registry = GraphRegistry(GraphCache(os.path.join(tmp_dir, 'cache')))
+            region = registry.register('Grid', 'drive', G)
+            other = RegionEntry('Grid', 'drive', G)
+            self.assertNotEqual(region.version, other.version)
+
+            cache = RouteCache()
+            key = cache.key(region.key, region.version, 1, 2, 'length')
+            cache.put(key, {'cost': 1.0})
+            change = write_osm_change(grid, os.path.join(tmp_dir, 'grid.osc'), 5)
+            region.patch(apply_change(G, raw, read_osc(change)))
+            self.assertIsNone(cache.get(cache.key(region.key, region.version, 1, 2, 'length')))
+
+            # A region loaded again does not inherit the old version either
+            registry.clear()
+            reloaded = registry.register('Grid', 'drive', G)
+            self.assertNotIn(reloaded.version, (key[1], region.version))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RouteCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
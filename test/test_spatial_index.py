@@ -0,0 +1,75 @@
+# coding=utf-8
+"""Nearest-node index test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import unittest
+
+import numpy as np
+
+from core.spatial_index import EARTH_RADIUS_M, NO_NODE, NodeIndex
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class NodeIndexTest(unittest.TestCase):
+    """Test snapping agrees with a brute-force great-circle scan."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(42)
+        self.lats = -7.2 + rng.random(2000) * 0.2
+        self.lons = -39.4 + rng.random(2000) * 0.2
+        self.ids = np.arange(1000, 3000)
+        self.index = NodeIndex(self.ids, self.lats, self.lons)
+
+    def test_nearest_matches_brute_force(self):
+        """Test the closest node and its distance in metres."""
+        for lat, lon in [(-7.1, -39.3), (-7.19, -39.21), (-7.0, -39.4)]:
+            distances = haversine(lat, lon, self.lats, self.lons)
+            node, dist = self.index.nearest(lat, lon)
+            self.assertEqual(node, self.ids[np.argmin(distances)])
+            self.assertAlmostEqual(dist, distances.min(), places=3)
+
+    def test_k_nearest(self):
+        """Test vectorised k-nearest queries are ordered by distance."""
+        node_ids, distances = self.index.query([-7.1, -7.15], [-39.3, -39.25], k=5)
+        self.assertEqual(node_ids.shape, (2, 5))
+        self.assertTrue(np.all(np.diff(distances, axis=1) >= 0))
+        brute = haversine(-7.15, -39.25, self.lats, self.lons)
+        np.testing.assert_array_equal(node_ids[1], self.ids[np.argsort(brute)[:5]])
+
+    def test_max_distance(self):
+        """Test neighbours beyond the radius are reported as missing."""
+        node, dist = self.index.nearest(-8.0, -39.3, max_distance=1000)
+        self.assertIsNone(node)
+        self.assertEqual(dist, float('inf'))
+        node_ids, _ = self.index.query([-8.0], [-39.3], max_distance=1000)
+        self.assertEqual(node_ids[0], NO_NODE)
+
+    def test_within(self):
+        """Test radius queries return every node inside, closest first."""
+        found = self.index.within(-7.1, -39.3, 500)
+        brute = haversine(-7.1, -39.3, self.lats, self.lons)
+        self.assertEqual(len(found), int((brute <= 500).sum()))
+        self.assertEqual([d for _, d in found], sorted(d for _, d in found))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(NodeIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
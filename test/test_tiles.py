@@ -0,0 +1,139 @@
+# coding=utf-8
+"""Tiled street network test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'catce.nogueira@gmail.com'
+__date__ = '2024-04-19'
+__copyright__ = 'Copyright 2024, Nogueira'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from benchmarks.synthetic import grid_graph, random_pairs
+from core.costs import csr_heuristic, way_speeds_kph
+from core.csr import CSRGraph
+from core.osm_ingest import build_graph_from_extract
+from core.search import astar
+from core.tiles import TileCatalog, TileStore, route, tiles_from_extract, tiles_from_graph
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'small_network.osm')
+
+# About 1.1 km, so the synthetic grid spans a few dozen tiles
+SMALL_TILE_DEG = 0.01
+
+
+class TilesTest(unittest.TestCase):
+    """Test routes across tiles match routes on the whole graph."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.grid = grid_graph(6400, seed=3)
+        cls.csr = CSRGraph.from_networkx(cls.grid)
+        cls.tile_dir = os.path.join(cls.tmp_dir, 'grid')
+        cls.manifest = tiles_from_graph(cls.grid, cls.tile_dir, SMALL_TILE_DEG)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def snap(self, store, G, node):
+        tiled, distance = store.snap(G.nodes[node]['y'], G.nodes[node]['x'], 1)
+        self.assertLess(distance, 0.01)
+        return tiled
+
+    def test_routes_match_csr(self):
+        """Test optimal costs under a budget that forces evictions."""
+        store = TileStore(self.tile_dir, max_bytes=150000)
+        for origin, destination in random_pairs(self.grid, 6):
+            for weight in ('length', 'travel_time'):
+                found = route(
+                    store, self.snap(store, self.grid, origin),
+                    self.snap(store, self.grid, destination), weight)
+                target = self.csr.position(destination)
+                expected = astar(
+                    self.csr, self.csr.position(origin), target, weight,
+                    csr_heuristic(self.csr, target, weight))
+                self.assertAlmostEqual(found.cost, expected.cost, places=6)
+                self.assertAlmostEqual(
+                    found.length, self.csr.weights('length')[expected.edges].sum(), places=6)
+                self.assertAlmostEqual(
+                    found.travel_time,
+                    self.csr.weights('travel_time')[expected.edges].sum(), places=6)
+                self.assertEqual(found.nodes[0], origin)
+                self.assertEqual(found.nodes[-1], destination)
+                self.assertEqual(len(found.coordinates), len(found.nodes))
+        self.assertGreater(store.evictions, 0)
+        largest = max(tile['size'] for tile in self.manifest['tiles'])
+        self.assertLessEqual(store.nbytes, store.max_bytes + 2 * largest)
+
+    def test_short_route_loads_few_tiles(self):
+        """Test a short route leaves most tiles on disk."""
+        store = TileStore(self.tile_dir)
+        origin = next(iter(self.grid.nodes))
+        destination = next(iter(self.grid.successors(origin)))
+        found = route(
+            store, self.snap(store, self.grid, origin),
+            self.snap(store, self.grid, destination))
+        self.assertEqual(found.nodes[-1], destination)
+        self.assertLess(len(store.loaded()), len(store) / 4)
+
+    def test_snap_distance(self):
+        """Test snapping honours the maximum distance."""
+        store = TileStore(self.tile_dir)
+        min_lon, min_lat, _, _ = self.manifest['bbox']
+        node, distance = store.snap(min_lat - 0.05, min_lon - 0.05, max_distance=1000)
+        self.assertIsNone(node)
+        node, distance = store.snap(min_lat - 0.005, min_lon - 0.005, max_distance=2000)
+        self.assertIsNotNone(node)
+        self.assertLess(distance, 2000)
+
+    def test_extract_tiles(self):
+        """Test tiles cut straight from an extract route like its graph."""
+        tile_dir = os.path.join(self.tmp_dir, 'fixture')
+        manifest = tiles_from_extract(FIXTURE, tile_dir, tile_deg=0.001)
+        self.assertGreater(len(manifest['tiles']), 1)
+        G = build_graph_from_extract(FIXTURE)
+        store = TileStore(tile_dir)
+        nodes = sorted(G.nodes)
+        for origin, destination in zip(nodes, reversed(nodes)):
+            for weight in ('length', 'travel_time'):
+                found = route(
+                    store, self.snap(store, G, origin), self.snap(store, G, destination),
+                    weight)
+                expected = nx.shortest_path_length(G, origin, destination, weight=weight)
+                self.assertAlmostEqual(found.cost, expected, places=6)
+
+    def test_catalog(self):
+        """Test the catalog finds and shares tile sets by place."""
+        catalog = TileCatalog(self.tmp_dir)
+        self.assertFalse(catalog.contains('Grid Town'))
+        tiles_from_extract(FIXTURE, catalog.path('Grid Town'))
+        self.assertTrue(catalog.contains(' grid  town '))
+        self.assertIs(catalog.store('Grid Town'), catalog.store('grid town'))
+
+    def test_way_speeds(self):
+        """Test speeds are parsed and imputed per highway type."""
+        speeds = way_speeds_kph(
+            ['primary', 'primary', 'residential', 'primary'],
+            ['60', '40 mph', None, None])
+        self.assertEqual(speeds[0], 60.0)
+        self.assertAlmostEqual(speeds[1], 64.37376)
+        self.assertEqual(speeds[2], 50.0)
+        self.assertAlmostEqual(speeds[3], (60.0 + 64.37376) / 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TilesTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
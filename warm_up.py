@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Background import of the modules the plugin actions need.
+
+QGIS startup only pays for registering the actions; this task then imports
+the scientific stack in the task manager, so the first route or network build
+does not stall the GUI for several seconds. Only modules that never create
+Qt widgets are imported here.
+"""
+
+import importlib
+
+from qgis.core import QgsMessageLog, QgsTask, Qgis
+
+# Third-party modules first, then the plugin modules built on top of them
+WARM_UP_MODULES = (
+    "numpy",
+    "scipy.spatial",
+    "networkx",
+    "pandas",
+    "shapely",
+    "geopandas",
+    "pyogrio",
+    "osmnx",
+    "matplotlib.figure",
+    "matplotlib.backends.backend_agg",
+    "reportlab.platypus",
+    ".tasks",
+)
+
+
+class WarmUpTask(QgsTask):
+    """Import ``WARM_UP_MODULES``, skipping any that are unavailable."""
+
+    def __init__(self, package):
+        super().__init__("Route Builder warm-up", QgsTask.CanCancel)
+        self.package = package
+        self.missing = []
+
+    def run(self):
+        for number, name in enumerate(WARM_UP_MODULES, start=1):
+            if self.isCanceled():
+                return False
+            try:
+                importlib.import_module(name, self.package)
+            except ImportError as e:
+                self.missing.append(f"{name}: {e}")
+            self.setProgress(100 * number / len(WARM_UP_MODULES))
+        return True
+
+    def finished(self, ok):
+        for message in self.missing:
+            QgsMessageLog.logMessage(
+                f"Could not import {message}", "Route Builder", Qgis.Warning
+            )